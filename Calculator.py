@@ -1,17 +1,31 @@
 import tkinter as tk
 from tkinter import messagebox as mb
 
+from CalculatorEngine import (CalculationHistory, ExpressionEngine, ExpressionError,
+                              LivePreview, format_result)
+
+# Recent calculations, kept between runs
+HISTORY_FILE = 'calculator_history.json'
+
 class ModernCalculator:
     def __init__(self, root):
         self.root = root
         self.root.title("Modern Calculator")
-        self.root.geometry("380x580")
+        self.root.geometry("380x620")
         self.root.resizable(False, False)
         
+        # Parses and evaluates the display; never eval()
+        self.engine = ExpressionEngine()
+        # Value of the display as it is typed, and past results to reuse
+        self.preview = LivePreview(self.engine)
+        self.history = CalculationHistory(HISTORY_FILE, precision=self.engine.precision)
+        self.history_index = None
+        
         # Color scheme - Modern dark theme with blue accent
         self.bg_color = "#1e1e2e"
         self.display_bg = "#2d2d44"
         self.display_fg = "#ffffff"
+        self.preview_fg = "#a0a0c0"
         self.num_button_bg = "#3d3d5c"
         self.num_button_fg = "#ffffff"
         self.op_button_bg = "#5865f2"
@@ -27,9 +41,13 @@ class ModernCalculator:
         display_frame = tk.Frame(root, bg=self.bg_color)
         display_frame.grid(row=0, column=0, columnspan=4, padx=15, pady=15, sticky="nsew")
         
-        # Entry widget for showing numbers and results
+        # Entry widget for showing numbers and results; every edit, typed
+        # or clicked, refreshes the preview through the variable
+        self.display = tk.StringVar()
+        self.display.trace_add('write', lambda *args: self.update_preview())
         self.entry = tk.Entry(
             display_frame, 
+            textvariable=self.display,
             width=14, 
             font=('Segoe UI', 32, 'bold'), 
             borderwidth=0,
@@ -41,6 +59,17 @@ class ModernCalculator:
         )
         self.entry.pack(fill='both', expand=True, ipady=20, ipadx=10)
         
+        # Live result of what has been typed so far
+        self.preview_label = tk.Label(
+            display_frame,
+            text='',
+            font=('Segoe UI', 14),
+            bg=self.bg_color,
+            fg=self.preview_fg,
+            anchor='e'
+        )
+        self.preview_label.pack(fill='x', pady=(5, 0))
+        
         # Button configuration
         buttons = [
             ('7', 1, 0, 'num'), ('8', 1, 1, 'num'), ('9', 1, 2, 'num'), ('/', 1, 3, 'op'),
@@ -73,6 +102,16 @@ class ModernCalculator:
         # Configure grid weights for responsiveness
         for i in range(4):
             root.grid_columnconfigure(i, weight=1)
+        
+        # Keyboard: type into the display, Enter or = to calculate, Escape
+        # to clear, Up and Down to step through past calculations
+        self.entry.bind('<equal>', lambda e: self.button_equal() or 'break')
+        self.root.bind('<Return>', lambda e: self.button_equal())
+        self.root.bind('<KP_Enter>', lambda e: self.button_equal())
+        self.root.bind('<Escape>', lambda e: self.button_clear())
+        self.root.bind('<Up>', lambda e: self.recall(-1))
+        self.root.bind('<Down>', lambda e: self.recall(1))
+        self.entry.focus_set()
     
     def create_button(self, text, row, col, btn_type):
         """Create a styled button based on its type"""
@@ -117,23 +156,71 @@ class ModernCalculator:
     
     def button_click(self, number):
         """Handle number/operator button clicks"""
-        current = self.entry.get()
-        self.entry.delete(0, tk.END)
-        self.entry.insert(0, current + str(number))
+        self.entry.insert(tk.INSERT, str(number))
+        self.entry.focus_set()
     
     def button_clear(self):
         """Clear the display"""
-        self.entry.delete(0, tk.END)
+        self.set_display('')
+        self.history_index = None
     
     def button_equal(self):
         """Calculate and display result"""
+        text = self.entry.get()
+        if not text.strip():
+            return
         try:
-            result = eval(self.entry.get())
-            self.entry.delete(0, tk.END)
-            self.entry.insert(0, str(result))
-        except Exception as e:
-            mb.showerror("Error", "Invalid Input")
-            self.entry.delete(0, tk.END)
+            # A repeated calculation comes straight from the history
+            result = self.history.lookup(text)
+            if result is None:
+                result = self.engine.evaluate(text)
+            shown = format_result(result)
+        except (ExpressionError, ArithmeticError) as e:
+            mb.showerror("Error", f"Invalid Input: {e}")
+            self.set_display('')
+            return
+        if shown != text.strip():
+            self.history.record(text, result)
+        self.history_index = None
+        self.set_display(shown)
+        self.preview_label.config(text=f'{text.strip()} =')
+    
+    def set_display(self, text):
+        """Replace the display text, leaving the cursor at the end"""
+        self.display.set(text)
+        self.entry.icursor(tk.END)
+    
+    def update_preview(self):
+        """Show the value of the display so far below it"""
+        text = self.entry.get()
+        try:
+            value = self.preview.update(text)
+            shown = None if value is None else format_result(value)
+        except (ExpressionError, ArithmeticError):
+            shown = None  # this runs on every keystroke: never let it raise
+        if shown is None or shown == text.strip():
+            self.preview_label.config(text='')
+        else:
+            self.preview_label.config(text=f'= {shown}')
+    
+    def recall(self, step):
+        """Put the previous (step -1) or next (step 1) past calculation
+        in the display"""
+        entries = self.history.entries()
+        if not entries:
+            return
+        if self.history_index is None:
+            if step > 0:
+                return
+            index = len(entries) - 1
+        else:
+            index = self.history_index + step
+        if index >= len(entries):
+            self.history_index = None
+            self.set_display('')
+            return
+        self.history_index = max(index, 0)
+        self.set_display(entries[self.history_index][0])
 
 
 if __name__ == "__main__":
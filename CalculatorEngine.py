@@ -0,0 +1,898 @@
+# CALCULATOR EXPRESSION ENGINE
+# ============================
+
+"""
+A safe, headless arithmetic engine for ModernCalculator and scripts.
+
+Expressions are tokenized, parsed with a Pratt (precedence climbing)
+parser and compiled into a tree of small closures, which is what gets
+cached and evaluated. Nothing is ever handed to eval(): the only things an
+expression can do are the operators and functions listed below.
+
+All arithmetic is decimal.Decimal at a configurable precision, so
+0.1 + 0.2 is 0.3 and 2 ** 200 is exact.
+
+    operators   + - * / // % ** (or ^), unary - and +, parentheses
+    functions   sqrt exp ln log log10 abs round floor ceil min max pow
+                sin cos tan (the trigonometric ones at float precision)
+    constants   pi e
+    variables   any other name, given at evaluation time
+
+    engine = ExpressionEngine(precision=50)
+    engine.evaluate('2 * (3 + 4) ** 2')         # Decimal('98')
+    engine.evaluate('price * qty', {'price': Decimal('9.99'), 'qty': 3})
+
+Compiled expressions are kept in an LRU keyed by the expression text, so
+evaluating the same formula again costs one dictionary lookup plus the
+arithmetic.
+
+LivePreview evaluates text as it is typed, resuming from the part that
+did not change; CalculationHistory remembers recent results in a file.
+
+Batch usage, one expression per line (results in the same order):
+    python CalculatorEngine.py expressions.txt -o results.txt --precision 40
+"""
+
+import argparse
+import json
+import math
+import os
+import re
+import sys
+import time
+from collections import OrderedDict, namedtuple
+from decimal import (MAX_EMAX, MIN_EMIN, Context, Decimal, DivisionByZero,
+                     InvalidOperation, Overflow, ROUND_CEILING, ROUND_FLOOR,
+                     ROUND_HALF_EVEN, ROUND_HALF_UP, localcontext)
+from functools import lru_cache
+from itertools import islice
+from operator import add, floordiv, mod, mul, neg, pos, sub, truediv
+
+DEFAULT_PRECISION = 28
+
+# Compiled expressions kept per engine
+COMPILE_CACHE_SIZE = 1024
+
+# Longer input is refused before tokenizing; deeper nesting before parsing
+MAX_EXPRESSION_LENGTH = 10000
+MAX_DEPTH = 200
+
+# Exponent range of every engine's context; a number written outside it
+# is refused while tokenizing
+EMAX = 999999
+EMIN = -999999
+
+# Calculations a CalculationHistory keeps
+HISTORY_SIZE = 100
+
+# Lines read, evaluated and written at a time by the batch command line
+BATCH_CHUNK = 10000
+
+
+class ExpressionError(ValueError):
+    """An expression that does not parse or cannot be evaluated.
+
+    position is the offset in the text where parsing failed, or None for
+    errors found while evaluating (division by zero and the like).
+    """
+
+    def __init__(self, message, position=None):
+        super().__init__(message)
+        self.position = position
+
+
+# ============= TOKENIZER =============
+
+_TOKEN = re.compile(r'''
+    \s*(?:
+        (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)
+      | (?P<name>[A-Za-z_]\w*)
+      | (?P<op>\*\*|//|[-+*/%^(),×÷−])
+      | (?P<bad>\S)
+    )''', re.VERBOSE)
+
+# Calculator keys and typographic variants of the ASCII operators
+_OP_ALIASES = {'^': '**', '×': '*', '÷': '/', '−': '-'}
+
+
+def _scan(text, pos=0):
+    # Yields (kind, value, start, end) from pos on
+    for found in _TOKEN.finditer(text, pos):
+        kind = found.lastgroup
+        value = found.group(kind)
+        if kind == 'number':
+            value = _number(value, found.start(kind))
+        elif kind == 'op':
+            value = _OP_ALIASES.get(value, value)
+        elif kind == 'bad':
+            raise ExpressionError(f"unexpected {value!r}", found.start(kind))
+        yield kind, value, found.start(kind), found.end()
+
+
+def _number(text, position):
+    value = Decimal(text)
+    if value and not EMIN <= value.adjusted() <= EMAX:
+        raise ExpressionError(f"number {text} is out of range", position)
+    return value
+
+
+def tokenize(text):
+    """Return a list of (kind, value, position) tokens ending with an 'end' token;
+    numbers come as Decimal"""
+    tokens = [token[:3] for token in _scan(text)]
+    tokens.append(('end', None, len(text)))
+    return tokens
+
+
+# ============= PARSER =============
+#
+# Trees are tuples: ('num', Decimal), ('var', name), ('unary', op, operand),
+# ('binary', op, left, right) and ('call', name, args).
+#
+# MAX_DEPTH bounds the parser's recursion, and so every operand, argument
+# and parenthesis. A flat chain like 1+1+...+1 is built by a loop instead
+# and nests its left operands as deep as it is long, so code walking a
+# tree follows that left spine with binary_chain(), not by recursing.
+
+# Binding power of each infix operator; ** binds right to left
+_INFIX = {'+': 10, '-': 10, '*': 20, '/': 20, '//': 20, '%': 20, '**': 40}
+_RIGHT_ASSOCIATIVE = {'**'}
+# Unary minus binds looser than ** so -2 ** 2 is -(2 ** 2), as in Python
+_PREFIX_POWER = 30
+
+
+class _Parser:
+
+    def __init__(self, text):
+        self.text = text
+        self.tokens = tokenize(text)
+        self.index = 0
+        self.depth = 0
+
+    def next(self):
+        token = self.tokens[self.index]
+        self.index += 1
+        return token
+
+    def peek(self):
+        return self.tokens[self.index]
+
+    def expect(self, value):
+        kind, found, position = self.next()
+        if found != value:
+            raise ExpressionError(f"expected {value!r} but found "
+                                  f"{'the end' if kind == 'end' else repr(found)}", position)
+
+    def parse(self):
+        if self.peek()[0] == 'end':
+            raise ExpressionError("empty expression", 0)
+        tree = self.expression(0)
+        kind, value, position = self.peek()
+        if kind != 'end':
+            raise ExpressionError(f"unexpected {value!r}", position)
+        return tree
+
+    def expression(self, min_power):
+        self.depth += 1
+        if self.depth > MAX_DEPTH:
+            raise ExpressionError("expression is nested too deeply", self.peek()[2])
+        left = self.prefix()
+        while True:
+            kind, op, _ = self.peek()
+            power = _INFIX.get(op) if kind == 'op' else None
+            if power is None or power <= min_power:
+                break
+            self.index += 1
+            right = self.expression(power - 1 if op in _RIGHT_ASSOCIATIVE else power)
+            left = ('binary', op, left, right)
+        self.depth -= 1
+        return left
+
+    def prefix(self):
+        kind, value, position = self.next()
+        if kind == 'number':
+            return ('num', value)
+        if kind == 'name':
+            if self.peek()[1] == '(':
+                return self.call(value, position)
+            return ('var', value)
+        if value in ('-', '+'):
+            return ('unary', value, self.expression(_PREFIX_POWER))
+        if value == '(':
+            inner = self.expression(0)
+            self.expect(')')
+            return inner
+        if kind == 'end':
+            raise ExpressionError("expression ends too early", position)
+        raise ExpressionError(f"unexpected {value!r}", position)
+
+    def call(self, name, position):
+        if name not in FUNCTIONS:
+            raise ExpressionError(f"unknown function {name!r}", position)
+        self.expect('(')
+        args = []
+        if self.peek()[1] != ')':
+            args.append(self.expression(0))
+            while self.peek()[1] == ',':
+                self.index += 1
+                args.append(self.expression(0))
+        self.expect(')')
+        _, low, high = FUNCTIONS[name]
+        if not low <= len(args) <= (high if high is not None else len(args)):
+            wanted = low if low == high else f"{low} to {high}" if high else f"at least {low}"
+            raise ExpressionError(f"{name}() takes {wanted} argument(s), got {len(args)}",
+                                  position)
+        return ('call', name, tuple(args))
+
+
+def parse(text):
+    """Parse text into a tree of tuples (see above)"""
+    if len(text) > MAX_EXPRESSION_LENGTH:
+        raise ExpressionError(f"expression longer than {MAX_EXPRESSION_LENGTH} characters")
+    return _Parser(text).parse()
+
+
+def binary_chain(tree):
+    """Split a 'binary' tree along its left operands: ((a + b) * c) - d
+    gives (a, [('+', b), ('*', c), ('-', d)])"""
+    steps = []
+    while tree[0] == 'binary':
+        steps.append((tree[1], tree[3]))
+        tree = tree[2]
+    steps.reverse()
+    return tree, steps
+
+
+# ============= FUNCTIONS =============
+
+def _log(x, base=None):
+    if base is None:
+        return x.log10()
+    # A few guard digits so log(8, 2) comes out as 3, not 2.999...
+    with localcontext() as ctx:
+        ctx.prec += 5
+        ratio = x.ln() / base.ln()
+    return +ratio
+
+
+def _round(x, places=Decimal(0)):
+    if places != places.to_integral_value():
+        raise InvalidOperation("round() places must be a whole number")
+    return x.quantize(Decimal(1).scaleb(-int(places)), ROUND_HALF_UP)
+
+
+def _float_function(function):
+    # Decimal has no trigonometry; go through float and back via repr so
+    # the result is the float's shortest decimal form
+    def apply(x):
+        return Decimal(repr(function(float(x))))
+    return apply
+
+
+# name -> (implementation, fewest arguments, most arguments or None)
+FUNCTIONS = {
+    'sqrt': (Decimal.sqrt, 1, 1),
+    'exp': (Decimal.exp, 1, 1),
+    'ln': (Decimal.ln, 1, 1),
+    'log': (_log, 1, 2),
+    'log10': (Decimal.log10, 1, 1),
+    'abs': (abs, 1, 1),
+    'round': (_round, 1, 2),
+    'floor': (lambda x: x.to_integral_value(ROUND_FLOOR), 1, 1),
+    'ceil': (lambda x: x.to_integral_value(ROUND_CEILING), 1, 1),
+    'min': (min, 1, None),
+    'max': (max, 1, None),
+    'pow': (pow, 2, 2),
+    'sin': (_float_function(math.sin), 1, 1),
+    'cos': (_float_function(math.cos), 1, 1),
+    'tan': (_float_function(math.tan), 1, 1),
+}
+
+_BINARY = {'+': add, '-': sub, '*': mul, '/': truediv, '//': floordiv, '%': mod,
+           '**': pow}
+_UNARY = {'-': neg, '+': pos}
+
+
+def compute_pi(context):
+    """pi to the context's precision (the recipe from the decimal docs)"""
+    with localcontext(context) as ctx:
+        ctx.prec += 2
+        three = Decimal(3)
+        last, t, s, n, na, d, da = 0, three, 3, 1, 0, 0, 24
+        while s != last:
+            last = s
+            n, na = n + na, na + 8
+            d, da = d + da, da + 32
+            t = (t * n) / d
+            s += t
+        ctx.prec -= 2
+        return +s
+
+
+# ============= COMPILED EXPRESSIONS =============
+
+class Expression:
+    """
+    A compiled expression: call evaluate() as often as needed.
+
+    names holds the variables it needs; tree is the parsed form, for
+    other back ends to compile their own way (ExpenseFormulas turns it
+    into NumPy array operations).
+    """
+
+    __slots__ = ('text', 'tree', 'names', 'engine', '_run')
+
+    def __init__(self, text, tree, names, engine, run):
+        self.text = text
+        self.tree = tree
+        self.names = names
+        self.engine = engine
+        self._run = run
+
+    def __repr__(self):
+        return f'Expression({self.text!r})'
+
+    @property
+    def is_constant(self):
+        return self.tree[0] == 'num'
+
+    def evaluate(self, variables=None):
+        """Return the Decimal value; raises ExpressionError"""
+        with localcontext(self.engine.context):
+            return self.engine._call(self, variables)
+
+
+class ExpressionEngine:
+    """
+    Compiles and evaluates expressions at a fixed Decimal precision.
+
+    Compiled expressions are cached (LRU, cache_size entries), so a
+    calculator or a batch file that repeats formulas only parses each
+    one once. Constant subexpressions are folded at compile time.
+    """
+
+    def __init__(self, precision=DEFAULT_PRECISION, cache_size=COMPILE_CACHE_SIZE):
+        self.context = Context(prec=precision, rounding=ROUND_HALF_EVEN, Emax=EMAX, Emin=EMIN,
+                               traps=[DivisionByZero, InvalidOperation, Overflow])
+        self.constants = {'pi': compute_pi(self.context)}
+        with localcontext(self.context):
+            self.constants['e'] = Decimal(1).exp()
+        self.compile = lru_cache(maxsize=cache_size)(self._compile)
+
+    @property
+    def precision(self):
+        return self.context.prec
+
+    def cache_info(self):
+        return self.compile.cache_info()
+
+    def evaluate(self, text, variables=None):
+        """Compile (or fetch from the cache) and evaluate text"""
+        expression = self.compile(text)
+        with localcontext(self.context):
+            return self._call(expression, variables)
+
+    def evaluate_many(self, texts, variables=None):
+        """Yield a Decimal, or the ExpressionError, for each text in turn.
+
+        The Decimal context is entered once for the whole batch.
+        """
+        compile, call = self.compile, self._call
+        with localcontext(self.context):
+            for text in texts:
+                try:
+                    yield call(compile(text), variables)
+                except ExpressionError as e:
+                    yield e
+
+    @staticmethod
+    def _call(expression, variables):
+        try:
+            return expression._run(variables)
+        except KeyError as e:
+            raise ExpressionError(f"no value for {e.args[0]!r}") from None
+        except (ArithmeticError, TypeError, ValueError) as e:
+            raise _failure(e) from None
+
+    # ---------- compilation ----------
+
+    def _compile(self, text):
+        tree = parse(text.strip())
+        with localcontext(self.context):
+            tree = self._fold(tree)
+        names = frozenset(self._names(tree))
+        return Expression(text, tree, names, self, self._closure(tree))
+
+    def _fold(self, tree):
+        """Resolve constants and evaluate any subtree without variables"""
+        kind = tree[0]
+        if kind == 'num':
+            return tree
+        if kind == 'var':
+            value = self.constants.get(tree[1])
+            return tree if value is None else ('num', value)
+        if kind == 'binary':
+            first, steps = binary_chain(tree)
+            folded = self._fold(first)
+            for op, operand in steps:
+                folded = ('binary', op, folded, self._fold(operand))
+                folded = self._apply_constant(folded, _BINARY[op], folded[2:])
+            return folded
+        if kind == 'unary':
+            folded = ('unary', tree[1], self._fold(tree[2]))
+            return self._apply_constant(folded, _UNARY[tree[1]], (folded[2],))
+        folded = ('call', tree[1], tuple(self._fold(arg) for arg in tree[2]))
+        return self._apply_constant(folded, FUNCTIONS[tree[1]][0], folded[2])
+
+    @staticmethod
+    def _apply_constant(tree, apply, values):
+        # The value of tree when all its operands are numbers, else tree
+        if all(value[0] == 'num' for value in values):
+            try:
+                return ('num', apply(*[value[1] for value in values]))
+            except (ArithmeticError, TypeError, ValueError):
+                pass  # 1/0 and friends fail when evaluated, not here
+        return tree
+
+    def _names(self, tree):
+        kind = tree[0]
+        if kind == 'var':
+            yield tree[1]
+        elif kind == 'unary':
+            yield from self._names(tree[2])
+        elif kind == 'binary':
+            first, steps = binary_chain(tree)
+            yield from self._names(first)
+            for _, operand in steps:
+                yield from self._names(operand)
+        elif kind == 'call':
+            for arg in tree[2]:
+                yield from self._names(arg)
+
+    def _closure(self, tree):
+        """Turn a tree into nested closures taking the variables dict"""
+        kind = tree[0]
+        if kind == 'num':
+            value = tree[1]
+            return lambda variables: value
+        if kind == 'var':
+            name = tree[1]
+
+            def variable(variables):
+                if variables is None:
+                    raise KeyError(name)
+                value = variables[name]
+                return value if type(value) is Decimal else _to_decimal(value, name)
+            return variable
+        if kind == 'unary':
+            op, operand = _UNARY[tree[1]], self._closure(tree[2])
+            return lambda variables: op(operand(variables))
+        if kind == 'binary':
+            first, steps = binary_chain(tree)
+            left = self._closure(first)
+            steps = [(_BINARY[op], self._closure(operand)) for op, operand in steps]
+            if len(steps) == 1:
+                (op, right), = steps
+                return lambda variables: op(left(variables), right(variables))
+
+            def chain(variables):
+                value = left(variables)
+                for op, right in steps:
+                    value = op(value, right(variables))
+                return value
+            return chain
+        function = FUNCTIONS[tree[1]][0]
+        args = tuple(self._closure(arg) for arg in tree[2])
+        if len(args) == 1:
+            arg = args[0]
+            return lambda variables: function(arg(variables))
+        return lambda variables: function(*[arg(variables) for arg in args])
+
+
+def _to_decimal(value, name):
+    if isinstance(value, bool) or not isinstance(value, (int, float, str, Decimal)):
+        raise TypeError(f"{name} must be a number, not {type(value).__name__}")
+    # repr keeps floats at their shortest form: 0.1 stays 0.1
+    return Decimal(repr(value) if isinstance(value, float) else value)
+
+
+def _describe(error):
+    # decimal's own exceptions carry the signal class, not a message
+    if error.args and isinstance(error.args[0], str):
+        return error.args[0]
+    if isinstance(error, InvalidOperation):
+        return "invalid operation (square root or logarithm of a negative number?)"
+    if isinstance(error, Overflow):
+        return "result is too large"
+    return str(error) or type(error).__name__
+
+
+def _failure(error):
+    # An ExpressionError for anything arithmetic raised, as _call reports it
+    if isinstance(error, ExpressionError):
+        return error
+    if isinstance(error, ZeroDivisionError):
+        return ExpressionError("division by zero")
+    return ExpressionError(_describe(error))
+
+
+def format_result(value):
+    """Render a result for display: no exponent unless it is huge or tiny,
+    no trailing zeros"""
+    if not value.is_finite():
+        return str(value)
+    if value.is_zero():
+        return '0'
+    # normalize() rounds to its context: give it room for every digit and
+    # any exponent, whatever precision the value was computed at
+    digits = len(value.as_tuple().digits)
+    value = value.normalize(Context(prec=digits, Emax=MAX_EMAX, Emin=MIN_EMIN))
+    if -20 <= value.adjusted() < 40:
+        return f'{value:f}'
+    return str(value)
+
+
+_default_engine = None
+
+
+def evaluate(text, **variables):
+    """Evaluate text with a shared engine at the default precision"""
+    global _default_engine
+    if _default_engine is None:
+        _default_engine = ExpressionEngine()
+    return _default_engine.evaluate(text, variables or None)
+
+
+# ============= LIVE PREVIEW =============
+#
+# LivePreview evaluates left to right with operand and operator stacks
+# (shunting-yard), using the parser's binding powers so it agrees with
+# ExpressionEngine. It keeps the state after every token. An edit
+# re-scans from just before the first changed character and resumes from
+# the state saved there, so a keystroke costs a token or two, not a
+# re-parse of the whole line. Stacks are linked (top, rest) tuples, so
+# saving a state copies nothing.
+#
+# Stacked operators are (kind, op, min_power) for 'binary' and 'unary',
+# ('group', None, 0) for a parenthesis and ('call', name, arguments so
+# far) for a function call.
+
+# A token can still change while any of the next three characters do:
+# '1' becomes '1e+5'
+_LOOKAHEAD = 3
+
+# operands and operators are linked stacks; expect is True where an
+# operand must come next; name is a name waiting to see whether '('
+# follows it; depth counts the stacked operators
+_State = namedtuple('_State', 'operands operators expect name depth error')
+
+_START = _State(None, None, True, None, 0, None)
+
+
+class LivePreview:
+    """
+    The value of an expression as it is typed, for a calculator display.
+
+        preview = LivePreview(engine)
+        preview.update('2 * (3 + 4')        # Decimal('14')
+        preview.update('2 * (3 + 4) ** 2')  # Decimal('98'), from the saved '2 * (3 + 4'
+
+    A partial expression is shown as far as it goes: a trailing operator
+    is left out and open parentheses are closed. update() returns None
+    when there is nothing to show or the text can't be evaluated (the
+    error is then in .error).
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.error = None
+        self._text = ''
+        self._tokens = []         # (kind, value, start, end)
+        self._states = [_START]   # _states[i]: the state after i tokens
+
+    def update(self, text):
+        """Return the value of text so far, reusing the state of the part
+        that did not change since the last call"""
+        if len(text) > MAX_EXPRESSION_LENGTH:
+            self.error = ExpressionError(
+                f"expression longer than {MAX_EXPRESSION_LENGTH} characters")
+            return None
+        same = self._unchanged(self._text, text)
+
+        keep = len(self._tokens)
+        while keep and self._tokens[keep - 1][3] + _LOOKAHEAD > same:
+            keep -= 1
+        del self._tokens[keep:]
+        del self._states[keep + 1:]
+        self._text = text
+
+        state = self._states[-1]
+        with localcontext(self.engine.context):
+            try:
+                for token in _scan(text, self._tokens[-1][3] if keep else 0):
+                    state = self._step(state, token)
+                    self._tokens.append(token)
+                    self._states.append(state)
+            except ExpressionError as e:
+                state = state._replace(error=e)
+            try:
+                value = self._finish(state)
+            except ExpressionError as e:
+                self.error = e
+                return None
+        self.error = None
+        return value
+
+    @staticmethod
+    def _unchanged(old, new):
+        # Length of the common prefix; typing and backspacing at the end
+        # are answered without comparing character by character
+        if new.startswith(old):
+            return len(old)
+        if old.startswith(new):
+            return len(new)
+        same = 0
+        for same, (a, b) in enumerate(zip(old, new)):
+            if a != b:
+                break
+        return same
+
+    # ---------- stepping ----------
+
+    def _step(self, state, token):
+        if state.error:
+            return state
+        kind, value, position, _ = token
+        try:
+            if state.name is not None:
+                if value == '(':
+                    if state.name not in FUNCTIONS:
+                        raise ExpressionError(f"unknown function {state.name!r}",
+                                              position - len(state.name))
+                    return self._push(state._replace(name=None, expect=True),
+                                      ('call', state.name, 0), position)
+                state = self._resolve(state)
+            if state.expect:
+                return self._operand(state, kind, value, position)
+            return self._operator(state, kind, value, position)
+        except (ArithmeticError, TypeError, ValueError) as e:
+            return state._replace(error=_failure(e))
+
+    def _operand(self, state, kind, value, position):
+        if kind == 'number':
+            return state._replace(operands=(value, state.operands), expect=False)
+        if kind == 'name':
+            return state._replace(name=value, expect=False)
+        if value in ('-', '+'):
+            return self._push(state, ('unary', value, _PREFIX_POWER), position)
+        if value == '(':
+            return self._push(state, ('group', None, 0), position)
+        top = state.operators[0] if state.operators else None
+        if value == ')' and top is not None and top[0] == 'call' and not top[2]:
+            # f(): no arguments, which no function takes
+            return self._call(state._replace(expect=False), 0, position)
+        raise ExpressionError(f"unexpected {value!r}", position)
+
+    def _operator(self, state, kind, value, position):
+        power = _INFIX.get(value) if kind == 'op' else None
+        if power is not None:
+            state = self._reduce(state, power)
+            min_power = power - 1 if value in _RIGHT_ASSOCIATIVE else power
+            return self._push(state._replace(expect=True), ('binary', value, min_power),
+                              position)
+        if value in (')', ','):
+            state = self._reduce(state, 0)
+            top = state.operators[0] if state.operators else None
+            if top is not None and top[0] == 'call':
+                if value == ',':
+                    operators = (('call', top[1], top[2] + 1), state.operators[1])
+                    return state._replace(operators=operators, expect=True)
+                return self._call(state, top[2] + 1, position)
+            if top is not None and value == ')':
+                return state._replace(operators=state.operators[1], depth=state.depth - 1)
+        raise ExpressionError(f"unexpected {value!r}", position)
+
+    @staticmethod
+    def _push(state, operator, position):
+        if state.depth >= MAX_DEPTH:
+            raise ExpressionError("expression is nested too deeply", position)
+        return state._replace(operators=(operator, state.operators), expect=True,
+                              depth=state.depth + 1)
+
+    def _resolve(self, state):
+        value = self.engine.constants.get(state.name)
+        if value is None:
+            raise ExpressionError(f"no value for {state.name!r}")
+        return state._replace(operands=(value, state.operands), name=None)
+
+    @staticmethod
+    def _reduce(state, power):
+        """Apply the stacked operators that bind at least as tightly as
+        power, down to the nearest parenthesis"""
+        operands, operators, depth = state.operands, state.operators, state.depth
+        while operators and operators[0][0] in ('binary', 'unary') \
+                and operators[0][2] >= power:
+            (kind, op, _), operators = operators
+            depth -= 1
+            right, operands = operands
+            if kind == 'unary':
+                operands = (_UNARY[op](right), operands)
+            else:
+                left, operands = operands
+                operands = (_BINARY[op](left, right), operands)
+        return state._replace(operands=operands, operators=operators, depth=depth)
+
+    @staticmethod
+    def _call(state, count, position):
+        (_, name, _), operators = state.operators
+        function, low, high = FUNCTIONS[name]
+        if not low <= count <= (high if high is not None else count):
+            wanted = low if low == high else f"{low} to {high}" if high else f"at least {low}"
+            raise ExpressionError(f"{name}() takes {wanted} argument(s), got {count}",
+                                  position)
+        args, operands = [], state.operands
+        for _ in range(count):
+            arg, operands = operands
+            args.append(arg)
+        args.reverse()
+        return state._replace(operands=(function(*args), operands), operators=operators,
+                              depth=state.depth - 1)
+
+    def _finish(self, state):
+        """The value of state as if the expression ended there"""
+        if state.error:
+            raise state.error
+        try:
+            if state.name is not None:
+                state = self._resolve(state)
+            # Drop what is still waiting for an operand: '2 +' shows 2
+            while state.expect:
+                if not state.operators:
+                    raise ExpressionError("empty expression", 0)
+                (kind, name, count), operators = state.operators
+                if kind == 'call' and count:
+                    # 'max(1,': the last argument is the current operand again
+                    state = state._replace(operators=(('call', name, count - 1), operators),
+                                           expect=False)
+                else:
+                    # A binary operator leaves its left operand behind
+                    state = state._replace(operators=operators, depth=state.depth - 1,
+                                           expect=kind != 'binary')
+            # Close whatever is still open
+            while True:
+                state = self._reduce(state, 0)
+                if not state.operators:
+                    return state.operands[0]
+                kind, _, count = state.operators[0]
+                if kind == 'call':
+                    state = self._call(state, count + 1, None)
+                else:
+                    state = state._replace(operators=state.operators[1],
+                                           depth=state.depth - 1)
+        except (ArithmeticError, TypeError, ValueError) as e:
+            raise _failure(e) from None
+
+
+# ============= HISTORY =============
+
+class CalculationHistory:
+    """
+    The most recent calculations, oldest first, kept in a JSON file that is
+    rewritten after each one. It doubles as a memo: lookup() returns the
+    result of an expression calculated before without evaluating it again.
+
+    Results are only reused at the precision they were calculated at, so
+    a file written at another precision starts an empty history.
+    """
+
+    def __init__(self, path=None, size=HISTORY_SIZE, precision=DEFAULT_PRECISION):
+        self.path = path
+        self.size = size
+        self.precision = precision
+        self._entries = OrderedDict()   # expression -> Decimal
+        if path:
+            self._load()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def entries(self):
+        """(expression, Decimal) pairs, oldest first"""
+        return list(self._entries.items())
+
+    def lookup(self, text):
+        """The remembered result of text, or None"""
+        return self._entries.get(text.strip())
+
+    def record(self, text, value):
+        """Remember text's result as the most recent calculation and save"""
+        key = text.strip()
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+        self.save()
+
+    def clear(self):
+        self._entries.clear()
+        self.save()
+
+    def save(self):
+        if not self.path:
+            return
+        data = {'precision': self.precision,
+                'entries': [[text, str(value)] for text, value in self._entries.items()]}
+        # Write aside and rename so a crash never leaves half a file
+        temp = self.path + '.tmp'
+        with open(temp, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=1)
+        os.replace(temp, self.path)
+
+    def _load(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+            if data['precision'] != self.precision:
+                return
+            for text, value in data['entries'][-self.size:]:
+                self._entries[text] = Decimal(value)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, TypeError, ArithmeticError):
+            # Unreadable: start a new history rather than refuse to run
+            self._entries.clear()
+
+
+# ============= BATCH =============
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Evaluate a file of expressions, one per line")
+    parser.add_argument('input', help="file of expressions, or - for stdin")
+    parser.add_argument('-o', '--output', default='-', help="results file, default stdout")
+    parser.add_argument('--precision', type=int, default=DEFAULT_PRECISION,
+                        help="significant digits")
+    args = parser.parse_args(argv)
+
+    engine = ExpressionEngine(args.precision)
+    source = sys.stdin if args.input == '-' else open(args.input, encoding='utf-8')
+    out = sys.stdout if args.output == '-' else open(args.output, 'w', encoding='utf-8')
+    count = errors = 0
+    started = time.perf_counter()
+    try:
+        lines = (line.strip() for line in source)
+        while True:
+            chunk = list(islice(lines, BATCH_CHUNK))
+            if not chunk:
+                break
+            # Blank lines and comments pass through so results line up with input
+            texts = [line for line in chunk if line and not line.startswith('#')]
+            results = engine.evaluate_many(texts)
+            rendered = []
+            for line in chunk:
+                if not line or line.startswith('#'):
+                    rendered.append(line)
+                    continue
+                result = next(results)
+                count += 1
+                if isinstance(result, ExpressionError):
+                    errors += 1
+                    rendered.append(f'error: {result}')
+                else:
+                    rendered.append(format_result(result))
+            out.write('\n'.join(rendered) + '\n')
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if out is not sys.stdout:
+            out.close()
+    elapsed = time.perf_counter() - started
+    info = engine.cache_info()
+    print(f"{count:,} expressions in {elapsed:.2f}s "
+          f"({count / elapsed if elapsed else 0:,.0f}/sec), {errors:,} errors, "
+          f"{info.hits:,} compile cache hits", file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
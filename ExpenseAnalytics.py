@@ -0,0 +1,449 @@
+# EXPENSE ANALYTICS
+# =================
+
+"""
+Spending insights computed with NumPy over a columnar snapshot of the
+expenses table.
+
+load_columns() reads the table in chunks into four flat arrays (ids,
+dates as datetime64[D], categories as small int codes, amounts as int64
+cents). Every statistic below is then a handful of whole-array NumPy
+operations, with no Python loop over rows, so ten million expenses take
+seconds rather than minutes.
+
+NumPy is optional for the tracker as a whole: without it this module
+fails to import and the GUI simply leaves the insights out.
+
+Usage:
+    python ExpenseAnalytics.py --db expenses.db
+"""
+
+import argparse
+import sys
+from datetime import date
+from decimal import Decimal
+
+import numpy as np
+
+# Rowid range read and parsed per query while loading
+CHUNK_ROWS = 250_000
+
+# Modified z-score above which an expense counts as an outlier
+# (Iglewicz and Hoaglin's usual cut-off)
+OUTLIER_THRESHOLD = 3.5
+
+PERCENTILES = (0.5, 0.9, 0.99)
+
+WEEKDAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+          'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+# julianday() of 1970-01-01, the datetime64 epoch
+_UNIX_EPOCH_JD = 2440587.5
+
+
+def cents_to_decimal(cents):
+    """Whole cents (int or NumPy scalar, rounded) -> Decimal dollars"""
+    return Decimal(int(round(float(cents)))).scaleb(-2)
+
+
+class ExpenseColumns:
+    """One column per field, row i of each belonging to the same expense"""
+
+    def __init__(self, ids, dates, codes, cents, categories):
+        self.ids = ids                  # int64
+        self.dates = dates              # datetime64[D]
+        self.codes = codes              # int16, index into categories
+        self.cents = cents              # int64
+        self.categories = categories    # tuple of names
+
+    def __len__(self):
+        return len(self.ids)
+
+    def select(self, rows):
+        """A new ExpenseColumns with only rows (a boolean mask or indexes)"""
+        return ExpenseColumns(self.ids[rows], self.dates[rows], self.codes[rows],
+                              self.cents[rows], self.categories)
+
+    @property
+    def days(self):
+        """Dates as int64 days since 1970-01-01 (a view, no copy)"""
+        return self.dates.view(np.int64)
+
+
+# ============= LOADING =============
+
+def load_columns(db, chunk_size=CHUNK_ROWS):
+    """Read every expense from db into an ExpenseColumns snapshot.
+
+    The table is read in rowid ranges of chunk_size (see iter_chunks)
+    and the chunks are concatenated.
+    """
+    chunks = list(iter_chunks(db, chunk_size))
+    if not chunks:
+        empty = np.empty(0, dtype=np.int64)
+        return ExpenseColumns(empty, empty.view('datetime64[D]'), empty.astype(np.int16),
+                              empty, ())
+    return ExpenseColumns(
+        np.concatenate([chunk.ids for chunk in chunks]),
+        np.concatenate([chunk.dates for chunk in chunks]),
+        np.concatenate([chunk.codes for chunk in chunks]),
+        np.concatenate([chunk.cents for chunk in chunks]),
+        chunks[0].categories)
+
+
+def iter_chunks(db, chunk_size=CHUNK_ROWS, filters=None):
+    """Yield ExpenseColumns for the expenses in db, one chunk at a time.
+
+    SQLite does the per-row work (date to a day number, category to its
+    code) and joins each column of a rowid range into one comma-separated
+    string, which NumPy parses in a single call, so no Python object is
+    created per row. All chunks are read in one transaction, so they form
+    a consistent snapshot even while the GUI keeps writing; every chunk
+    shares the same category codes.
+
+    Archived months follow the live rows, straight from their
+    memory-mapped columns (see ExpenseArchive), with no SQL at all.
+
+    filters, an ExpenseFilter, is applied in SQL to live rows and as a
+    mask to archived ones; text conditions only work on live rows.
+    """
+    where, params = filters.compile() if filters is not None else ('', [])
+    condition = f'AND ({where[len("WHERE "):]})' if where else ''
+    with db.read_connection() as conn:
+        owns_transaction = not conn.in_transaction
+        if owns_transaction:
+            conn.execute('BEGIN')
+        try:
+            partitions = db.archived_partitions(conn)
+            if partitions and filters is not None and filters.texts:
+                raise ValueError("text filters cannot be applied to archived months")
+            names = {row[0] for row in conn.execute('SELECT DISTINCT category FROM expenses')}
+            for partition in partitions:
+                names.update(partition.categories)
+            categories = tuple(sorted(names))
+            low, high = conn.execute('SELECT MIN(id), MAX(id) FROM expenses').fetchone()
+            case = ' '.join(f'WHEN ? THEN {code}' for code in range(len(categories)))
+            # Every group_concat in one SELECT sees the rows in the same order
+            sql = f'''
+                SELECT group_concat(id),
+                       group_concat(CAST(julianday(date) - {_UNIX_EPOCH_JD} AS INTEGER)),
+                       group_concat(CASE category {case} ELSE -1 END),
+                       group_concat(amount_cents)
+                FROM expenses
+                WHERE id >= ? AND id < ? AND julianday(date) IS NOT NULL {condition}
+            '''
+            for start in range(low or 0, (high or -1) + 1, chunk_size):
+                texts = conn.execute(sql, (*categories, start, start + chunk_size,
+                                           *params)).fetchone()
+                if texts[0] is not None:
+                    ids, days, codes, cents = (np.fromstring(text, dtype=np.int64, sep=',')
+                                               for text in texts)
+                    yield ExpenseColumns(ids, days.view('datetime64[D]'),
+                                         codes.astype(np.int16), cents, categories)
+
+            codes_of = {name: code for code, name in enumerate(categories)}
+            for partition in partitions:
+                chunk = _partition_columns(partition, codes_of, categories, filters)
+                if len(chunk):
+                    yield chunk
+        finally:
+            if owns_transaction:
+                conn.execute('ROLLBACK')
+
+
+def _partition_columns(partition, codes_of, categories, filters):
+    start, stop = 0, partition.rows
+    if filters is not None:
+        # Rows are in date order, so a date range is a slice
+        start, stop = partition.date_span(filters.start_date, filters.end_date)
+    month_start = np.datetime64(partition.month, 'D').astype(np.int64)
+    # Partition codes index its own dictionary; map them onto ours
+    remap = np.array([codes_of[name] for name in partition.categories], dtype=np.int16)
+    chunk = ExpenseColumns(
+        np.frombuffer(partition.id, dtype=np.int64)[start:stop],
+        (month_start - 1 + np.frombuffer(partition.day, dtype=np.uint8)[start:stop]
+         ).view('datetime64[D]'),
+        remap[np.frombuffer(partition.category, dtype=np.uint16)[start:stop]],
+        np.frombuffer(partition.cents, dtype=np.int64)[start:stop],
+        categories)
+    if filters is None:
+        return chunk
+    from ExpenseTracker import to_cents
+
+    keep = np.ones(len(chunk), dtype=bool)
+    if filters.categories is not None:
+        wanted = [codes_of[name] for name in filters.categories if name in codes_of]
+        keep &= np.isin(chunk.codes, wanted)
+    if filters.min_amount is not None:
+        keep &= chunk.cents >= to_cents(filters.min_amount)
+    if filters.max_amount is not None:
+        keep &= chunk.cents <= to_cents(filters.max_amount)
+    return chunk if keep.all() else chunk.select(keep)
+
+
+# ============= STATISTICS =============
+
+def daily_totals(columns, end=None):
+    """Return (first day, int64 cents per day) from the first expense to end.
+
+    Days without spending are zeros, so position i is first day + i.
+    """
+    end_day = np.datetime64(end or date.today(), 'D').astype(np.int64)
+    if not len(columns):
+        return np.datetime64(int(end_day), 'D'), np.zeros(1, dtype=np.int64)
+    days = columns.days
+    first = min(int(days.min()), int(end_day))
+    last = max(int(days.max()), int(end_day))
+    # float64 sums of whole cents stay exact far beyond any real total
+    totals = np.bincount(days - first, weights=columns.cents,
+                         minlength=last - first + 1)
+    return np.datetime64(first, 'D'), np.rint(totals).astype(np.int64)
+
+
+def rolling_spend(columns, window, end=None):
+    """Return (dates, cents spent in the window days ending on each date)"""
+    first, daily = daily_totals(columns, end)
+    running = np.concatenate(([0], np.cumsum(daily)))
+    index = np.arange(1, len(running))
+    totals = running[index] - running[np.maximum(index - window, 0)]
+    return first + np.arange(len(daily)), totals
+
+
+def category_percentiles(columns, percentiles=PERCENTILES):
+    """Return {category: [amount in cents at each percentile]}.
+
+    Linear interpolation between the closest ranks, like np.percentile,
+    but for every category at once: one sort groups the amounts by
+    category and all ranks are looked up in one fancy index.
+    """
+    valid = columns.codes >= 0
+    amounts, starts, sizes = _group_sort(columns.codes[valid], columns.cents[valid],
+                                         len(columns.categories))
+    present = np.flatnonzero(sizes)
+    starts, sizes = starts[present], sizes[present]
+    ranks = (sizes - 1)[:, None] * np.asarray(percentiles)[None, :]
+    lower = np.floor(ranks).astype(np.int64)
+    upper = np.minimum(lower + 1, (sizes - 1)[:, None])
+    fraction = ranks - lower
+    base = starts[:, None]
+    values = (amounts[base + lower] * (1 - fraction)
+              + amounts[base + upper] * fraction)
+    return {columns.categories[code]: list(row) for code, row in zip(present, values)}
+
+
+def monthly_totals(columns):
+    """Return (months as datetime64[M], int64 cents per month), no gaps"""
+    if not len(columns):
+        return np.array([], dtype='datetime64[M]'), np.array([], dtype=np.int64)
+    months = columns.dates.astype('datetime64[M]').view(np.int64)
+    first = months.min()
+    totals = np.bincount(months - first, weights=columns.cents)
+    return (np.datetime64(int(first), 'M') + np.arange(len(totals)),
+            np.rint(totals).astype(np.int64))
+
+
+def month_over_month(columns):
+    """Return (months, totals, change from the previous month, change ratio).
+
+    The ratio is NaN where the previous month had no spending.
+    """
+    months, totals = monthly_totals(columns)
+    deltas = np.diff(totals, prepend=totals[:1])
+    previous = np.concatenate((totals[:1], totals[:-1])).astype(np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratios = np.where(previous > 0, deltas / previous, np.nan)
+    if len(ratios):
+        ratios[0] = np.nan
+    return months, totals, deltas, ratios
+
+
+def category_month_matrix(columns):
+    """Return (months, int64 cents[month, category code])"""
+    if not len(columns):
+        return (np.array([], dtype='datetime64[M]'),
+                np.zeros((0, len(columns.categories)), dtype=np.int64))
+    months = columns.dates.astype('datetime64[M]').view(np.int64)
+    first = months.min()
+    span = months.max() - first + 1
+    width = len(columns.categories)
+    valid = columns.codes >= 0
+    cells = (months[valid] - first) * width + columns.codes[valid]
+    totals = np.bincount(cells, weights=columns.cents[valid], minlength=span * width)
+    return (np.datetime64(int(first), 'M') + np.arange(span),
+            np.rint(totals).astype(np.int64).reshape(span, width))
+
+
+def weekday_profile(columns, end=None):
+    """Return the average cents spent on each weekday, Monday first.
+
+    Averages are over every calendar day in the covered range, so a
+    weekday with no spending pulls its average down.
+    """
+    first, daily = daily_totals(columns, end)
+    # 1970-01-01 was a Thursday, three days after a Monday
+    weekdays = (first.astype(np.int64) + 3 + np.arange(len(daily))) % 7
+    spent = np.bincount(weekdays, weights=daily, minlength=7)
+    days = np.bincount(weekdays, minlength=7)
+    return np.divide(spent, days, out=np.zeros(7), where=days > 0)
+
+
+def seasonality_profile(columns):
+    """Return the average cents spent in each calendar month, January first"""
+    months, totals = monthly_totals(columns)
+    month_of_year = months.view(np.int64) % 12
+    spent = np.bincount(month_of_year, weights=totals, minlength=12)
+    seen = np.bincount(month_of_year, minlength=12)
+    return np.divide(spent, seen, out=np.zeros(12), where=seen > 0)
+
+
+def find_outliers(columns, threshold=OUTLIER_THRESHOLD, limit=20):
+    """Return the most unusual expenses for their category.
+
+    Uses the modified z-score 0.6745 * (amount - median) / MAD, computed
+    per category, which a few huge expenses cannot skew the way a mean
+    and standard deviation would. Returns up to limit (id, category, date,
+    cents, score) tuples, highest score first.
+    """
+    valid = columns.codes >= 0
+    codes = columns.codes[valid]
+    cents = columns.cents[valid]
+    if not len(cents):
+        return []
+    groups = len(columns.categories)
+
+    # Work in half-cents so medians of even-sized groups stay integers
+    doubled = 2 * cents
+    medians = _group_medians_doubled(codes, cents, groups)[codes]
+    deviations = np.abs(doubled - medians)
+    # Twice the median of the doubled deviations is four times the MAD;
+    # halve it to match the doubled amounts
+    mads = _group_medians_doubled(codes, deviations, groups)[codes] / 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scores = np.where(mads > 0, 0.6745 * (doubled - medians) / mads, 0.0)
+
+    flagged = np.flatnonzero(scores > threshold)
+    flagged = flagged[np.argsort(-scores[flagged], kind='stable')][:limit]
+    return [(int(expense_id), columns.categories[code], str(day), int(amount), float(score))
+            for expense_id, code, day, amount, score in zip(
+                columns.ids[valid][flagged], codes[flagged], columns.dates[valid][flagged],
+                cents[flagged], scores[flagged])]
+
+
+# Group codes are packed above the values so one np.sort of plain int64
+# keys groups and orders at once (much faster than lexsort or argsort)
+_VALUE_BITS = 46
+_VALUE_MASK = (1 << _VALUE_BITS) - 1
+
+
+def _group_sort(codes, values, groups):
+    """Return (values sorted within groups, group starts, group sizes).
+
+    codes must be 0..groups-1. Values are shifted by their minimum before
+    packing, so negative ones (refunds) sort correctly too; a range too
+    wide to pack falls back to lexsort.
+    """
+    base = values.min() if len(values) else 0
+    shifted = values - base
+    if len(values) and shifted.max() > _VALUE_MASK:
+        order = np.lexsort((values, codes))
+        bounds = np.searchsorted(codes[order], np.arange(groups + 1))
+        return values[order], bounds[:-1], np.diff(bounds)
+    keys = np.sort((codes.astype(np.int64) << _VALUE_BITS) | shifted)
+    bounds = np.searchsorted(keys >> _VALUE_BITS, np.arange(groups + 1))
+    return (keys & _VALUE_MASK) + base, bounds[:-1], np.diff(bounds)
+
+
+def _group_medians_doubled(codes, values, groups):
+    # Twice the median of each group (0 for empty groups), as int64
+    ordered, starts, sizes = _group_sort(codes, values, groups)
+    if not len(ordered):
+        return np.zeros(groups, dtype=np.int64)
+    last = np.maximum(sizes - 1, 0)
+    lower = np.minimum(starts + last // 2, len(ordered) - 1)
+    upper = np.minimum(starts + (last + 1) // 2, len(ordered) - 1)
+    return np.where(sizes > 0, ordered[lower] + ordered[upper], 0)
+
+
+# ============= SUMMARY =============
+
+def summarize(db, today=None):
+    """Load db and compute the headline numbers the tracker shows.
+
+    Returns a dict of plain Python values (Decimals for money), safe to
+    hand across threads.
+    """
+    today = today or date.today()
+    columns = load_columns(db)
+    _, last_7 = rolling_spend(columns, 7, today)
+    _, last_30 = rolling_spend(columns, 30, today)
+    months, totals, deltas, ratios = month_over_month(columns)
+    weekdays = weekday_profile(columns, today)
+    seasons = seasonality_profile(columns)
+
+    this_month = np.datetime64(today, 'M')
+    month_change = None
+    if len(months) and months[-1] == this_month and len(months) > 1:
+        ratio = ratios[-1]
+        month_change = (cents_to_decimal(totals[-1]), cents_to_decimal(deltas[-1]),
+                        None if np.isnan(ratio) else float(ratio))
+
+    return {
+        'rows': len(columns),
+        'last_7_days': cents_to_decimal(last_7[-1]),
+        'last_30_days': cents_to_decimal(last_30[-1]),
+        'month_change': month_change,
+        'busiest_weekday': WEEKDAYS[int(np.argmax(weekdays))] if len(columns) else None,
+        'weekday_profile': {name: cents_to_decimal(value)
+                            for name, value in zip(WEEKDAYS, weekdays)},
+        'seasonality': {name: cents_to_decimal(value) for name, value in zip(MONTHS, seasons)},
+        'percentiles': {category: [cents_to_decimal(value) for value in values]
+                        for category, values in category_percentiles(columns).items()},
+        'outliers': [(expense_id, category, day, cents_to_decimal(cents), score)
+                     for expense_id, category, day, cents, score in find_outliers(columns)],
+    }
+
+
+def main(argv=None):
+    from ExpenseTracker import ExpenseDatabase
+    import time
+
+    parser = argparse.ArgumentParser(description="Spending statistics")
+    parser.add_argument('--db', default='expenses.db', help="database file")
+    args = parser.parse_args(argv)
+
+    with ExpenseDatabase(args.db) as db:
+        started = time.perf_counter()
+        summary = summarize(db)
+        elapsed = time.perf_counter() - started
+
+    print(f"{summary['rows']:,} expenses analysed in {elapsed:.2f}s\n")
+    print(f"Last 7 days:   ${summary['last_7_days']:,.2f}")
+    print(f"Last 30 days:  ${summary['last_30_days']:,.2f}")
+    if summary['month_change']:
+        total, delta, ratio = summary['month_change']
+        change = f" ({ratio:+.0%})" if ratio is not None else ""
+        print(f"This month:    ${total:,.2f}, {delta:+,.2f} vs last month{change}")
+
+    print("\nAverage per weekday")
+    for name, value in summary['weekday_profile'].items():
+        print(f"  {name}  ${value:>12,.2f}")
+    print("\nAverage per calendar month")
+    for name, value in summary['seasonality'].items():
+        print(f"  {name}  ${value:>12,.2f}")
+
+    labels = '  '.join(f"p{round(p * 100):<11}" for p in PERCENTILES)
+    print(f"\n{'Category':<15} {labels}")
+    for category, values in sorted(summary['percentiles'].items()):
+        print(f"{category:<15} " + '  '.join(f"${value:>11,.2f}" for value in values))
+
+    if summary['outliers']:
+        print("\nUnusual expenses")
+        for expense_id, category, day, amount, score in summary['outliers']:
+            print(f"  #{expense_id:<8} {day}  {category:<15} ${amount:>11,.2f}  "
+                  f"(score {score:.1f})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
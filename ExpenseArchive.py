@@ -0,0 +1,307 @@
+# EXPENSE ARCHIVE FORMAT
+# ======================
+
+"""
+Compact, memory-mapped columnar files for closed months of expenses.
+
+One file holds one month (a "partition"). Rows are sorted by (date, id)
+and stored column by column, each column a flat little array the reader
+maps straight out of the file with no parsing:
+
+    id        int64     expense id
+    day       uint8     day of the month
+    category  uint16    index into the footer's category dictionary
+    cents     int64     amount in integer cents
+    currency  uint16    index into the footer's currency dictionary
+    offsets   uint32    start of each description in the text blob (n + 1)
+    text      bytes     UTF-8 descriptions, back to back
+
+A JSON footer at the end of the file records where each column starts,
+the two dictionaries, and the partition's statistics: row count, min/max
+id, date and amount, the total, and count/total per category and per
+day. Aggregates are answered from the footer alone.
+
+File layout: MAGIC, the columns (each padded to 8 bytes), the footer,
+then the footer length as uint32 and MAGIC again.
+
+This module only knows about files and plain tuples
+(id, date, category, cents, description, currency); ExpenseDatabase
+decides which months are archived and unions them with the live table.
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+
+MAGIC = b'EXPARC01'
+FORMAT_VERSION = 1
+_TRAILER = struct.Struct('<I8s')
+
+# (name, array typecode); typecodes are the same width on every platform
+# we support, which read_partition double-checks against itemsize
+COLUMNS = (
+    ('id', 'q'),
+    ('day', 'B'),
+    ('category', 'H'),
+    ('cents', 'q'),
+    ('currency', 'H'),
+    ('offsets', 'I'),
+    ('text', 'B'),
+)
+
+
+class ArchiveError(ValueError):
+    """A partition file is missing, truncated or not in this format"""
+
+
+def partition_filename(month, generation):
+    """File name for one month; the generation changes on every rewrite
+    so a file that readers may still have mapped is never overwritten"""
+    return f'{month}.{generation}.expa'
+
+
+def write_partition(path, month, rows):
+    """Write one month of rows to path and return the footer dict.
+
+    rows are (id, 'YYYY-MM-DD', category, cents, description, currency)
+    tuples from that month, in any order. The file is written under a
+    temporary name, synced and renamed, so a crash never leaves a
+    half-written partition behind.
+    """
+    rows = sorted(rows, key=lambda row: (row[1], row[0]))
+    if not rows:
+        raise ValueError(f"no rows to archive for {month}")
+
+    categories, currencies = {}, {None: 0}
+    columns = {name: array(code) for name, code in COLUMNS}
+    text = bytearray()
+    by_category, by_day = {}, {}
+    for expense_id, date, category, cents, description, currency in rows:
+        if date[:7] != month:
+            raise ValueError(f"expense {expense_id} dated {date} is not in {month}")
+        day = date[8:10]
+        columns['id'].append(expense_id)
+        columns['day'].append(int(day))
+        columns['category'].append(categories.setdefault(category, len(categories)))
+        columns['cents'].append(cents)
+        columns['currency'].append(currencies.setdefault(currency, len(currencies)))
+        columns['offsets'].append(len(text))
+        text += (description or '').encode('utf-8')
+        for key, stats in ((category, by_category), (day, by_day)):
+            entry = stats.setdefault(key, [0, 0])
+            entry[0] += 1
+            entry[1] += cents
+    columns['offsets'].append(len(text))
+    columns['text'] = array('B', text)
+
+    amounts = columns['cents']
+    footer = {
+        'version': FORMAT_VERSION,
+        'byteorder': sys.byteorder,
+        'month': month,
+        'rows': len(rows),
+        'min_id': min(columns['id']),
+        'max_id': max(columns['id']),
+        'min_date': rows[0][1],
+        'max_date': rows[-1][1],
+        'min_cents': min(amounts),
+        'max_cents': max(amounts),
+        'total_cents': sum(amounts),
+        'categories': list(categories),
+        'currencies': list(currencies),
+        'by_category': by_category,
+        'by_day': by_day,
+        'columns': {},
+    }
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        for name, code in COLUMNS:
+            data = columns[name].tobytes()
+            footer['columns'][name] = [f.tell(), len(columns[name])]
+            f.write(data)
+            f.write(b'\0' * (-len(data) % 8))
+        encoded = json.dumps(footer, separators=(',', ':')).encode('utf-8')
+        f.write(encoded)
+        f.write(_TRAILER.pack(len(encoded), MAGIC))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return footer
+
+
+class ArchivePartition:
+    """
+    One partition file, memory-mapped read-only.
+
+    Columns are memoryviews straight into the mapping, so opening a
+    partition costs one footer parse however many rows it holds, and the
+    OS pages in only the columns a query touches.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            try:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise ArchiveError(f"{path}: empty file") from None
+        try:
+            self.footer = self._read_footer()
+            self._open_columns()
+        except Exception:
+            self.close()
+            raise
+
+        footer = self.footer
+        self.month = footer['month']
+        self.rows = footer['rows']
+        self.categories = footer['categories']
+        self.currencies = footer['currencies']
+
+    def _read_footer(self):
+        size = len(self._map)
+        if size < len(MAGIC) + _TRAILER.size or self._map[:len(MAGIC)] != MAGIC:
+            raise ArchiveError(f"{self.path}: not an expense archive")
+        length, magic = _TRAILER.unpack_from(self._map, size - _TRAILER.size)
+        start = size - _TRAILER.size - length
+        if magic != MAGIC or start < len(MAGIC):
+            raise ArchiveError(f"{self.path}: truncated archive")
+        footer = json.loads(self._map[start:start + length])
+        if footer.get('version') != FORMAT_VERSION:
+            raise ArchiveError(f"{self.path}: unsupported format version "
+                               f"{footer.get('version')}")
+        return footer
+
+    def _open_columns(self):
+        swap = self.footer['byteorder'] != sys.byteorder
+        view = memoryview(self._map)
+        for name, code in COLUMNS:
+            offset, count = self.footer['columns'][name]
+            width = array(code).itemsize
+            if offset + count * width > len(self._map):
+                raise ArchiveError(f"{self.path}: column {name} runs past the end")
+            if swap and width > 1:
+                # Written on a machine of the other byte order: copy and fix
+                column = array(code, bytes(view[offset:offset + count * width]))
+                column.byteswap()
+            else:
+                column = view[offset:offset + count * width].cast(code)
+            setattr(self, name, column)
+
+    def close(self):
+        for name, _ in COLUMNS:
+            column = getattr(self, name, None)
+            if isinstance(column, memoryview):
+                column.release()
+        self._map.close()
+
+    def __len__(self):
+        return self.rows
+
+    # ---------- rows ----------
+
+    def row(self, index):
+        """Return row index as (id, date, category, cents, description, currency)"""
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return (self.id[index], f'{self.month}-{self.day[index]:02d}',
+                self.categories[self.category[index]], self.cents[index],
+                bytes(self.text[start:end]).decode('utf-8'),
+                self.currencies[self.currency[index]])
+
+    def select(self, start=0, stop=None, reverse=False, categories=None,
+               min_cents=None, max_cents=None):
+        """Yield rows start..stop that pass the category and amount tests.
+
+        The tests run on the raw columns, so rows that fail them are never
+        decoded.
+        """
+        stop = self.rows if stop is None else stop
+        indexes = range(stop - 1, start - 1, -1) if reverse else range(start, stop)
+        if categories is not None:
+            codes = {code for code, name in enumerate(self.categories) if name in categories}
+            if not codes:
+                return
+            if len(codes) < len(self.categories):
+                column = self.category
+                indexes = (index for index in indexes if column[index] in codes)
+        if min_cents is not None and min_cents > self.footer['min_cents']:
+            cents = self.cents
+            indexes = (index for index in indexes if cents[index] >= min_cents)
+        if max_cents is not None and max_cents < self.footer['max_cents']:
+            cents = self.cents
+            indexes = (index for index in indexes if cents[index] <= max_cents)
+        for index in indexes:
+            yield self.row(index)
+
+    def date_span(self, start_date=None, end_date=None):
+        """Return (start, stop) row indexes for dates in [start_date, end_date]"""
+        footer = self.footer
+        start, stop = 0, self.rows
+        if start_date is not None and start_date > footer['min_date']:
+            start = (self.rows if start_date > footer['max_date']
+                     else bisect_left(self.day, int(start_date[8:10])))
+        if end_date is not None and end_date < footer['max_date']:
+            stop = (0 if end_date < footer['min_date']
+                    else bisect_right(self.day, int(end_date[8:10])))
+        return start, max(start, stop)
+
+    def key_index(self, date, expense_id, inclusive=False):
+        """Index of the first row whose (date, id) is greater than the key
+        (or equal to it too, if inclusive)"""
+        if date < self.footer['min_date']:
+            return 0
+        if date > self.footer['max_date']:
+            return self.rows
+        day = int(date[8:10])
+        low = bisect_left(self.day, day)
+        high = bisect_right(self.day, day, low)
+        # Within one day rows are sorted by id
+        search = bisect_left if inclusive else bisect_right
+        return search(self.id, expense_id, low, high)
+
+    def find_id(self, expense_id):
+        """Return the row index of expense_id, or None"""
+        if not self.footer['min_id'] <= expense_id <= self.footer['max_id']:
+            return None
+        offset = self.footer['columns']['id'][0]
+        end = offset + self.rows * 8
+        needle = array('q', [expense_id])
+        if self.footer['byteorder'] != sys.byteorder:
+            needle.byteswap()
+        needle = needle.tobytes()
+        position = self._map.find(needle, offset, end)
+        while position != -1:
+            if (position - offset) % 8 == 0:
+                return (position - offset) // 8
+            position = self._map.find(needle, position + 1, end)
+        return None
+
+    # ---------- footer statistics ----------
+
+    def total(self):
+        return self.footer['total_cents']
+
+    def category_totals(self):
+        """{category: (count, cents)} without touching row data"""
+        return {category: tuple(stats)
+                for category, stats in self.footer['by_category'].items()}
+
+    def day_totals(self):
+        """{'YYYY-MM-DD': (count, cents)} without touching row data"""
+        return {f'{self.month}-{day}': tuple(stats)
+                for day, stats in self.footer['by_day'].items()}
+
+
+def read_partition(path):
+    """Open a partition file; raises ArchiveError if it is not usable"""
+    for _, code in COLUMNS:
+        expected = {'q': 8, 'B': 1, 'H': 2, 'I': 4}[code]
+        if array(code).itemsize != expected:
+            raise ArchiveError(f"array typecode {code!r} is not {expected} bytes here")
+    return ArchivePartition(path)
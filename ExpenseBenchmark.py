@@ -0,0 +1,452 @@
+# EXPENSE DATABASE BENCHMARKS
+# ===========================
+
+"""
+Reproducible benchmarks for ExpenseDatabase at realistic table sizes.
+
+A seeded generator builds each database once (cached next to the results
+so later runs skip the load), then every operation is timed repeatedly
+and reported as throughput plus p50/p95/p99 latency.
+
+Usage:
+    python ExpenseBenchmark.py run --sizes 10k 100k --out results.json
+    python ExpenseBenchmark.py run --sizes 1m 10m --repeat 50
+    python ExpenseBenchmark.py compare baseline.json results.json --threshold 0.10
+    python ExpenseBenchmark.py stress --threads 32 --writes 200
+
+compare exits with status 1 when any operation's p50 or p95 got slower
+by more than the threshold, so it can gate CI. stress exits with status 1
+if concurrent writers through the WriteQueue lost or misplaced a write.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import threading
+import time
+from datetime import date, timedelta
+
+from ExpenseTracker import (CACHE_SIZE, CATEGORIES, GROUP_COMMIT_MAX_WRITES,
+                            GROUP_COMMIT_WINDOW_MS, ExpenseDatabase, ExpenseFilter,
+                            PAGE_SIZE, WriteQueue)
+
+# Generated dates end here rather than today, so a seed means the same
+# rows - and the same deep-page and filter hits - on every day it is run
+BENCH_END = date(2025, 12, 31)
+
+SIZES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000, '10m': 10_000_000}
+
+DESCRIPTIONS = ('coffee', 'lunch', 'groceries', 'taxi', 'train ticket', 'rent',
+                'electricity bill', 'cinema', 'books', 'pharmacy', 'gym', 'fuel')
+
+
+# ============= SYNTHETIC DATA =============
+
+def generate_expenses(count, seed=42, years=5):
+    """Yield count (date, category, amount, description) rows.
+
+    The same seed always yields the same rows, spread over the years up to
+    BENCH_END. Categories are skewed like real spending (Food and Transport
+    dominate), amounts are log-normal.
+    """
+    rng = random.Random(seed)
+    days = 365 * years
+    start = BENCH_END - timedelta(days=days - 1)
+    weights = [30, 20, 8, 12, 10, 5, 5, 10][:len(CATEGORIES)]
+    for _ in range(count):
+        day = start + timedelta(days=rng.randrange(days))
+        category = rng.choices(CATEGORIES, weights)[0]
+        cents = max(1, int(rng.lognormvariate(7.5, 1.1)))
+        description = f"{rng.choice(DESCRIPTIONS)} #{rng.randrange(1000)}"
+        yield day.isoformat(), category, f'{cents // 100}.{cents % 100:02d}', description
+
+
+def prepare_database(path, count, seed):
+    """Create (or reuse) a database holding exactly count seeded rows"""
+    if os.path.exists(path):
+        with ExpenseDatabase(path) as db:
+            newest = db.get_expenses_page(limit=1)
+            # Databases cached before BENCH_END ran up to the day they were made
+            if db.count_expenses() == count and newest \
+                    and newest[0].date <= BENCH_END.isoformat():
+                return
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    started = time.perf_counter()
+    with ExpenseDatabase(path) as db:
+        db.add_expenses_many(generate_expenses(count, seed), batch_size=20000)
+    print(f"  generated {count:,} rows in {time.perf_counter() - started:.1f}s")
+
+
+# ============= MEASUREMENT =============
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def measure(operation, repeat, warmup=2):
+    """Time operation() repeat times; return latency stats in milliseconds"""
+    for _ in range(warmup):
+        operation()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        operation()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    total_seconds = sum(samples) / 1000
+    return {
+        'runs': repeat,
+        'ops_per_sec': repeat / total_seconds if total_seconds else 0.0,
+        'mean_ms': statistics.fmean(samples),
+        'p50_ms': percentile(samples, 0.50),
+        'p95_ms': percentile(samples, 0.95),
+        'p99_ms': percentile(samples, 0.99),
+        'max_ms': samples[-1],
+    }
+
+
+class FakeTree:
+    """Just enough of ttk.Treeview to drive VirtualExpenseList headlessly"""
+
+    def __init__(self):
+        self.items = []
+        self.values = {}
+
+    def configure(self, **options):
+        pass
+
+    def get_children(self, item=''):
+        return tuple(self.items)
+
+    def delete(self, *items):
+        for item in items:
+            self.values.pop(item)
+        self.items = [item for item in self.items if item in self.values]
+
+    def insert(self, parent, index, iid=None, values=()):
+        self.values[iid] = values
+        if index == 'end':
+            self.items.append(iid)
+        else:
+            self.items.insert(index, iid)
+        return iid
+
+    def yview_moveto(self, fraction):
+        pass
+
+
+def refresh_operation(db):
+    """What refresh_expense_list does: first page plus the totals"""
+    from ExpenseTracker import VirtualExpenseList
+
+    class Scrollbar:
+        def set(self, first, last):
+            pass
+
+    expense_list = VirtualExpenseList(FakeTree(), Scrollbar(), db)
+
+    def refresh():
+        expense_list.reload()
+        db.get_total_expenses()
+        db.get_total_by_category()
+    return refresh
+
+
+def operations(db, rng):
+    """Name -> zero-argument callable for every benchmarked operation"""
+    newest = db.get_expenses_page(limit=1)
+    today = date.fromisoformat(newest[0].date) if newest else BENCH_END
+    rows = generate_expenses(10**9, seed=rng.randrange(10**6))
+
+    def add_expense():
+        db.add_expense(*next(rows))
+
+    def add_expenses_many_1000():
+        db.add_expenses_many(next(rows) for _ in range(1000))
+
+    def monthly_total():
+        db.get_monthly_total(today.year - rng.randrange(3), rng.randint(1, 12))
+
+    def date_range_list():
+        start = today - timedelta(days=rng.randrange(365))
+        db.get_expenses_by_date_range(start.isoformat(),
+                                      (start + timedelta(days=7)).isoformat())
+
+    def filtered_iter():
+        start = today - timedelta(days=rng.randrange(365))
+        filters = ExpenseFilter(categories={rng.choice(CATEGORIES)},
+                                start_date=start.isoformat(),
+                                end_date=(start + timedelta(days=30)).isoformat())
+        for _ in db.iter_expenses(filters):
+            pass
+
+    def deep_page():
+        # Keyset paging costs the same however deep the page is
+        db.get_expenses_page(after=(f'{today.year - 2}-06-15', 0), limit=PAGE_SIZE)
+
+    def search():
+        db.search_expenses(rng.choice(DESCRIPTIONS)[:4], 50)
+
+    ops = {
+        'add_expense': add_expense,
+        'add_expenses_many_1000': add_expenses_many_1000,
+        'get_total_expenses': db.get_total_expenses,
+        'get_total_by_category': db.get_total_by_category,
+        'get_monthly_total': monthly_total,
+        'get_expenses_by_date_range_7d': date_range_list,
+        'iter_expenses_filtered_30d': filtered_iter,
+        'get_expenses_page_deep': deep_page,
+        'search_expenses': search,
+        'refresh_expense_list': refresh_operation(db),
+    }
+    return ops
+
+
+# Full-table operations are only run on the smaller sizes
+FULL_SCAN_LIMIT = 100_000
+
+
+def run(args):
+    os.makedirs(args.data_dir, exist_ok=True)
+    results = {
+        'meta': {
+            'seed': args.seed,
+            'repeat': args.repeat,
+            'result_cache': args.cache,
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'sizes': {},
+    }
+    for label in args.sizes:
+        count = SIZES[label.lower()]
+        print(f"{label}: {count:,} rows")
+        path = os.path.join(args.data_dir, f'bench-{label.lower()}-{args.seed}.db')
+        prepare_database(path, count, args.seed)
+
+        # Work on a copy so write benchmarks don't grow the cached database
+        work_path = path + '.work'
+        with sqlite3.connect(path) as source, sqlite3.connect(work_path) as target:
+            source.backup(target)
+
+        rng = random.Random(args.seed)
+        size_results = {}
+        with ExpenseDatabase(work_path, cache_size=CACHE_SIZE if args.cache else 0) as db:
+            ops = operations(db, rng)
+            if count <= FULL_SCAN_LIMIT:
+                ops['get_all_expenses'] = db.get_all_expenses
+            for name, operation in ops.items():
+                if args.only and name not in args.only:
+                    continue
+                repeat = max(3, args.repeat // 10) if 'many' in name or 'all' in name \
+                    else args.repeat
+                stats = measure(operation, repeat)
+                size_results[name] = stats
+                print(f"  {name:<32} {stats['ops_per_sec']:>10,.1f} ops/s  "
+                      f"p50 {stats['p50_ms']:8.3f}  p95 {stats['p95_ms']:8.3f}  "
+                      f"p99 {stats['p99_ms']:8.3f} ms")
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(work_path + suffix):
+                os.remove(work_path + suffix)
+        results['sizes'][label.lower()] = size_results
+
+    with open(args.out, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.out}")
+    return 0
+
+
+def compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+
+    regressions = 0
+    for size, ops in current['sizes'].items():
+        base_ops = baseline['sizes'].get(size, {})
+        for name, stats in ops.items():
+            base = base_ops.get(name)
+            if not base:
+                continue
+            for metric in ('p50_ms', 'p95_ms'):
+                if not base[metric]:
+                    continue
+                change = stats[metric] / base[metric] - 1
+                flag = ''
+                if change > args.threshold:
+                    flag = '  REGRESSION'
+                    regressions += 1
+                elif change < -args.threshold:
+                    flag = '  improved'
+                if flag or args.verbose:
+                    print(f"{size:>5} {name:<32} {metric} {base[metric]:9.3f} -> "
+                          f"{stats[metric]:9.3f} ms ({change:+.1%}){flag}")
+    print(f"{regressions} regression(s) beyond {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+
+# ============= CONCURRENT WRITERS =============
+
+def writer_workload(thread_no, writes, write):
+    """One writer thread's script of adds, updates and deletes.
+    
+    write(method, *args) performs a write and returns its result. Returns
+    {id: (date, category, cents, description)} for the rows this thread
+    expects to survive, so the final table can be checked against it.
+    """
+    rng = random.Random(thread_no)
+    rows = generate_expenses(writes, seed=thread_no)
+    kept = {}
+    for i, (day, category, amount, _) in enumerate(rows):
+        description = f"writer {thread_no} #{i}"
+        expense_id = write('add_expense', day, category, amount, description)
+        cents = int(amount.replace('.', ''))
+        kept[expense_id] = (day, category, cents, description)
+        if i % 10 == 9:
+            # Re-price one of our own rows
+            target = rng.choice(list(kept))
+            day, category, _, description = kept[target]
+            write('update_expense', target, day, category, '1.23', description)
+            kept[target] = (day, category, 123, description)
+        if i % 25 == 24:
+            write('delete_expense', kept.popitem()[0])
+    return kept
+
+
+def run_writers(db, threads, writes, write):
+    """Run the workload on many threads at once; (seconds, expected rows)"""
+    expected, errors = {}, []
+    
+    def worker(thread_no):
+        try:
+            expected.update(writer_workload(thread_no, writes, write))
+        except Exception as e:
+            errors.append(e)
+    
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    if errors:
+        raise errors[0]
+    return elapsed, expected
+
+
+def check_rows(db, expected):
+    """Return a list of problems with the table compared to expected"""
+    problems = []
+    actual = {row.id: (row.date, row.category, int(row.amount * 100), row.description)
+              for row in db.iter_expenses()}
+    for expense_id, row in expected.items():
+        if actual.get(expense_id) != row:
+            problems.append(f"expense {expense_id}: expected {row}, "
+                            f"found {actual.get(expense_id)}")
+    for expense_id in actual.keys() - expected.keys():
+        problems.append(f"expense {expense_id} should not exist")
+    problems.extend(f"{table} {key}: stored {stored}, actual {actual}"
+                    for table, key, stored, actual in db.verify_summaries())
+    return problems
+
+
+def stress(args):
+    os.makedirs(args.data_dir, exist_ok=True)
+    path = os.path.join(args.data_dir, 'stress.db')
+    writes = args.threads * args.writes
+    print(f"{args.threads} threads x {args.writes} adds (plus updates and deletes)")
+    
+    failures = 0
+    for mode in ('direct', 'queued'):
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        with ExpenseDatabase(path, cache_size=0) as db:
+            if mode == 'direct':
+                def write(method, *write_args):
+                    return getattr(db, method)(*write_args)
+            else:
+                writes_queue = WriteQueue(db, args.window_ms, args.max_writes,
+                                          args.max_pending)
+                
+                def write(method, *write_args):
+                    return getattr(writes_queue, method)(*write_args).result()
+            elapsed, expected = run_writers(db, args.threads, args.writes, write)
+            line = f"  {mode:<7} {writes / elapsed:>10,.0f} adds/s  {elapsed:7.2f}s"
+            if mode == 'queued':
+                writes_queue.close()
+                stats = writes_queue.stats()
+                line += (f"  {stats['commits']:,} commits, "
+                         f"{stats['writes_per_commit']:.1f} writes per commit, "
+                         f"largest group {stats['largest_group']}")
+            print(line)
+            problems = check_rows(db, expected)
+            for problem in problems[:10]:
+                print(f"    {problem}")
+            if problems:
+                print(f"    {len(problems)} problem(s)")
+                failures += 1
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    print("OK" if not failures else "FAILED")
+    return 1 if failures else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark ExpenseDatabase")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    bench = commands.add_parser('run', help="run the benchmarks")
+    bench.add_argument('--sizes', nargs='+', default=['10k', '100k'],
+                       choices=sorted(SIZES, key=SIZES.get) + [s.upper() for s in SIZES])
+    bench.add_argument('--repeat', type=int, default=200, help="timed runs per operation")
+    bench.add_argument('--seed', type=int, default=42)
+    bench.add_argument('--only', nargs='+', help="only these operations")
+    bench.add_argument('--data-dir', default='bench_data',
+                       help="where generated databases are cached")
+    bench.add_argument('--out', default='bench_results.json')
+    bench.add_argument('--cache', action='store_true',
+                       help="keep the result cache on; by default the queries "
+                            "themselves are timed")
+    bench.set_defaults(func=run)
+
+    cmp = commands.add_parser('compare', help="compare two result files")
+    cmp.add_argument('baseline')
+    cmp.add_argument('current')
+    cmp.add_argument('--threshold', type=float, default=0.10,
+                     help="relative slowdown that counts as a regression")
+    cmp.add_argument('--verbose', action='store_true', help="show unchanged operations too")
+    cmp.set_defaults(func=compare)
+    
+    load = commands.add_parser('stress', help="many writer threads, direct vs group commit")
+    load.add_argument('--threads', type=int, default=16)
+    load.add_argument('--writes', type=int, default=200, help="adds per thread")
+    load.add_argument('--window-ms', type=float, default=GROUP_COMMIT_WINDOW_MS)
+    load.add_argument('--max-writes', type=int, default=GROUP_COMMIT_MAX_WRITES,
+                      help="most writes per group commit")
+    load.add_argument('--max-pending', type=int, default=1024,
+                      help="queue bound before writers block")
+    load.add_argument('--data-dir', default='bench_data')
+    load.set_defaults(func=stress)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
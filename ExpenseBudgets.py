@@ -0,0 +1,339 @@
+# EXPENSE BUDGETS
+# ===============
+
+"""
+Spending limits per category over daily, weekly, monthly and custom
+rolling windows, checked as every expense is written.
+
+BudgetEngine keeps the spending of each category per day, for only as
+many days back as the longest window reaches, plus each budget's running
+total over its current window. A committed add, update or delete moves
+those totals by the amounts involved, so checking every budget costs the
+same however large the table is. When the date changes each window
+slides forward: the days it leaves are subtracted and the days it gains
+added. Only on startup (and after bulk changes) is the state rebuilt,
+from one indexed pass over the days in range.
+
+Crossing a budget's warning fraction or its limit calls on_alert with a
+BudgetAlert, once per level per window.
+
+Usage:
+    python ExpenseBudgets.py --db expenses.db
+"""
+
+import argparse
+import sys
+import threading
+from collections import namedtuple
+from datetime import date, timedelta
+
+from ExpenseTracker import ExpenseDatabase, from_cents, to_cents
+
+# Alert levels, in increasing order of urgency
+OK, WARNING, EXCEEDED = 0, 1, 2
+LEVEL_NAMES = ('ok', 'warning', 'exceeded')
+
+# A budget's state for its current window; start and end are dates,
+# inclusive, and ratio is spent / limit
+BudgetStatus = namedtuple('BudgetStatus', 'budget start end spent ratio level')
+
+# Sent to on_alert when spending moves a budget up to a new level
+BudgetAlert = namedtuple('BudgetAlert', 'status level')
+
+
+def budget_window(budget, today):
+    """The (first, last) day ordinals of budget's window containing today"""
+    day = today.toordinal()
+    if budget.period == 'daily':
+        return day, day
+    if budget.period == 'weekly':
+        start = day - today.weekday()
+        return start, start + 6
+    if budget.period == 'monthly':
+        start = today.replace(day=1)
+        following = (start + timedelta(days=31)).replace(day=1)
+        return start.toordinal(), following.toordinal() - 1
+    if budget.period == 'custom':
+        # Never before 0001-01-01, whatever an older database holds
+        return max(day - budget.days + 1, 1), day
+    raise ValueError(f"unknown budget period {budget.period!r}")
+
+
+def _ordinal(day):
+    # Dates that don't parse can't fall in any window
+    try:
+        return date.fromisoformat(day).toordinal()
+    except (TypeError, ValueError):
+        return None
+
+
+class BudgetEngine:
+    """
+    Rolling-window budget state kept current from the database's change
+    events. Thread-safe: listeners run on whichever thread wrote.
+
+        engine = BudgetEngine(db, on_alert=print)
+        for status in engine.status():
+            ...
+        engine.close()
+
+    on_update() is called after every change the state took in, for a
+    display to refresh. today is a callable returning the current date.
+    """
+
+    def __init__(self, db, on_alert=None, on_update=None, today=date.today):
+        self.db = db
+        self.on_alert = on_alert
+        self.on_update = on_update
+        self.today = today
+        self._lock = threading.Lock()
+        self._budgets = {}       # id -> (Budget, limit in cents)
+        self._by_category = {}   # category (None: all) -> [budget ids]
+        self._windows = {}       # id -> (first, last) day ordinal
+        self._spent = {}         # id -> cents spent in the window
+        self._levels = {}        # id -> OK / WARNING / EXCEEDED
+        self._days = {}          # category (None: all) -> {day ordinal: cents}
+        self._horizon = 0        # earliest day any window covers
+        self._day = None         # ordinal of the day the windows were set for
+        self._version = 0        # data version the state was read at
+        self._replays = []       # per rebuild in progress, the changes since
+        # Listen first: a change committed before rebuild() reads is in
+        # what it reads, and one committed after is replayed
+        db.add_listener(self.on_change)
+        try:
+            self.rebuild()
+        except BaseException:
+            db.remove_listener(self.on_change)
+            raise
+
+    def close(self):
+        self.db.remove_listener(self.on_change)
+
+    # ---------- budgets ----------
+
+    def add_budget(self, category, period, limit, days=None, **kwargs):
+        """Add a budget (see ExpenseDatabase.add_budget) and track it"""
+        budget_id = self.db.add_budget(category, period, limit, days, **kwargs)
+        self.rebuild()
+        return budget_id
+
+    def delete_budget(self, budget_id):
+        deleted = self.db.delete_budget(budget_id)
+        self.rebuild()
+        return deleted
+
+    def status(self):
+        """BudgetStatus of every budget, in the order they were added"""
+        with self._lock:
+            if self._advance(self.today()):
+                return [self._status(budget_id) for budget_id in self._budgets]
+        self.rebuild()
+        with self._lock:
+            return [self._status(budget_id) for budget_id in self._budgets]
+
+    # ---------- keeping the state current ----------
+
+    def rebuild(self, alert=False):
+        """Read the state afresh: the budgets, then one pass over the days
+        the windows cover (live rows by the date index, archived months
+        by their date span)"""
+        replay = []
+        with self._lock:
+            self._replays.append(replay)
+        try:
+            today = self.today()
+            with self.db.read_snapshot() as (conn, version):
+                budgets = self.db.get_budgets(conn)
+                windows = {budget.id: budget_window(budget, today) for budget in budgets}
+                horizon = min((first for first, _ in windows.values()),
+                              default=today.toordinal())
+                start = date.fromordinal(horizon).isoformat()
+                days = {}
+
+                def add(day, category, cents):
+                    day = _ordinal(day)
+                    if day is None:
+                        return
+                    for key in (category, None):
+                        totals = days.setdefault(key, {})
+                        totals[day] = totals.get(day, 0) + cents
+
+                if budgets:
+                    # +category: otherwise the planner scans the whole
+                    # (category, date) index to skip sorting the groups
+                    for row in conn.execute('''
+                        SELECT date, category, SUM(amount_cents) FROM expenses
+                        WHERE date >= ? GROUP BY date, +category
+                    ''', (start,)):
+                        add(*row)
+                    for partition in self.db.archived_partitions(conn):
+                        if partition.footer['max_date'] >= start:
+                            first, last = partition.date_span(start)
+                            for row in partition.select(first, last):
+                                add(row[1], row[2], row[3])
+        except BaseException:
+            with self._lock:
+                self._replays.remove(replay)
+            raise
+
+        alerts = []
+        with self._lock:
+            old_levels = self._levels
+            self._budgets = {budget.id: (budget, to_cents(budget.limit))
+                             for budget in budgets}
+            self._by_category = {}
+            for budget in budgets:
+                self._by_category.setdefault(budget.category, []).append(budget.id)
+            self._windows = windows
+            self._days = days
+            self._horizon = horizon
+            self._day = today.toordinal()
+            self._version = version
+            self._spent = {budget_id: self._window_total(budget_id, first, last)
+                           for budget_id, (first, last) in windows.items()}
+            self._levels = {}
+            self._replays.remove(replay)
+            for change in replay:
+                if change.action != 'bulk' and change.version > version:
+                    self._apply_change(change)
+            for budget_id in self._budgets:
+                level = self._levels[budget_id] = self._level(budget_id)
+                if alert and level > old_levels.get(budget_id, OK):
+                    alerts.append(BudgetAlert(self._status(budget_id), level))
+        self._send(alerts)
+
+    def on_change(self, change):
+        """Database listener: apply one committed change"""
+        if change.action == 'bulk':
+            self.rebuild(alert=True)
+            return
+        alerts = []
+        with self._lock:
+            for replay in self._replays:
+                replay.append(change)
+            if self._day is None or change.version <= self._version:
+                return  # already part of the state read by rebuild()
+            current = self._advance(self.today())
+            if current:
+                for budget_id in self._apply_change(change):
+                    level = self._level(budget_id)
+                    if level > self._levels[budget_id]:
+                        alerts.append(BudgetAlert(self._status(budget_id), level))
+                    self._levels[budget_id] = level
+        if not current:
+            self.rebuild(alert=True)
+        self._send(alerts)
+
+    def _apply_change(self, change):
+        # Returns the ids of the budgets whose spending moved
+        touched = set()
+        if change.old_row is not None:
+            self._add(change.old_row, -1, touched)
+        if change.action != 'delete':
+            self._add(change.row, +1, touched)
+        return touched
+
+    def _add(self, expense, sign, touched):
+        day = _ordinal(expense[1])
+        if day is None or day < self._horizon:
+            return
+        cents = sign * to_cents(expense[3])
+        for key in (expense[2], None):
+            totals = self._days.setdefault(key, {})
+            total = totals.get(day, 0) + cents
+            if total:
+                totals[day] = total
+            else:
+                totals.pop(day, None)
+            for budget_id in self._by_category.get(key, ()):
+                first, last = self._windows[budget_id]
+                if first <= day <= last:
+                    self._spent[budget_id] += cents
+                    touched.add(budget_id)
+
+    def _advance(self, today):
+        """Slide every window to the one containing today. False if the
+        clock went back: windows only slide forward, so rebuild() instead."""
+        day = today.toordinal()
+        if day == self._day:
+            return True
+        if day < self._day:
+            return False
+        for budget_id, (budget, _) in self._budgets.items():
+            first, last = self._windows[budget_id]
+            new_first, new_last = budget_window(budget, today)
+            if new_first > last:
+                spent = self._window_total(budget_id, new_first, new_last)
+            else:
+                spent = (self._spent[budget_id]
+                         - self._window_total(budget_id, first, new_first - 1)
+                         + self._window_total(budget_id, last + 1, new_last))
+            self._windows[budget_id] = new_first, new_last
+            self._spent[budget_id] = spent
+            # A new window starts without alerts of its own
+            self._levels[budget_id] = self._level(budget_id)
+
+        horizon = min((first for first, _ in self._windows.values()), default=day)
+        if horizon > self._horizon:
+            for totals in self._days.values():
+                for old in [old for old in totals if old < horizon]:
+                    del totals[old]
+            self._horizon = horizon
+        self._day = day
+        return True
+
+    def _window_total(self, budget_id, first, last):
+        totals = self._days.get(self._budgets[budget_id][0].category, {})
+        return sum(totals.get(day, 0) for day in range(first, last + 1))
+
+    def _level(self, budget_id):
+        budget, limit = self._budgets[budget_id]
+        spent = self._spent[budget_id]
+        if spent > limit:
+            return EXCEEDED
+        if spent >= limit * budget.warn_at:
+            return WARNING
+        return OK
+
+    def _status(self, budget_id):
+        budget, limit = self._budgets[budget_id]
+        first, last = self._windows[budget_id]
+        spent = self._spent[budget_id]
+        return BudgetStatus(budget, date.fromordinal(first), date.fromordinal(last),
+                            from_cents(spent), spent / limit, self._level(budget_id))
+
+    def _send(self, alerts):
+        if self.on_alert:
+            for alert in alerts:
+                self.on_alert(alert)
+        if self.on_update:
+            self.on_update()
+
+
+def describe(status):
+    """One line for a BudgetStatus: 'Food monthly: $412.50 of $500.00 (83%)'"""
+    budget = status.budget
+    period = f"last {budget.days} days" if budget.period == 'custom' else budget.period
+    return (f"{budget.category or 'All'} {period}: ${status.spent:,.2f} of "
+            f"${budget.limit:,.2f} ({status.ratio:.0%})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Show every budget against its window")
+    parser.add_argument('--db', default='expenses.db', help="database file")
+    args = parser.parse_args(argv)
+
+    with ExpenseDatabase(args.db) as db:
+        engine = BudgetEngine(db)
+        statuses = engine.status()
+        engine.close()
+    if not statuses:
+        print("No budgets")
+    for status in statuses:
+        print(f"{status.budget.id:>4}  {describe(status):<55} "
+              f"{status.start} .. {status.end}  {LEVEL_NAMES[status.level]}")
+    return 1 if any(status.level == EXCEEDED for status in statuses) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,353 @@
+# EXPENSE TRACKER - COMMAND LINE
+# ==============================
+
+"""
+Headless access to the expense database for scripts, cron jobs and servers.
+Never imports tkinter, so it starts in milliseconds.
+
+Usage:
+    python ExpenseCLI.py add Food 12.50 "Lunch" --date 2026-03-01
+    python ExpenseCLI.py import statement.csv export.jsonl
+    python ExpenseCLI.py list --category Food --from 2026-01-01 --limit 20
+    python ExpenseCLI.py totals
+    python ExpenseCLI.py monthly 2026            (every month of a year)
+    python ExpenseCLI.py monthly 2026 3          (one month by category)
+    python ExpenseCLI.py export expenses.csv --from 2025-01-01
+    python ExpenseCLI.py verify --rebuild
+    python ExpenseCLI.py archive --keep-months 6 (move older months to archive files)
+    python ExpenseCLI.py archive --list
+    python ExpenseCLI.py restore 2024-03         (or a whole retired year: 2018)
+    python ExpenseCLI.py backup backups/expenses-2026-03-01.db
+    python ExpenseCLI.py compact
+    python ExpenseCLI.py optimize --full
+    python ExpenseCLI.py retire --keep-years 7   (move older years to their own files)
+    python ExpenseCLI.py list --retired --from 2015-01-01
+    python ExpenseCLI.py budget add Food monthly 400
+    python ExpenseCLI.py budget add all custom 1500 --days 30
+    python ExpenseCLI.py budget list             (exit status 1 if any is over)
+    python ExpenseCLI.py budget remove 3
+
+Every command takes --db to pick a database file (default expenses.db).
+"""
+
+import argparse
+import os
+import sys
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from ExpenseTracker import (ARCHIVE_KEEP_MONTHS, BUDGET_PERIODS, BUDGET_WARN_AT,
+                            COMPACT_MAX_PAGES, EXPENSE_COLUMNS, MAX_BUDGET_DAYS,
+                            RETENTION_YEARS, SNAPSHOT_PAGES_PER_STEP, SNAPSHOT_STEP_SLEEP,
+                            ExpenseDatabase, ExpenseFilter)
+
+MONTH_NAMES = ('January', 'February', 'March', 'April', 'May', 'June', 'July',
+               'August', 'September', 'October', 'November', 'December')
+
+
+def add_filter_arguments(parser):
+    parser.add_argument('--category', action='append',
+                        help="only this category (repeat for several)")
+    parser.add_argument('--from', dest='start_date', help="first date, YYYY-MM-DD")
+    parser.add_argument('--to', dest='end_date', help="last date, YYYY-MM-DD")
+    parser.add_argument('--min', dest='min_amount', help="smallest amount")
+    parser.add_argument('--max', dest='max_amount', help="largest amount")
+    parser.add_argument('--text', help="description contains this text")
+
+
+def positive_amount(text):
+    """argparse type for an expense amount: a finite number above zero,
+    the same rule the GUI applies"""
+    try:
+        amount = Decimal(text)
+    except InvalidOperation:
+        raise argparse.ArgumentTypeError(f"invalid amount {text!r}") from None
+    if not amount.is_finite() or amount <= 0:
+        raise argparse.ArgumentTypeError(f"amount must be positive, not {text!r}")
+    return amount
+
+
+def filters_from(args):
+    return ExpenseFilter(categories=args.category, start_date=args.start_date,
+                         end_date=args.end_date, min_amount=args.min_amount,
+                         max_amount=args.max_amount, text=args.text)
+
+
+def print_expense(expense):
+    print(f"{expense.id:>8}  {expense.date}  {expense.category:<15} "
+          f"{expense.amount:>12,.2f}  {expense.description or ''}")
+
+
+# ============= COMMANDS =============
+
+def cmd_add(db, args):
+    expense_id = db.add_expense(args.date, args.category, args.amount,
+                                args.description, args.currency)
+    print(f"Added expense #{expense_id}")
+
+
+def cmd_import(db, args):
+    from ExpenseImporter import import_file
+
+    for path in args.files:
+        report = import_file(db, path, args.batch_size)
+        print(f"{path}: {report.summary()}")
+        for line_no, reason in report.rejects[:10]:
+            print(f"  line {line_no}: {reason}")
+
+
+def cmd_list(db, args):
+    if args.search:
+        rows = db.search_expenses(args.search, args.limit)
+    elif args.retired:
+        rows = db.iter_retired(filters_from(args))
+    else:
+        rows = db.iter_expenses(filters_from(args))
+    shown = 0
+    for expense in rows:
+        if shown == args.limit:
+            break
+        print_expense(expense)
+        shown += 1
+    if not shown:
+        print("No expenses found")
+
+
+def cmd_totals(db, args):
+    for category, total in db.get_total_by_category():
+        print(f"{category:<15} {total:>14,.2f}")
+    print(f"{'TOTAL':<15} {db.get_total_expenses():>14,.2f}")
+
+
+def cmd_monthly(db, args):
+    if args.month:
+        print(f"{MONTH_NAMES[args.month - 1]} {args.year}")
+        for category, total in db.get_monthly_total_by_category(args.year, args.month):
+            print(f"  {category:<15} {total:>14,.2f}")
+        print(f"  {'TOTAL':<15} {db.get_monthly_total(args.year, args.month):>14,.2f}")
+        return
+    print(f"{args.year}")
+    for month in range(1, 13):
+        print(f"  {MONTH_NAMES[month - 1]:<15} {db.get_monthly_total(args.year, month):>14,.2f}")
+    print(f"  {'TOTAL':<15} {db.get_yearly_total(args.year):>14,.2f}")
+
+
+def cmd_export(db, args):
+    fmt = args.format or ('jsonl' if args.output.endswith(('.jsonl', '.ndjson')) else 'csv')
+    out = sys.stdout if args.output == '-' else open(args.output, 'w', newline='',
+                                                     encoding='utf-8')
+    columns = [column.strip() for column in EXPENSE_COLUMNS.split(',')]
+    columns[columns.index('amount_cents')] = 'amount'
+    count = 0
+    try:
+        rows = db.iter_expenses(filters_from(args), newest_first=False)
+        if fmt == 'csv':
+            import csv
+            writer = csv.writer(out)
+            writer.writerow(columns)
+            for count, expense in enumerate(rows, 1):
+                writer.writerow(expense)
+        else:
+            import json
+            for count, expense in enumerate(rows, 1):
+                record = expense._asdict()
+                record['amount'] = str(record['amount'])
+                out.write(json.dumps(record) + '\n')
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"Exported {count:,} expenses", file=sys.stderr)
+
+
+def cmd_verify(db, args):
+    drift = db.verify_summaries()
+    for table, key, stored, actual in drift[:20]:
+        print(f"{table} {key}: stored {stored}, actual {actual}")
+    if not drift:
+        print("Summary tables are consistent")
+        return 0
+    print(f"{len(drift)} summary entries drifted")
+    if args.rebuild:
+        db.rebuild_summaries()
+        print("Rebuilt summary tables")
+        return 0
+    return 1
+
+
+def cmd_archive(db, args):
+    if not args.list:
+        months = db.archive_closed_months(args.keep_months)
+        print(f"Archived {len(months)} month(s)" + (f": {', '.join(months)}" if months else ""))
+    for partition in db.archived_partitions():
+        footer = partition.footer
+        print(f"  {partition.month}  {partition.rows:>9,} rows  "
+              f"{footer['total_cents'] / 100:>14,.2f}  {os.path.basename(partition.path)}")
+
+
+def cmd_restore(db, args):
+    if len(args.month) == 4:
+        rows = db.restore_year(args.month)
+        print(f"Restored {rows:,} rows" if rows else f"{args.month} is not retired")
+        return 0 if rows else 1
+    rows = db.restore_month(args.month)
+    print(f"Restored {rows:,} rows" if rows else f"{args.month} is not archived")
+    return 0 if rows else 1
+
+
+def cmd_backup(db, args):
+    db.snapshot(args.output, args.pages, args.sleep)
+    print(f"Wrote {args.output} ({os.path.getsize(args.output):,} bytes)")
+
+
+def cmd_compact(db, args):
+    size = os.path.getsize(args.db)
+    pages = db.compact(args.pages)
+    print(f"Freed {pages:,} pages; {size:,} -> {os.path.getsize(args.db):,} bytes")
+
+
+def cmd_optimize(db, args):
+    db.optimize(full=args.full)
+    print("Planner statistics refreshed")
+
+
+def cmd_retire(db, args):
+    if not args.list:
+        years = db.retire_years(args.keep_years)
+        print(f"Retired {len(years)} year(s)" + (f": {', '.join(years)}" if years else ""))
+    for year, rows, total in db.retired_years():
+        print(f"  {year}  {rows:>9,} rows  {total:>14,.2f}")
+
+
+def cmd_budget(db, args):
+    from ExpenseBudgets import EXCEEDED, LEVEL_NAMES, BudgetEngine, describe
+    
+    if args.action == 'add':
+        category = None if args.category.lower() == 'all' else args.category
+        budget_id = db.add_budget(category, args.period, args.limit, args.days, args.warn_at)
+        print(f"Added budget #{budget_id}")
+        return 0
+    if args.action == 'remove':
+        if not db.delete_budget(args.id):
+            print(f"No budget #{args.id}")
+            return 1
+        print(f"Removed budget #{args.id}")
+        return 0
+    engine = BudgetEngine(db)
+    statuses = engine.status()
+    engine.close()
+    for status in statuses:
+        print(f"{status.budget.id:>4}  {describe(status):<50} "
+              f"{status.start} .. {status.end}  {LEVEL_NAMES[status.level]}")
+    if not statuses:
+        print("No budgets")
+    return 1 if any(status.level == EXCEEDED for status in statuses) else 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='ExpenseCLI.py',
+                                     description="Expense tracker command line")
+    parser.add_argument('--db', default='expenses.db', help="database file")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    add = commands.add_parser('add', help="record one expense")
+    add.add_argument('category')
+    add.add_argument('amount', type=positive_amount)
+    add.add_argument('description', nargs='?', default='')
+    add.add_argument('--date', default=date.today().isoformat(),
+                     help="YYYY-MM-DD, default today")
+    add.add_argument('--currency')
+    add.set_defaults(func=cmd_add)
+
+    imp = commands.add_parser('import', help="load CSV or JSON Lines files")
+    imp.add_argument('files', nargs='+')
+    imp.add_argument('--batch-size', type=int, default=5000)
+    imp.set_defaults(func=cmd_import)
+
+    lst = commands.add_parser('list', help="show expenses, newest first")
+    add_filter_arguments(lst)
+    lst.add_argument('--search', help="full-text search instead of filters")
+    lst.add_argument('--retired', action='store_true',
+                     help="list the retired years instead of the live data")
+    lst.add_argument('--limit', type=int, default=50)
+    lst.set_defaults(func=cmd_list)
+
+    totals = commands.add_parser('totals', help="total and per-category totals")
+    totals.set_defaults(func=cmd_totals)
+
+    monthly = commands.add_parser('monthly', help="monthly report")
+    monthly.add_argument('year', type=int)
+    monthly.add_argument('month', type=int, nargs='?', choices=range(1, 13),
+                         metavar='month')
+    monthly.set_defaults(func=cmd_monthly)
+
+    export = commands.add_parser('export', help="stream expenses to CSV or JSON Lines")
+    export.add_argument('output', help="file to write, or - for stdout")
+    export.add_argument('--format', choices=('csv', 'jsonl'))
+    add_filter_arguments(export)
+    export.set_defaults(func=cmd_export)
+
+    verify = commands.add_parser('verify', help="check the summary tables for drift")
+    verify.add_argument('--rebuild', action='store_true',
+                        help="recompute them if they drifted")
+    verify.set_defaults(func=cmd_verify)
+
+    archive = commands.add_parser('archive',
+                                  help="move closed months into memory-mapped archive files")
+    archive.add_argument('--keep-months', type=int, default=ARCHIVE_KEEP_MONTHS,
+                         help="recent months to keep live, this one included")
+    archive.add_argument('--list', action='store_true', help="only list archived months")
+    archive.set_defaults(func=cmd_archive)
+
+    restore = commands.add_parser('restore',
+                                  help="move an archived month or retired year back")
+    restore.add_argument('month', help="YYYY-MM, or YYYY for a retired year")
+    restore.set_defaults(func=cmd_restore)
+    
+    backup = commands.add_parser('backup', help="online snapshot, safe while others write")
+    backup.add_argument('output', help="file to write")
+    backup.add_argument('--pages', type=int, default=SNAPSHOT_PAGES_PER_STEP,
+                        help="pages copied per step")
+    backup.add_argument('--sleep', type=float, default=SNAPSHOT_STEP_SLEEP,
+                        help="seconds to pause between steps")
+    backup.set_defaults(func=cmd_backup)
+    
+    compact = commands.add_parser('compact', help="give free pages back to the disk")
+    compact.add_argument('--pages', type=int, default=COMPACT_MAX_PAGES,
+                         help="most pages to free")
+    compact.set_defaults(func=cmd_compact)
+    
+    optimize = commands.add_parser('optimize', help="refresh query planner statistics")
+    optimize.add_argument('--full', action='store_true', help="ANALYZE every table")
+    optimize.set_defaults(func=cmd_optimize)
+    
+    retire = commands.add_parser('retire', help="move old years into per-year files")
+    retire.add_argument('--keep-years', type=int, default=RETENTION_YEARS,
+                        help="recent years to keep, this one included")
+    retire.add_argument('--list', action='store_true', help="only list retired years")
+    retire.set_defaults(func=cmd_retire)
+    
+    budget = commands.add_parser('budget', help="spending limits per category and window")
+    budget_actions = budget.add_subparsers(dest='action', required=True)
+    budget_add = budget_actions.add_parser('add', help="add a budget")
+    budget_add.add_argument('category', help="a category, or 'all'")
+    budget_add.add_argument('period', choices=BUDGET_PERIODS)
+    budget_add.add_argument('limit')
+    budget_add.add_argument('--days', type=int,
+                            help=f"window length for 'custom', at most {MAX_BUDGET_DAYS}")
+    budget_add.add_argument('--warn-at', type=float, default=BUDGET_WARN_AT,
+                            help="fraction of the limit that warns first")
+    budget_actions.add_parser('list', help="every budget against its window")
+    budget_remove = budget_actions.add_parser('remove', help="remove a budget")
+    budget_remove.add_argument('id', type=int)
+    budget.set_defaults(func=cmd_budget)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    with ExpenseDatabase(args.db) as db:
+        return args.func(db, args) or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
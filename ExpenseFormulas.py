@@ -0,0 +1,395 @@
+# EXPENSE FORMULAS
+# ================
+
+"""
+Evaluate calculator formulas over whole columns of data with NumPy.
+
+A formula is written in the calculator's expression language (see
+CalculatorEngine) with variables for the columns, and compiled once into
+a chain of whole-array NumPy operations:
+
+    fee = min(amount * 0.029 + 0.30, 10)
+    net = amount / (1 + vat)
+
+Each operator and function applies to a complete chunk at a time, so
+millions of rows cost a few dozen array operations, not a Python loop
+per row.
+
+Input is streamed in chunks, either from the expenses (with the same
+category/date/amount filters as the CLI, archived months included) or
+from a CSV file whose numeric columns become variables. The derived
+columns are written next to the input as CSV.
+
+Vectorized results are float64 (15-16 significant digits), not Decimal:
+use CalculatorEngine when every digit matters, this when the rows count
+in millions. Rows where a formula is undefined (division by zero, log of
+a negative number) come out as NaN and are written as empty cells.
+
+Usage:
+    python ExpenseFormulas.py db "fee=min(amount*0.029+0.30, 10)" --category Food -o fees.csv
+    python ExpenseFormulas.py csv prices.csv "total=price*qty*(1+tax)" -o totals.csv
+
+NumPy is required, as for ExpenseAnalytics.
+"""
+
+import argparse
+import csv
+import io
+import re
+import sys
+import time
+from functools import reduce
+from itertools import islice
+
+import numpy as np
+
+from CalculatorEngine import ExpressionEngine, ExpressionError, binary_chain
+
+# Rows evaluated per chunk
+CHUNK_ROWS = 250_000
+
+# Decimal places written for derived columns
+DEFAULT_PLACES = 2
+
+# Variables available when evaluating over expenses
+EXPENSE_VARIABLES = ('amount', 'cents', 'id', 'year', 'month', 'day', 'weekday')
+
+
+# ============= COMPILING =============
+
+def _round(x, places=0.0):
+    # Half away from zero, like the Decimal engine's round(); the inner
+    # rounding absorbs binary noise such as 2.675 * 100 = 267.4999...
+    scale = 10.0 ** places
+    return np.sign(x) * np.floor(np.round(np.abs(x) * scale, 6) + 0.5) / scale
+
+
+# Decimal's // truncates toward zero and its % takes the sign of the
+# dividend, so these are trunc-divide and fmod rather than NumPy's
+# floor_divide and mod
+_BINARY = {'+': np.add, '-': np.subtract, '*': np.multiply, '/': np.divide,
+           '//': lambda a, b: np.trunc(np.divide(a, b)), '%': np.fmod, '**': np.power}
+_UNARY = {'-': np.negative, '+': np.positive}
+# Same names and arguments as CalculatorEngine.FUNCTIONS
+_FUNCTIONS = {
+    'sqrt': np.sqrt,
+    'exp': np.exp,
+    'ln': np.log,
+    'log': lambda x, base=None: np.log10(x) if base is None else np.log(x) / np.log(base),
+    'log10': np.log10,
+    'abs': np.abs,
+    'round': _round,
+    'floor': np.floor,
+    'ceil': np.ceil,
+    'min': lambda *args: reduce(np.minimum, args),
+    'max': lambda *args: reduce(np.maximum, args),
+    'pow': np.power,
+    'sin': np.sin,
+    'cos': np.cos,
+    'tan': np.tan,
+}
+
+
+class VectorFormula:
+    """
+    A formula compiled to NumPy: call it with {name: array} and get an
+    array back.
+
+    names lists the variables it reads. Undefined results are NaN
+    rather than errors, so one bad row never stops a batch.
+    """
+
+    def __init__(self, expression, name=None):
+        self.text = expression.text
+        self.name = name
+        self.names = expression.names
+        self._run = _compile(expression.tree)
+
+    def __repr__(self):
+        return f'VectorFormula({self.text!r})'
+
+    def __call__(self, variables, size=None):
+        """Evaluate over variables; size is the row count, needed only
+        when the formula reads no variables at all"""
+        missing = self.names - variables.keys()
+        if missing:
+            raise ExpressionError(f"no column for {', '.join(sorted(missing))}")
+        with np.errstate(all='ignore'):
+            result = self._run(variables)
+        if size is None:
+            size = len(variables[next(iter(self.names))]) if self.names else 1
+        return np.broadcast_to(np.asarray(result, dtype=np.float64), (size,))
+
+
+def _compile(tree):
+    """Turn a CalculatorEngine tree into closures over whole arrays"""
+    kind = tree[0]
+    if kind == 'num':
+        value = np.float64(tree[1])
+        return lambda variables: value
+    if kind == 'var':
+        name = tree[1]
+        return lambda variables: variables[name]
+    if kind == 'unary':
+        op, operand = _UNARY[tree[1]], _compile(tree[2])
+        return lambda variables: op(operand(variables))
+    if kind == 'binary':
+        first, steps = binary_chain(tree)
+        left = _compile(first)
+        steps = [(_BINARY[op], _compile(operand)) for op, operand in steps]
+
+        def chain(variables):
+            value = left(variables)
+            for op, right in steps:
+                value = op(value, right(variables))
+            return value
+        return chain
+    function = _FUNCTIONS[tree[1]]
+    args = [_compile(arg) for arg in tree[2]]
+    return lambda variables: function(*[arg(variables) for arg in args])
+
+
+_engine = None
+
+
+def compile_formula(text):
+    """Compile 'name = expression' (or a bare expression) into a VectorFormula"""
+    global _engine
+    if _engine is None:
+        _engine = ExpressionEngine()
+    name, sep, expression = text.partition('=')
+    if not sep:
+        name, expression = None, text
+    else:
+        name = name.strip()
+        if not name.isidentifier():
+            raise ExpressionError(f"invalid column name {name!r}")
+    return VectorFormula(_engine.compile(expression.strip()), name)
+
+
+def compile_formulas(texts):
+    """Compile several formulas, naming unnamed ones value, value2, ..."""
+    formulas = [compile_formula(text) for text in texts]
+    for number, formula in enumerate(formulas, 1):
+        if formula.name is None:
+            formula.name = 'value' if number == 1 else f'value{number}'
+    return formulas
+
+
+# ============= SOURCES =============
+
+class ExpenseVariables(dict):
+    """Formula variables over one ExpenseColumns chunk, computed on first use"""
+
+    def __init__(self, columns):
+        super().__init__()
+        self.columns = columns
+
+    def keys(self):
+        return set(EXPENSE_VARIABLES)
+
+    def __missing__(self, name):
+        columns = self.columns
+        if name == 'amount':
+            value = columns.cents / 100
+        elif name == 'cents':
+            value = columns.cents.astype(np.float64)
+        elif name == 'id':
+            value = columns.ids.astype(np.float64)
+        elif name == 'year':
+            value = columns.dates.astype('datetime64[Y]').astype(np.int64) + 1970.0
+        elif name == 'month':
+            value = columns.dates.astype('datetime64[M]').astype(np.int64) % 12 + 1.0
+        elif name == 'day':
+            value = (columns.dates - columns.dates.astype('datetime64[M]')).astype(
+                np.int64) + 1.0
+        elif name == 'weekday':
+            # 1970-01-01 was a Thursday; 0 is Monday as in datetime
+            value = (columns.days + 3) % 7 + 0.0
+        else:
+            raise KeyError(name)
+        self[name] = value
+        return value
+
+
+def evaluate_expenses(db, formulas, filters=None, chunk_size=CHUNK_ROWS):
+    """Yield (ExpenseColumns chunk, [result array per formula])"""
+    from ExpenseAnalytics import iter_chunks
+
+    for columns in iter_chunks(db, chunk_size, filters):
+        variables = ExpenseVariables(columns)
+        yield columns, [formula(variables, len(columns)) for formula in formulas]
+
+
+def column_name(header):
+    """A CSV header as a variable name: 'Unit Price' -> unit_price"""
+    name = re.sub(r'\W+', '_', header.strip().lower()).strip('_')
+    return name if name and not name[0].isdigit() else f'_{name}'
+
+
+def evaluate_csv(path, formulas, chunk_size=CHUNK_ROWS):
+    """Yield (header, raw lines, [result array per formula]) chunk by chunk.
+
+    Only the columns the formulas mention are parsed, by NumPy's C CSV
+    reader; the raw lines are handed back untouched for writing out.
+    """
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        header_line = f.readline()
+        header = next(csv.reader([header_line]))
+        names = [column_name(field) for field in header]
+        needed = set().union(*(formula.names for formula in formulas))
+        missing = needed - set(names)
+        if missing:
+            raise ExpressionError(f"{path} has no column {', '.join(sorted(missing))} "
+                                  f"(columns: {', '.join(names)})")
+        used = sorted(needed, key=names.index)
+        positions = [names.index(name) for name in used]
+        first_line = 2
+        while True:
+            lines = list(islice(f, chunk_size))
+            if not lines:
+                break
+            if used:
+                try:
+                    values = np.loadtxt(lines, delimiter=',', quotechar='"',
+                                        usecols=positions, dtype=np.float64, ndmin=2)
+                except ValueError as e:
+                    raise ExpressionError(f"{path}, lines {first_line}-"
+                                          f"{first_line + len(lines) - 1}: {e}") from None
+                variables = {name: values[:, i] for i, name in enumerate(used)}
+            else:
+                variables = {}
+            yield header, lines, [formula(variables, len(lines)) for formula in formulas]
+            first_line += len(lines)
+
+
+# ============= OUTPUT =============
+
+def format_column(values, places=DEFAULT_PLACES):
+    """Format a float array as strings; NaN and infinities become ''"""
+    text = list(map(f'{{:.{places}f}}'.format, values.tolist()))
+    for index in np.flatnonzero(~np.isfinite(values)).tolist():
+        text[index] = ''
+    return text
+
+
+def _csv_field(value):
+    if any(char in value for char in ',"\n\r'):
+        return '"' + value.replace('"', '""') + '"'
+    return value
+
+
+def write_expenses(out, chunks, formulas, places=DEFAULT_PLACES):
+    """Write id,date,category,amount plus one column per formula.
+
+    Returns (rows, [sum of each formula over its defined rows]).
+    """
+    out.write(','.join(['id', 'date', 'category', 'amount']
+                       + [_csv_field(formula.name) for formula in formulas]) + '\n')
+    rows, totals = 0, [0.0] * len(formulas)
+    for columns, results in chunks:
+        categories = np.array([_csv_field(name) for name in columns.categories] + [''],
+                              dtype=object)
+        cells = [columns.ids.astype(str).tolist(),
+                 columns.dates.astype(str).tolist(),
+                 categories[columns.codes].tolist(),  # code -1 picks the trailing ''
+                 format_column(columns.cents / 100, 2)]
+        cells.extend(format_column(result, places) for result in results)
+        out.write('\n'.join(map(','.join, zip(*cells))) + '\n')
+        rows += len(columns)
+        for i, result in enumerate(results):
+            totals[i] += float(np.nansum(np.where(np.isfinite(result), result, np.nan)))
+    return rows, totals
+
+
+def write_csv(out, chunks, formulas, places=DEFAULT_PLACES):
+    """Write each input line with the formula columns appended"""
+    rows, totals, wrote_header = 0, [0.0] * len(formulas), False
+    for header, lines, results in chunks:
+        if not wrote_header:
+            buffer = io.StringIO()
+            csv.writer(buffer, lineterminator='').writerow(
+                header + [formula.name for formula in formulas])
+            out.write(buffer.getvalue() + '\n')
+            wrote_header = True
+        stripped = [line.rstrip('\r\n') for line in lines]
+        columns = [format_column(result, places) for result in results]
+        out.write('\n'.join(map(','.join, zip(stripped, *columns))) + '\n')
+        rows += len(lines)
+        for i, result in enumerate(results):
+            totals[i] += float(np.nansum(np.where(np.isfinite(result), result, np.nan)))
+    return rows, totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Evaluate formulas over every expense or every row of a CSV file")
+    commands = parser.add_subparsers(dest='source', required=True)
+
+    db_parser = commands.add_parser('db', help="over the expenses in a database")
+    db_parser.add_argument('formulas', nargs='+', metavar='NAME=FORMULA',
+                           help=f"variables: {', '.join(EXPENSE_VARIABLES)}")
+    db_parser.add_argument('--db', default='expenses.db', help="database file")
+    db_parser.add_argument('--category', action='append',
+                           help="only this category (repeat for several)")
+    db_parser.add_argument('--from', dest='start_date', help="first date, YYYY-MM-DD")
+    db_parser.add_argument('--to', dest='end_date', help="last date, YYYY-MM-DD")
+    db_parser.add_argument('--min', dest='min_amount', help="smallest amount")
+    db_parser.add_argument('--max', dest='max_amount', help="largest amount")
+
+    csv_parser = commands.add_parser('csv', help="over the rows of a CSV file with a header")
+    csv_parser.add_argument('input')
+    csv_parser.add_argument('formulas', nargs='+', metavar='NAME=FORMULA',
+                            help="variables are the numeric columns, lower-cased, "
+                                 "with spaces as underscores")
+
+    for sub in (db_parser, csv_parser):
+        sub.add_argument('-o', '--output', default='-', help="CSV to write, default stdout")
+        sub.add_argument('--places', type=int, default=DEFAULT_PLACES,
+                         help="decimal places for the formula columns")
+        sub.add_argument('--chunk-size', type=int, default=CHUNK_ROWS)
+    args = parser.parse_args(argv)
+
+    try:
+        formulas = compile_formulas(args.formulas)
+    except ExpressionError as e:
+        parser.error(str(e))
+
+    out = sys.stdout if args.output == '-' else open(args.output, 'w', newline='',
+                                                     encoding='utf-8')
+    started = time.perf_counter()
+    try:
+        if args.source == 'db':
+            from ExpenseTracker import ExpenseDatabase, ExpenseFilter
+
+            unknown = set().union(*(f.names for f in formulas)) - set(EXPENSE_VARIABLES)
+            if unknown:
+                parser.error(f"unknown variable {', '.join(sorted(unknown))}; "
+                             f"use {', '.join(EXPENSE_VARIABLES)}")
+            filters = ExpenseFilter(categories=args.category, start_date=args.start_date,
+                                    end_date=args.end_date, min_amount=args.min_amount,
+                                    max_amount=args.max_amount)
+            with ExpenseDatabase(args.db) as db:
+                rows, totals = write_expenses(
+                    out, evaluate_expenses(db, formulas, filters, args.chunk_size),
+                    formulas, args.places)
+        else:
+            rows, totals = write_csv(out, evaluate_csv(args.input, formulas, args.chunk_size),
+                                     formulas, args.places)
+    except (ExpressionError, OSError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    elapsed = time.perf_counter() - started
+
+    print(f"{rows:,} rows in {elapsed:.2f}s ({rows / elapsed if elapsed else 0:,.0f} rows/sec)",
+          file=sys.stderr)
+    for formula, total in zip(formulas, totals):
+        print(f"  {formula.name:<15} total {total:,.{args.places}f}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,214 @@
+# STREAMING EXPENSE IMPORTER
+# ==========================
+
+"""
+Load card statements and other exports into the expense database.
+
+Files are read lazily, one batch at a time, so a multi-million-row file
+never has to fit in memory. Supported formats:
+- CSV with a header row (date, category, amount, description)
+- JSON Lines, one object per line with the same keys
+
+Usage:
+    python ExpenseImporter.py statement.csv
+    python ExpenseImporter.py export.jsonl --db expenses.db --batch-size 10000
+"""
+
+import argparse
+import csv
+import json
+import time
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from ExpenseTracker import BULK_BATCH_SIZE, CATEGORIES, ExpenseDatabase, to_cents
+
+# Date layouts we accept, tried in order. Everything is stored as YYYY-MM-DD.
+DATE_FORMATS = ('%Y-%m-%d', '%Y/%m/%d', '%d.%m.%Y', '%m/%d/%Y', '%Y%m%d')
+
+# Only keep the first few rejects so a bad file can't eat memory
+MAX_REJECT_SAMPLES = 100
+
+_CATEGORY_LOOKUP = {name.lower(): name for name in CATEGORIES}
+
+
+class ImportReport:
+    """Counters collected while importing a file"""
+
+    def __init__(self):
+        self.rows_read = 0
+        self.rows_imported = 0
+        self.rows_rejected = 0
+        self.rejects = []  # (line number, reason), capped
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_sec(self):
+        return self.rows_imported / self.elapsed if self.elapsed else 0.0
+
+    def reject(self, line_no, reason):
+        self.rows_rejected += 1
+        if len(self.rejects) < MAX_REJECT_SAMPLES:
+            self.rejects.append((line_no, reason))
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self.started
+        return self
+
+    def summary(self):
+        return (f"Imported {self.rows_imported:,} of {self.rows_read:,} rows "
+                f"in {self.elapsed:.2f}s ({self.rows_per_sec:,.0f} rows/sec), "
+                f"{self.rows_rejected:,} rejected")
+
+
+# ============= NORMALIZATION =============
+
+_date_cache = {}
+
+
+def normalize_date(value):
+    """Return value as YYYY-MM-DD or raise ValueError"""
+    value = value.strip()
+    # Statements repeat the same few dates thousands of times
+    cached = _date_cache.get(value)
+    if cached:
+        return cached
+    for fmt in DATE_FORMATS:
+        try:
+            normalized = datetime.strptime(value, fmt).strftime('%Y-%m-%d')
+        except ValueError:
+            continue
+        if len(_date_cache) < 10000:
+            _date_cache[value] = normalized
+        return normalized
+    raise ValueError(f"unrecognized date {value!r}")
+
+
+def normalize_category(value):
+    """Map a category onto the known list, case-insensitively"""
+    value = (value or '').strip()
+    if not value:
+        return 'Other'
+    return _CATEGORY_LOOKUP.get(value.lower(), value.title())
+
+
+def normalize_amount(value):
+    """Parse '$1,234.50' style amounts into a positive Decimal"""
+    if isinstance(value, float):
+        value = repr(value)
+    elif not isinstance(value, int):
+        value = str(value).strip().replace(',', '').replace('$', '')
+    try:
+        amount = Decimal(value)
+    except InvalidOperation:
+        raise ValueError(f"invalid amount {value!r}") from None
+    if not amount.is_finite() or amount <= 0:
+        raise ValueError("amount must be positive")
+    to_cents(amount)  # too large to store: reject this row, not the whole batch
+    return amount
+
+
+def normalize_record(record):
+    """Turn a dict with date/category/amount/description into a DB row"""
+    return (
+        normalize_date(record['date']),
+        normalize_category(record.get('category')),
+        normalize_amount(record['amount']),
+        (record.get('description') or '').strip(),
+    )
+
+
+# ============= READERS =============
+
+def read_csv(path):
+    """Yield (line number, record dict) from a CSV file with a header"""
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.DictReader(f)
+        reader.fieldnames = [name.strip().lower() for name in reader.fieldnames or []]
+        for record in reader:
+            yield reader.line_num, record
+
+
+def read_jsonl(path):
+    """Yield (line number, record dict) from a JSON Lines file"""
+    with open(path, encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_no, e
+                continue
+            if isinstance(record, dict):
+                record = {str(k).lower(): v for k, v in record.items()}
+            yield line_no, record
+
+
+def reader_for(path):
+    if str(path).lower().endswith(('.jsonl', '.ndjson', '.json')):
+        return read_jsonl(path)
+    return read_csv(path)
+
+
+# ============= IMPORT =============
+
+def validated_rows(records, report):
+    """Normalize records, counting and skipping the ones that fail"""
+    for line_no, record in records:
+        report.rows_read += 1
+        if not isinstance(record, dict):
+            report.reject(line_no, str(record) if isinstance(record, Exception)
+                          else "not an object")
+            continue
+        try:
+            yield normalize_record(record)
+        except (KeyError, TypeError, ValueError) as e:
+            reason = f"missing field {e}" if isinstance(e, KeyError) else str(e)
+            report.reject(line_no, reason)
+
+
+def import_file(db, path, batch_size=BULK_BATCH_SIZE, progress=None):
+    """Stream a CSV or JSONL file into db and return an ImportReport.
+
+    progress, if given, is called with the report after every batch.
+    """
+    report = ImportReport()
+    rows = validated_rows(reader_for(path), report)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        report.rows_imported += db.add_expenses_many(batch, batch_size)
+        if progress:
+            report.elapsed = time.perf_counter() - report.started
+            progress(report)
+    return report.finish()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import expenses from CSV or JSON Lines")
+    parser.add_argument('files', nargs='+', help="CSV or .jsonl files to import")
+    parser.add_argument('--db', default='expenses.db', help="database file")
+    parser.add_argument('--batch-size', type=int, default=BULK_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    def show_progress(report):
+        print(f"\r  {report.rows_imported:,} rows ({report.rows_per_sec:,.0f}/sec)",
+              end='', flush=True)
+
+    with ExpenseDatabase(args.db) as db:
+        for path in args.files:
+            print(f"Importing {path}")
+            report = import_file(db, path, args.batch_size, show_progress)
+            print("\r" + report.summary())
+            for line_no, reason in report.rejects[:10]:
+                print(f"  line {line_no}: {reason}")
+            if report.rows_rejected > 10:
+                print(f"  ... and {report.rows_rejected - 10:,} more")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+# EXPENSE SERVICE LOAD TEST
+# =========================
+
+"""
+Drive ExpenseServer with many concurrent keep-alive clients and report
+requests/sec and latency per endpoint.
+
+Without --url a server is started in this process on a free localhost
+port, over a seeded benchmark database (built once, like
+ExpenseBenchmark.py does, then copied so the writes don't grow it).
+
+Usage:
+    python ExpenseLoadTest.py --clients 16 --duration 10
+    python ExpenseLoadTest.py --size 100k --mix read
+    python ExpenseLoadTest.py --url http://127.0.0.1:8765 --out load.json
+
+Exits with status 1 if any request failed (status 500 or a dropped
+connection).
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import sqlite3
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+from ExpenseBenchmark import BENCH_END, DESCRIPTIONS, SIZES, percentile, prepare_database
+from ExpenseTracker import CATEGORIES
+
+# Relative weights of each kind of request in a mix
+MIXES = {
+    'read': {'page': 30, 'deep_page': 10, 'filtered': 15, 'totals': 15,
+             'totals_revalidate': 15, 'monthly': 10, 'search': 5},
+    'mixed': {'page': 25, 'deep_page': 5, 'filtered': 10, 'totals': 10,
+              'totals_revalidate': 15, 'monthly': 10, 'search': 5, 'add': 20},
+    'write': {'add': 80, 'page': 10, 'totals_revalidate': 10},
+}
+
+
+class Client:
+    """One simulated client: a keep-alive connection and its own RNG"""
+
+    def __init__(self, host, port, seed):
+        self.host, self.port = host, port
+        self.rng = random.Random(seed)
+        self.conn = None
+        self.etag = None  # remembered from /totals for conditional requests
+        self.year = BENCH_END.year  # the last year of the seeded data
+
+    def request(self, method, path, body=None, headers=None):
+        if self.conn is None:
+            self.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        try:
+            self.conn.request(method, path, body, headers or {})
+            response = self.conn.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            self.conn.close()
+            self.conn = None
+            raise
+        if response.will_close:
+            self.conn.close()
+            self.conn = None
+        return response
+
+    def run(self, kind):
+        rng = self.rng
+        if kind == 'page':
+            return self.request('GET', '/expenses?limit=100')
+        if kind == 'deep_page':
+            return self.request('GET', f'/expenses?limit=100&after={self.year - 2}-06-15,0')
+        if kind == 'filtered':
+            month = rng.randint(1, 12)
+            return self.request('GET', f'/expenses?category={rng.choice(CATEGORIES)}'
+                                       f'&from={self.year - 1}-{month:02d}-01'
+                                       f'&to={self.year - 1}-{month:02d}-28&limit=50')
+        if kind == 'totals':
+            response = self.request('GET', '/totals')
+            self.etag = response.getheader('ETag')
+            return response
+        if kind == 'totals_revalidate':
+            headers = {'If-None-Match': self.etag} if self.etag else {}
+            response = self.request('GET', '/totals', headers=headers)
+            self.etag = response.getheader('ETag', self.etag)
+            return response
+        if kind == 'monthly':
+            return self.request('GET', f'/totals/monthly?year={self.year - rng.randrange(3)}')
+        if kind == 'search':
+            return self.request('GET', f'/search?q={rng.choice(DESCRIPTIONS)[:4]}&limit=20')
+        if kind == 'add':
+            day = f'{self.year}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}'
+            body = json.dumps({'date': day, 'category': rng.choice(CATEGORIES),
+                               'amount': f'{rng.randint(1, 20000) / 100:.2f}',
+                               'description': 'load test'})
+            return self.request('POST', '/expenses', body,
+                                {'Content-Type': 'application/json'})
+        raise ValueError(f"unknown request kind {kind!r}")
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+
+
+def run_clients(host, port, clients, duration, mix, seed):
+    """Run clients for duration seconds; {kind: [latencies ms]}, statuses, errors"""
+    kinds, weights = zip(*MIXES[mix].items())
+    latencies = {kind: [] for kind in kinds}
+    statuses = {}
+    errors = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(client_no):
+        client = Client(host, port, seed + client_no)
+        local = {kind: [] for kind in kinds}
+        local_statuses = {}
+        try:
+            while time.perf_counter() < deadline:
+                kind = client.rng.choices(kinds, weights)[0]
+                started = time.perf_counter()
+                try:
+                    response = client.run(kind)
+                except (OSError, http.client.HTTPException) as e:
+                    with lock:
+                        errors.append(f"{kind}: {e!r}")
+                    continue
+                local[kind].append((time.perf_counter() - started) * 1000)
+                local_statuses[response.status] = local_statuses.get(response.status, 0) + 1
+        finally:
+            client.close()
+            with lock:
+                for kind, samples in local.items():
+                    latencies[kind].extend(samples)
+                for status, count in local_statuses.items():
+                    statuses[status] = statuses.get(status, 0) + count
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, statuses, errors
+
+
+def start_local_server(args):
+    """Start ExpenseServer on a free port over a copy of a seeded database"""
+    from ExpenseServer import ExpenseServer
+    from ExpenseTracker import ExpenseDatabase
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    count = SIZES[args.size]
+    path = os.path.join(args.data_dir, f'bench-{args.size}-{args.seed}.db')
+    prepare_database(path, count, args.seed)
+    work_path = path + '.load'
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(work_path + suffix):
+            os.remove(work_path + suffix)
+    with sqlite3.connect(path) as source, sqlite3.connect(work_path) as target:
+        source.backup(target)
+
+    db = ExpenseDatabase(work_path, read_pool_size=args.readers)
+    server = ExpenseServer(db, '127.0.0.1', 0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    def stop():
+        server.shutdown()
+        server.server_close()
+        db.close()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(work_path + suffix):
+                os.remove(work_path + suffix)
+    return server.server_address[:2], stop
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the expense HTTP service")
+    parser.add_argument('--url', help="server to test; default starts one in-process")
+    parser.add_argument('--clients', type=int, default=8, help="concurrent connections")
+    parser.add_argument('--duration', type=float, default=10, help="seconds to run")
+    parser.add_argument('--mix', choices=sorted(MIXES), default='mixed')
+    parser.add_argument('--size', choices=sorted(SIZES, key=SIZES.get), default='10k',
+                        help="rows in the in-process server's database")
+    parser.add_argument('--readers', type=int, default=8,
+                        help="read pool size of the in-process server")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--data-dir', default='bench_data')
+    parser.add_argument('--out', help="also write the results here as JSON")
+    args = parser.parse_args(argv)
+
+    stop = None
+    if args.url:
+        url = urlsplit(args.url)
+        host, port = url.hostname, url.port or 80
+    else:
+        (host, port), stop = start_local_server(args)
+    print(f"{args.clients} clients, {args.mix} mix, {args.duration:g}s "
+          f"against http://{host}:{port}/")
+    try:
+        started = time.perf_counter()
+        latencies, statuses, errors = run_clients(host, port, args.clients, args.duration,
+                                                  args.mix, args.seed)
+        elapsed = time.perf_counter() - started
+    finally:
+        if stop:
+            stop()
+
+    total = sum(len(samples) for samples in latencies.values())
+    report = {'clients': args.clients, 'mix': args.mix, 'seconds': elapsed,
+              'requests': total, 'requests_per_sec': total / elapsed,
+              'statuses': {str(status): count for status, count in sorted(statuses.items())},
+              'errors': len(errors), 'endpoints': {}}
+    print(f"{total:,} requests in {elapsed:.1f}s: {total / elapsed:,.0f} requests/sec")
+    for kind, samples in latencies.items():
+        samples.sort()
+        stats = {'requests': len(samples),
+                 'p50_ms': percentile(samples, 0.50),
+                 'p95_ms': percentile(samples, 0.95),
+                 'p99_ms': percentile(samples, 0.99)}
+        report['endpoints'][kind] = stats
+        print(f"  {kind:<18} {len(samples):>8,}  p50 {stats['p50_ms']:8.2f}  "
+              f"p95 {stats['p95_ms']:8.2f}  p99 {stats['p99_ms']:8.2f} ms")
+    print("  status " + ", ".join(f"{status}: {count:,}" for status, count in
+                                  sorted(statuses.items())))
+    for error in errors[:10]:
+        print(f"  {error}")
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    failed = len(errors) + sum(count for status, count in statuses.items() if status >= 500)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
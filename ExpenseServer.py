@@ -0,0 +1,465 @@
+# EXPENSE TRACKER - HTTP SERVICE
+# ==============================
+
+"""
+A local HTTP/JSON service in front of ExpenseDatabase, so scripts, other
+programs and several users at once can reach the data without the Tk app.
+Standard library only; binds to localhost unless told otherwise.
+
+Endpoints (amounts are strings, dates YYYY-MM-DD):
+
+    GET  /expenses                  newest first, one page at a time
+         ?limit=100&after=DATE,ID   keyset cursor from the previous "next"
+         &category=Food&from=..&to=..&min=..&max=..&text=..
+    GET  /expenses.jsonl            every matching expense as JSON Lines,
+                                    streamed (same filters)
+    GET  /expenses/ID
+    GET  /search?q=coffee&limit=50
+    GET  /totals                    total and per-category totals
+    GET  /totals/monthly?year=2026[&month=3]
+    GET  /totals/daily?from=..&to=..
+    POST /expenses                  {"date", "category", "amount", "description"}
+    POST /expenses/bulk             a JSON array, or JSON Lines with
+                                    Content-Type application/x-ndjson
+
+Every GET answers with an ETag derived from the database's data version;
+send it back in If-None-Match and an unchanged answer costs a 304 and no
+query at all. Single adds go through the database's group-commit write
+queue, so many clients adding at once share commits.
+
+Usage:
+    python ExpenseServer.py --db expenses.db --port 8765
+"""
+
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+from decimal import Decimal
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import dropwhile, islice
+from urllib.parse import parse_qs, urlsplit
+
+from ExpenseImporter import ImportReport, normalize_record, validated_rows
+from ExpenseTracker import PAGE_SIZE, ExpenseDatabase, ExpenseFilter
+
+DEFAULT_PORT = 8765
+
+# Largest page a client may ask for; bigger listings use /expenses.jsonl
+MAX_PAGE_SIZE = 1000
+
+# Largest request body accepted (bulk uploads included)
+MAX_BODY_BYTES = 64 * 1024 * 1024
+
+# Expenses per chunk when streaming JSON Lines
+STREAM_BATCH = 500
+
+
+class RequestError(Exception):
+    """Turned into an error response with status and {"error": message}"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return str(value)  # never through float
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def to_json(value):
+    return json.dumps(value, default=_json_default, separators=(',', ':'))
+
+
+def expense_json(expense):
+    record = expense._asdict()
+    record['amount'] = str(record['amount'])
+    return record
+
+
+# ============= REQUEST PARSING =============
+
+def single(query, name, default=None):
+    values = query.get(name)
+    return values[-1] if values else default
+
+
+def integer(query, name, default=None, low=None, high=None):
+    value = single(query, name)
+    if value is None:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise RequestError(HTTPStatus.BAD_REQUEST, f"{name} must be a whole number") from None
+    if (low is not None and number < low) or (high is not None and number > high):
+        raise RequestError(HTTPStatus.BAD_REQUEST, f"{name} must be between {low} and {high}")
+    return number
+
+
+def cursor(query, name):
+    """Parse a DATE,ID keyset cursor"""
+    value = single(query, name)
+    if value is None:
+        return None
+    date, _, expense_id = value.rpartition(',')
+    if not date or not expense_id.isdigit():
+        raise RequestError(HTTPStatus.BAD_REQUEST, f"{name} must look like DATE,ID")
+    return date, int(expense_id)
+
+
+def filters_from(query):
+    """ExpenseFilter from query parameters, or None when there are none"""
+    categories = query.get('category')
+    options = {
+        'start_date': single(query, 'from'),
+        'end_date': single(query, 'to'),
+        'min_amount': single(query, 'min'),
+        'max_amount': single(query, 'max'),
+        'text': single(query, 'text'),
+    }
+    if categories is None and not any(options.values()):
+        return None
+    try:
+        filters = ExpenseFilter(categories=categories, **options)
+        filters.compile()  # rejects bad amounts now rather than mid-stream
+    except ValueError as e:
+        raise RequestError(HTTPStatus.BAD_REQUEST, str(e)) from None
+    return filters
+
+
+def parse_records(body, content_type):
+    """Yield (line number, record) from a JSON array or JSON Lines body"""
+    text = body.decode('utf-8')
+    if 'ndjson' in content_type or 'jsonl' in content_type:
+        for line_no, line in enumerate(text.splitlines(), 1):
+            if line.strip():
+                try:
+                    yield line_no, json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield line_no, e
+        return
+    try:
+        records = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise RequestError(HTTPStatus.BAD_REQUEST, f"invalid JSON: {e}") from None
+    if not isinstance(records, list):
+        raise RequestError(HTTPStatus.BAD_REQUEST, "expected a JSON array of expenses")
+    for index, record in enumerate(records, 1):
+        if isinstance(record, dict):
+            record = {str(k).lower(): v for k, v in record.items()}
+        yield index, record
+
+
+# ============= SERVER =============
+
+class ExpenseServer(ThreadingHTTPServer):
+    """Threaded HTTP server sharing one ExpenseDatabase between requests.
+
+    Each request runs on its own thread and borrows a connection from the
+    database's read pool, so concurrent reads never queue behind each
+    other or behind writes.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, db, host='127.0.0.1', port=DEFAULT_PORT, verbose=False):
+        self.db = db
+        self.verbose = verbose
+        # data_version() restarts with the process; the prefix keeps ETags
+        # handed out by an earlier run from ever matching
+        self.etag_prefix = os.urandom(4).hex()
+        super().__init__((host, port), ExpenseRequestHandler)
+
+    def etag(self):
+        version = self.db.data_version()
+        if isinstance(version, tuple):
+            version = '-'.join(map(str, version))
+        return f'W/"{self.etag_prefix}-{version}"'
+
+
+class ExpenseRequestHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'  # keep-alive, so load tests measure the work
+    server_version = 'ExpenseServer/1.0'
+    # Headers and body go out in separate writes; with Nagle on, the body
+    # waits for the client's delayed ACK (~40 ms on every response)
+    disable_nagle_algorithm = True
+
+    # (method, path pattern, handler name); path groups become arguments
+    ROUTES = (
+        ('GET', r'/expenses', 'list_expenses'),
+        ('GET', r'/expenses\.jsonl', 'stream_expenses'),
+        ('GET', r'/expenses/(\d+)', 'get_expense'),
+        ('GET', r'/search', 'search'),
+        ('GET', r'/totals', 'totals'),
+        ('GET', r'/totals/monthly', 'monthly_totals'),
+        ('GET', r'/totals/daily', 'daily_totals'),
+        ('POST', r'/expenses', 'add_expense'),
+        ('POST', r'/expenses/bulk', 'add_expenses'),
+    )
+    _ROUTES = [(method, re.compile(pattern + '/?'), name) for method, pattern, name in ROUTES]
+
+    @property
+    def db(self):
+        return self.server.db
+
+    def do_GET(self):
+        self.dispatch('GET')
+
+    def do_POST(self):
+        self.dispatch('POST')
+
+    # No route takes these, but a 405 (or 404) says so better than a 501
+    def do_PUT(self):
+        self.dispatch('PUT')
+
+    def do_PATCH(self):
+        self.dispatch('PATCH')
+
+    def do_DELETE(self):
+        self.dispatch('DELETE')
+
+    def dispatch(self, method):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        self.etag = None
+        self.body_read = False
+        allowed = []
+        for route_method, pattern, name in self._ROUTES:
+            match = pattern.fullmatch(url.path)
+            if match is None:
+                continue
+            if route_method != method:
+                allowed.append(route_method)
+                continue
+            try:
+                if method == 'GET':
+                    etag = self.server.etag()
+                    if etag in self.headers.get('If-None-Match', ''):
+                        self.send_response(HTTPStatus.NOT_MODIFIED)
+                        self.send_header('ETag', etag)
+                        self.send_header('Content-Length', '0')
+                        self.end_headers()
+                        return
+                    self.etag = etag
+                getattr(self, name)(query, *match.groups())
+            except RequestError as e:
+                self.send_json({'error': str(e)}, e.status)
+            except (ValueError, KeyError) as e:
+                self.send_json({'error': str(e)}, HTTPStatus.BAD_REQUEST)
+            except Exception as e:
+                self.log_error("%s failed: %r", self.path, e)
+                self.send_json({'error': "internal error"}, HTTPStatus.INTERNAL_SERVER_ERROR)
+            return
+        if allowed:
+            self.send_json({'error': f"use {' or '.join(allowed)}"},
+                           HTTPStatus.METHOD_NOT_ALLOWED, headers={'Allow': ', '.join(allowed)})
+        else:
+            self.send_json({'error': f"no such endpoint {url.path}"}, HTTPStatus.NOT_FOUND)
+
+    # ---------- responses ----------
+
+    def send_json(self, value, status=HTTPStatus.OK, headers=None):
+        body = to_json(value).encode('utf-8')
+        self.send_response(status)
+        if self.command != 'GET' and not self.body_read:
+            # An unread body would be taken for the next request
+            self.send_header('Connection', 'close')
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self._send_cache_headers(status)
+        for name, header in (headers or {}).items():
+            self.send_header(name, header)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_stream(self, records):
+        """Stream records as JSON Lines with chunked transfer encoding"""
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self._send_cache_headers(HTTPStatus.OK)
+        self.end_headers()
+        records = iter(records)
+        try:
+            while True:
+                batch = list(islice(records, STREAM_BATCH))
+                if not batch:
+                    break
+                chunk = ''.join(to_json(record) + '\n' for record in batch).encode('utf-8')
+                self.wfile.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+            self.wfile.write(b'0\r\n\r\n')
+        except (ConnectionError, sqlite3.Error) as e:
+            # The status line is long gone; all that is left is to drop
+            # the connection so the client sees a truncated stream
+            self.close_connection = True
+            if not isinstance(e, ConnectionError):
+                self.log_error("%s failed mid-stream: %r", self.path, e)
+        finally:
+            close = getattr(records, 'close', None)
+            if close:
+                close()  # hand the read connection back if the client went away
+
+    def _send_cache_headers(self, status):
+        etag = getattr(self, 'etag', None)
+        if self.command == 'GET' and etag and status == HTTPStatus.OK:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')  # revalidate, then reuse
+
+    def read_body(self):
+        length = self.headers.get('Content-Length')
+        if length is None:
+            raise RequestError(HTTPStatus.LENGTH_REQUIRED, "Content-Length required")
+        length = int(length)
+        if length > MAX_BODY_BYTES:
+            raise RequestError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                               f"body larger than {MAX_BODY_BYTES} bytes")
+        body = self.rfile.read(length)
+        self.body_read = True
+        return body
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def log_error(self, format, *args):
+        super().log_message(format, *args)
+
+    # ---------- reads ----------
+
+    def list_expenses(self, query):
+        limit = integer(query, 'limit', PAGE_SIZE, 1, MAX_PAGE_SIZE)
+        after = cursor(query, 'after')
+        filters = filters_from(query)
+        if filters is None:
+            rows = self.db.get_expenses_page(after=after, limit=limit)
+        else:
+            source = self.db.iter_expenses(filters if after is None
+                                           else filters & ExpenseFilter(end_date=after[0]))
+            rows = source
+            if after is not None:
+                # Only the cursor's own day can hold rows at or above it
+                rows = dropwhile(lambda row: (row.date, row.id) >= after, rows)
+            try:
+                rows = list(islice(rows, limit))
+            finally:
+                source.close()
+        last = rows[-1] if len(rows) == limit else None
+        self.send_json({
+            'expenses': [expense_json(row) for row in rows],
+            'next': f'{last.date},{last.id}' if last else None,
+        })
+
+    def stream_expenses(self, query):
+        rows = self.db.iter_expenses(filters_from(query))
+        limit = integer(query, 'limit', None, 1)
+        if limit is not None:
+            rows = islice(rows, limit)
+        self.send_stream(expense_json(row) for row in rows)
+
+    def get_expense(self, query, expense_id):
+        expense = self.db.get_expense_by_id(int(expense_id))
+        if expense is None:
+            raise RequestError(HTTPStatus.NOT_FOUND, f"no expense {expense_id}")
+        self.send_json(expense_json(expense))
+
+    def search(self, query):
+        text = single(query, 'q', '')
+        limit = integer(query, 'limit', 50, 1, MAX_PAGE_SIZE)
+        rows = self.db.search_expenses(text, limit)
+        self.send_json({'expenses': [expense_json(row) for row in rows]})
+
+    def totals(self, query):
+        self.send_json({
+            'total': self.db.get_total_expenses(),
+            'by_category': dict(self.db.get_total_by_category()),
+        })
+
+    def monthly_totals(self, query):
+        year = integer(query, 'year', None, 1, 9999)
+        if year is None:
+            raise RequestError(HTTPStatus.BAD_REQUEST, "year is required")
+        month = integer(query, 'month', None, 1, 12)
+        if month is not None:
+            self.send_json({
+                'year': year,
+                'month': month,
+                'total': self.db.get_monthly_total(year, month),
+                'by_category': dict(self.db.get_monthly_total_by_category(year, month)),
+            })
+            return
+        self.send_json({
+            'year': year,
+            'total': self.db.get_yearly_total(year),
+            'months': {f'{m:02d}': self.db.get_monthly_total(year, m) for m in range(1, 13)},
+        })
+
+    def daily_totals(self, query):
+        start, end = single(query, 'from'), single(query, 'to')
+        if not start or not end:
+            raise RequestError(HTTPStatus.BAD_REQUEST, "from and to are required")
+        self.send_json({'days': dict(self.db.get_daily_totals(start, end))})
+
+    # ---------- writes ----------
+
+    def add_expense(self, query):
+        try:
+            record = json.loads(self.read_body())
+        except json.JSONDecodeError as e:
+            raise RequestError(HTTPStatus.BAD_REQUEST, f"invalid JSON: {e}") from None
+        if not isinstance(record, dict):
+            raise RequestError(HTTPStatus.BAD_REQUEST, "expected a JSON object")
+        record = {str(k).lower(): v for k, v in record.items()}
+        try:
+            row = normalize_record(record)
+        except KeyError as e:
+            raise RequestError(HTTPStatus.BAD_REQUEST, f"missing field {e}") from None
+        future = self.db.write_queue().add_expense(*row, record.get('currency'))
+        expense_id = future.result()
+        self.send_json({'id': expense_id}, HTTPStatus.CREATED,
+                       headers={'Location': f'/expenses/{expense_id}'})
+
+    def add_expenses(self, query):
+        report = ImportReport()
+        records = parse_records(self.read_body(), self.headers.get('Content-Type', ''))
+        report.rows_imported = self.db.add_expenses_many(validated_rows(records, report))
+        report.finish()
+        self.send_json({
+            'imported': report.rows_imported,
+            'rejected': report.rows_rejected,
+            'rejects': report.rejects,
+            'seconds': round(report.elapsed, 3),
+        }, HTTPStatus.CREATED if report.rows_imported else HTTPStatus.OK)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the expense database over HTTP/JSON")
+    parser.add_argument('--db', default='expenses.db', help="database file")
+    parser.add_argument('--host', default='127.0.0.1',
+                        help="interface to bind; anything but localhost exposes the data")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--readers', type=int, default=8, help="pooled read connections")
+    parser.add_argument('--verbose', action='store_true', help="log every request")
+    args = parser.parse_args(argv)
+
+    with ExpenseDatabase(args.db, read_pool_size=args.readers) as db:
+        server = ExpenseServer(db, args.host, args.port, args.verbose)
+        host, port = server.server_address[:2]
+        print(f"Serving {args.db} on http://{host}:{port}/ (Ctrl+C to stop)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
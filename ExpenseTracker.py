@@ -12,138 +12,3174 @@ FEATURES:
 - Full database integration
 """
 
-import tkinter as tk
-from tkinter import ttk, messagebox
 from datetime import datetime, timedelta
+from bisect import bisect_left
+from collections import deque, namedtuple
+from contextlib import contextmanager
+from functools import wraps
+from heapq import merge
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from itertools import islice
+import os
+import queue
 import sqlite3
+import sys
+import threading
+import time
+
+# tkinter is only imported when the GUI starts (see load_tk), so scripts
+# and the CLI can use ExpenseDatabase without paying for Tk.
+tk = ttk = messagebox = None
+
+
+def load_tk():
+    """Import tkinter into this module's globals for the GUI classes"""
+    global tk, ttk, messagebox
+    if tk is None:
+        import tkinter as tk
+        from tkinter import ttk, messagebox
+    return tk
+
+
+def analytics_available():
+    """True if NumPy is installed, so ExpenseAnalytics can be imported"""
+    import importlib.util
+    return importlib.util.find_spec('numpy') is not None
+
+
+# ============================================================================
+# DATABASE LAYER
+# ============================================================================
+
+# Pragmas applied to every connection we open. WAL lets readers keep going
+# while the writer commits, and NORMAL sync is durable enough in WAL mode.
+CONNECTION_PRAGMAS = (
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA cache_size = -8000',        # ~8 MB page cache
+    'PRAGMA mmap_size = 67108864',      # 64 MB memory-mapped I/O
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA busy_timeout = 5000',
+)
+
+# How many compiled statements sqlite3 keeps per connection
+STATEMENT_CACHE_SIZE = 128
+
+# Rows per transaction for bulk inserts
+BULK_BATCH_SIZE = 5000
+
+INSERT_EXPENSE_SQL = '''
+    INSERT INTO expenses (date, category, amount_cents, description, currency)
+    VALUES (?, ?, ?, ?, ?)
+'''
+
+UPDATE_EXPENSE_SQL = '''
+    UPDATE expenses
+    SET date = ?, category = ?, amount_cents = ?, description = ?, currency = ?
+    WHERE id = ?
+'''
+
+# Batch updates and deletes touching more rows than this tell listeners
+# with one 'bulk' change rather than one change per row
+BULK_EVENT_ROWS = 50
+
+# Rows copied per transaction when a migration rewrites the table
+MIGRATION_BATCH_SIZE = 20000
+
+# Expense list paging: rows fetched per page, and how many rows the
+# Treeview may hold before rows scrolled far out of view are dropped
+PAGE_SIZE = 100
+MAX_WINDOW_ROWS = 400
+
+# Categories shown in the statistics breakdown
+TOP_CATEGORIES = 5
+
+# Spending insights are recomputed over the whole table, so after writes
+# wait for things to settle before starting another pass
+INSIGHTS_DELAY_MS = 2000
+
+# Search-as-you-type: wait this long after the last keystroke, then show
+# at most this many best matches
+SEARCH_DEBOUNCE_MS = 250
+SEARCH_LIMIT = 200
+
+# Amounts are stored as INTEGER cents and handed out as Decimal, so sums
+# are exact. Columns every expense query returns, in tuple order:
+EXPENSE_COLUMNS = 'id, date, category, amount_cents, description, currency'
+
+_CENT = Decimal('0.01')
+
+
+# SQLite INTEGER is a signed 64-bit value
+MAX_CENTS = 2 ** 63 - 1
+
+
+def to_cents(amount):
+    """Convert a Decimal, int, float or numeric string to integer cents"""
+    if isinstance(amount, float):
+        amount = repr(amount)  # 0.1 -> '0.1', not 0.1000000000000000055...
+    try:
+        cents = int(Decimal(amount).quantize(_CENT, ROUND_HALF_UP).scaleb(2))
+    except (InvalidOperation, TypeError, ValueError, OverflowError):
+        # quantize() refuses exponents past the context; int() refuses NaN
+        # and infinity
+        raise ValueError(f"invalid amount {amount!r}") from None
+    if abs(cents) > MAX_CENTS:
+        raise ValueError(f"amount {amount!r} is too large")
+    return cents
+
+
+def from_cents(cents):
+    """Convert integer cents back to a Decimal amount"""
+    return Decimal(cents or 0).scaleb(-2).quantize(_CENT)
+
+
+# One expense row. Still a tuple, so expense[3] etc. keep working.
+Expense = namedtuple('Expense', 'id date category amount description currency')
+
+
+def expense_row(cursor, row):
+    """Cursor row factory for EXPENSE_COLUMNS: cents come back as Decimal"""
+    return Expense(row[0], row[1], row[2], from_cents(row[3]), row[4], row[5])
+
+
+# Summary tables kept up to date by triggers on expenses, so totals never
+# have to scan the table: (name, key columns, key expressions over a row)
+SUMMARY_TABLES = (
+    ('category_totals', ('category',), ('{row}.category',)),
+    ('daily_totals', ('day',), ('{row}.date',)),
+    ('monthly_totals', ('month',), ('substr({row}.date, 1, 7)',)),
+    ('monthly_category_totals', ('month', 'category'),
+     ('substr({row}.date, 1, 7)', '{row}.category')),
+)
+
+
+def _summary_add_sql(table, keys, exprs, row, amount):
+    columns = ', '.join(keys)
+    values = ', '.join(expr.format(row=row) for expr in exprs)
+    return (f'INSERT INTO {table} ({columns}, total, count) '
+            f'VALUES ({values}, {row}.{amount}, 1) '
+            f'ON CONFLICT ({columns}) DO UPDATE SET '
+            f'total = total + excluded.total, count = count + 1;')
+
+
+def _summary_remove_sql(table, keys, exprs, row, amount):
+    match = ' AND '.join(f'{key} = {expr.format(row=row)}'
+                         for key, expr in zip(keys, exprs))
+    return (f'UPDATE {table} SET total = total - {row}.{amount}, '
+            f'count = count - 1 WHERE {match}; '
+            f'DELETE FROM {table} WHERE {match} AND count <= 0;')
+
+
+def create_summary_tables(conn, amount='amount_cents', total_type='INTEGER'):
+    """Create the summary tables, their triggers, and fill them"""
+    add_new, remove_old = [], []
+    for table, keys, exprs in SUMMARY_TABLES:
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                {' TEXT NOT NULL, '.join(keys)} TEXT NOT NULL,
+                total {total_type} NOT NULL DEFAULT 0,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY ({', '.join(keys)})
+            ) WITHOUT ROWID
+        ''')
+        add_new.append(_summary_add_sql(table, keys, exprs, 'NEW', amount))
+        remove_old.append(_summary_remove_sql(table, keys, exprs, 'OLD', amount))
+    
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS expenses_summary_insert
+        AFTER INSERT ON expenses BEGIN {' '.join(add_new)} END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS expenses_summary_delete
+        AFTER DELETE ON expenses BEGIN {' '.join(remove_old)} END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS expenses_summary_update
+        AFTER UPDATE OF date, category, {amount} ON expenses
+        BEGIN {' '.join(remove_old)} {' '.join(add_new)} END
+    ''')
+    fill_summary_tables(conn, amount)
+
+
+def repair_summary_update_trigger(conn):
+    """Recreate the update trigger and refill the totals.
+    
+    The trigger used to name the amount column 'amount' after it became
+    amount_cents, so updates that changed only the amount never fired it
+    and the totals drifted.
+    """
+    conn.execute('DROP TRIGGER IF EXISTS expenses_summary_update')
+    create_summary_tables(conn)
+
+
+def fill_summary_tables(conn, amount='amount_cents'):
+    """Recompute every summary table from the expenses table"""
+    for table, keys, exprs in SUMMARY_TABLES:
+        groups = ', '.join(expr.format(row='expenses') for expr in exprs)
+        conn.execute(f'DELETE FROM {table}')
+        conn.execute(f'''
+            INSERT INTO {table} ({', '.join(keys)}, total, count)
+            SELECT {groups}, SUM({amount}), COUNT(*)
+            FROM expenses GROUP BY {groups}
+        ''')
+
+
+def add_to_summary_tables(conn, after_id, amount='amount_cents'):
+    """Fold rows with id > after_id into the summary tables in one
+    set-based pass per table (what the insert trigger does row by row)"""
+    for table, keys, exprs in SUMMARY_TABLES:
+        groups = ', '.join(expr.format(row='expenses') for expr in exprs)
+        conn.execute(f'''
+            INSERT INTO {table} ({', '.join(keys)}, total, count)
+            SELECT {groups}, SUM({amount}), COUNT(*)
+            FROM expenses WHERE id > ? GROUP BY {groups}
+            ON CONFLICT ({', '.join(keys)}) DO UPDATE SET
+                total = total + excluded.total, count = count + excluded.count
+        ''', (after_id,))
+
+
+def streaming(step):
+    """Mark a migration step that runs its own transactions.
+    
+    It is called as step(db, version) instead of inside one transaction,
+    and must set user_version in its final transaction.
+    """
+    step.streaming = True
+    return step
+
+
+# REAL dollars -> INTEGER cents. round(x, 2) first matches what Decimal
+# does with the printed value (0.285 -> 29 cents, not 28).
+_REAL_TO_CENTS = 'CAST(round(round({row}amount, 2) * 100) AS INTEGER)'
+
+
+@streaming
+def convert_amounts_to_cents(db, version):
+    """Rebuild expenses with INTEGER cents and a currency column.
+    
+    Rows are copied into expenses_new in short batches, so other
+    connections can keep reading and writing in between. Triggers mirror
+    updates and deletes of rows already copied. A final short transaction
+    swaps the tables. If interrupted, the copy resumes where it stopped.
+    """
+    with db.transaction() as conn:
+        conn.execute('DROP INDEX IF EXISTS idx_expenses_date_id')
+        conn.execute('DROP INDEX IF EXISTS idx_expenses_category_date')
+        conn.execute('DROP INDEX IF EXISTS idx_expenses_category_amount')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS expenses_new (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                date TEXT NOT NULL,
+                category TEXT NOT NULL,
+                amount_cents INTEGER NOT NULL,
+                description TEXT,
+                currency TEXT
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_expenses_date_id ON expenses_new (date, id)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_expenses_category_date ON expenses_new (category, date)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_expenses_category_amount ON expenses_new (category, amount_cents)')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS expenses_migrate_update
+            AFTER UPDATE ON expenses BEGIN
+                UPDATE expenses_new SET date = NEW.date, category = NEW.category,
+                    amount_cents = {_REAL_TO_CENTS.format(row='NEW.')},
+                    description = NEW.description
+                WHERE id = NEW.id;
+            END
+        ''')
+        conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS expenses_migrate_delete
+            AFTER DELETE ON expenses BEGIN
+                DELETE FROM expenses_new WHERE id = OLD.id;
+            END
+        ''')
+    
+    copy_batch = f'''
+        INSERT INTO expenses_new (id, date, category, amount_cents, description)
+        SELECT id, date, category, {_REAL_TO_CENTS.format(row='')}, description
+        FROM expenses WHERE id > ? ORDER BY id LIMIT ?
+    '''
+    while True:
+        with db.transaction() as conn:
+            last_id = conn.execute('SELECT MAX(id) FROM expenses_new').fetchone()[0]
+            copied = conn.execute(copy_batch, (last_id or 0, MIGRATION_BATCH_SIZE)).rowcount
+        if copied < MIGRATION_BATCH_SIZE:
+            break
+    
+    with db.transaction() as conn:
+        # Catch rows inserted since the last batch, then swap
+        last_id = conn.execute('SELECT MAX(id) FROM expenses_new').fetchone()[0]
+        conn.execute(copy_batch, (last_id or 0, -1))
+        old_seq = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'expenses'").fetchone()
+        conn.execute('DROP TABLE expenses')  # takes its triggers with it
+        conn.execute('ALTER TABLE expenses_new RENAME TO expenses')
+        if old_seq:
+            # Never hand out an id that was used before the migration
+            conn.execute('''
+                UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'expenses'
+            ''', old_seq)
+        for table, keys, exprs in SUMMARY_TABLES:
+            conn.execute(f'DROP TABLE IF EXISTS {table}')
+        create_summary_tables(conn)
+        conn.execute(f'PRAGMA user_version = {version:d}')
+
+
+def create_search_index(conn):
+    """Full-text index over description and category, kept in sync by
+    triggers. Skipped when SQLite was built without FTS5; search_expenses
+    falls back to LIKE then."""
+    options = {row[0] for row in conn.execute('PRAGMA compile_options')}
+    if 'ENABLE_FTS5' not in options:
+        return
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS expenses_fts USING fts5(
+            description, category,
+            content='expenses', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS expenses_fts_insert
+        AFTER INSERT ON expenses BEGIN
+            INSERT INTO expenses_fts (rowid, description, category)
+            VALUES (NEW.id, NEW.description, NEW.category);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS expenses_fts_delete
+        AFTER DELETE ON expenses BEGIN
+            INSERT INTO expenses_fts (expenses_fts, rowid, description, category)
+            VALUES ('delete', OLD.id, OLD.description, OLD.category);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS expenses_fts_update
+        AFTER UPDATE OF description, category ON expenses BEGIN
+            INSERT INTO expenses_fts (expenses_fts, rowid, description, category)
+            VALUES ('delete', OLD.id, OLD.description, OLD.category);
+            INSERT INTO expenses_fts (rowid, description, category)
+            VALUES (NEW.id, NEW.description, NEW.category);
+        END
+    ''')
+    conn.execute("INSERT INTO expenses_fts (expenses_fts) VALUES ('rebuild')")
+
+
+def add_to_search_index(conn, after_id):
+    """Index rows with id > after_id in one pass (bulk form of the trigger)"""
+    conn.execute('''
+        INSERT INTO expenses_fts (rowid, description, category)
+        SELECT id, description, category FROM expenses WHERE id > ?
+    ''', (after_id,))
+
+
+# Per-row insert triggers that bulk inserts suspend, each with the
+# set-based function that catches up on the skipped rows afterwards
+BULK_INSERT_TRIGGERS = (
+    ('expenses_summary_insert', add_to_summary_tables),
+    ('expenses_fts_insert', add_to_search_index),
+)
+
+# Chunks smaller than this just let the triggers run row by row
+BULK_TRIGGER_THRESHOLD = 500
+
+
+def fts_query(text):
+    """Turn typed text into an FTS5 query: every word must match, and
+    each word also matches as a prefix ('cof sta' finds 'coffee starbucks')"""
+    words = text.replace('"', ' ').split()
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+# Schema migrations, applied in order. PRAGMA user_version records how many
+# have run, so only ever append to this list. Each step is a list of SQL
+# statements or a callable taking the writer connection.
+MIGRATIONS = [
+    # 1: the original table
+    ['''
+        CREATE TABLE IF NOT EXISTS expenses (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date TEXT NOT NULL,
+            category TEXT NOT NULL,
+            amount REAL NOT NULL,
+            description TEXT
+        )
+    '''],
+    # 2: indexes for the list, filter and aggregate queries
+    [
+        'CREATE INDEX IF NOT EXISTS idx_expenses_date_id ON expenses (date, id)',
+        'CREATE INDEX IF NOT EXISTS idx_expenses_category_date ON expenses (category, date)',
+        'CREATE INDEX IF NOT EXISTS idx_expenses_category_amount ON expenses (category, amount)',
+    ],
+    # 3: trigger-maintained totals per category, day, month and month+category
+    lambda conn: create_summary_tables(conn, amount='amount', total_type='REAL'),
+    # 4: exact INTEGER cents plus an optional currency column
+    convert_amounts_to_cents,
+    # 5: FTS5 search over descriptions
+    create_search_index,
+    # 6: months moved out to memory-mapped archive files (ExpenseArchive)
+    ['''
+        CREATE TABLE IF NOT EXISTS archived_partitions (
+            month TEXT PRIMARY KEY,
+            file TEXT NOT NULL,
+            rows INTEGER NOT NULL,
+            total INTEGER NOT NULL
+        )
+    '''],
+    # 7: whole years moved out to their own database files (retire_years)
+    ['''
+        CREATE TABLE IF NOT EXISTS retired_years (
+            year TEXT PRIMARY KEY,
+            file TEXT NOT NULL,
+            rows INTEGER NOT NULL,
+            total INTEGER NOT NULL
+        )
+    '''],
+    # 8: spending limits per category and window (ExpenseBudgets)
+    ['''
+        CREATE TABLE IF NOT EXISTS budgets (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            category TEXT,
+            period TEXT NOT NULL
+                CHECK (period IN ('daily', 'weekly', 'monthly', 'custom')),
+            days INTEGER,
+            limit_cents INTEGER NOT NULL CHECK (limit_cents > 0),
+            warn_at REAL NOT NULL DEFAULT 0.8
+        )
+    '''],
+    # 9: summary totals follow amount-only updates again
+    repair_summary_update_trigger,
+]
+
+CATEGORIES = ('Food', 'Transport', 'Entertainment', 'Shopping', 'Bills',
+              'Healthcare', 'Education', 'Other')
+
+# A budget limits spending in one category (None: all of them together)
+# over a window: the calendar day, week (from Monday) or month, or the
+# last `days` days for 'custom'. warn_at is the fraction of the limit
+# that raises a warning before the limit itself is passed.
+BUDGET_PERIODS = ('daily', 'weekly', 'monthly', 'custom')
+BUDGET_WARN_AT = 0.8
+# Longest 'custom' window, about ten years
+MAX_BUDGET_DAYS = 3660
+Budget = namedtuple('Budget', 'id category period days limit warn_at')
+
+
+# Sent to change listeners after a write commits. action is 'insert',
+# 'update' or 'delete' with the affected row (and the row as it was before
+# an update or delete), or 'bulk' with no rows when many rows changed at once.
+# version is the data version the commit produced (see read_snapshot).
+ExpenseChange = namedtuple('ExpenseChange', 'action row old_row version', defaults=(0,))
+
+
+def month_bounds(year, month):
+    """Return ('YYYY-MM-01', first day of next month) for a range query"""
+    year, month = int(year), int(month)
+    next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return f'{year:04d}-{month:02d}-01', f'{next_year:04d}-{next_month:02d}-01'
+
+
+class ExpenseFilter:
+    """
+    A set of conditions on expenses, compiled into one parameterized query.
+    
+    Every condition is optional. Combine filters with & to require both:
+    
+        recent = ExpenseFilter(start_date='2026-01-01')
+        big_food = ExpenseFilter(categories={'Food'}, min_amount=50)
+        db.iter_expenses(recent & big_food)
+    
+    Dates are inclusive, like get_expenses_by_date_range. text matches
+    anywhere in the description, case-insensitively.
+    """
+    
+    def __init__(self, categories=None, start_date=None, end_date=None,
+                 min_amount=None, max_amount=None, text=None):
+        self.categories = frozenset(categories) if categories is not None else None
+        self.start_date = start_date
+        self.end_date = end_date
+        self.min_amount = min_amount
+        self.max_amount = max_amount
+        self.texts = (text,) if text else ()
+    
+    def __and__(self, other):
+        def narrowest(a, b, pick):
+            return b if a is None else a if b is None else pick(a, b)
+        
+        combined = ExpenseFilter(
+            categories=narrowest(self.categories, other.categories,
+                                 frozenset.intersection),
+            start_date=narrowest(self.start_date, other.start_date, max),
+            end_date=narrowest(self.end_date, other.end_date, min),
+            min_amount=narrowest(self.min_amount, other.min_amount, max),
+            max_amount=narrowest(self.max_amount, other.max_amount, min),
+        )
+        combined.texts = self.texts + other.texts
+        return combined
+    
+    def compile(self):
+        """Return (where clause, params); the clause is '' if unfiltered"""
+        clauses, params = [], []
+        if self.categories is not None:
+            if not self.categories:
+                clauses.append('0')  # intersected down to nothing
+            else:
+                marks = ', '.join('?' * len(self.categories))
+                clauses.append(f'category IN ({marks})')
+                params.extend(sorted(self.categories))
+        if self.start_date is not None:
+            clauses.append('date >= ?')
+            params.append(self.start_date)
+        if self.end_date is not None:
+            clauses.append('date <= ?')
+            params.append(self.end_date)
+        if self.min_amount is not None:
+            clauses.append('amount_cents >= ?')
+            params.append(to_cents(self.min_amount))
+        if self.max_amount is not None:
+            clauses.append('amount_cents <= ?')
+            params.append(to_cents(self.max_amount))
+        for text in self.texts:
+            escaped = (text.replace('\\', '\\\\').replace('%', '\\%')
+                       .replace('_', '\\_'))
+            clauses.append("description LIKE ? ESCAPE '\\'")
+            params.append(f'%{escaped}%')
+        return ('WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+
+# ---------- instrumentation ----------
+
+# Latency histogram bucket upper bounds in milliseconds (the last bucket
+# catches everything slower)
+LATENCY_BUCKETS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250,
+                      500, 1000, 2500)
+SLOW_QUERY_MS = 100
+MAX_SLOW_ENTRIES = 50
+
+
+class LatencyStats:
+    """Count, time, rows and a latency histogram for one method or statement"""
+    
+    __slots__ = ('count', 'errors', 'total_ms', 'max_ms', 'rows', 'buckets')
+    
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.rows = 0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+    
+    def add(self, elapsed_ms, rows, failed):
+        self.count += 1
+        self.errors += failed
+        self.total_ms += elapsed_ms
+        self.rows += rows
+        if elapsed_ms > self.max_ms:
+            self.max_ms = elapsed_ms
+        self.buckets[bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+    
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of calls"""
+        wanted = fraction * self.count
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS_MS, self.buckets):
+            seen += count
+            if seen >= wanted:
+                return min(bound, self.max_ms)
+        return self.max_ms
+    
+    def as_dict(self):
+        histogram = {f'<={bound}': count
+                     for bound, count in zip(LATENCY_BUCKETS_MS, self.buckets)}
+        histogram[f'>{LATENCY_BUCKETS_MS[-1]}'] = self.buckets[-1]
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'rows': self.rows,
+            'total_ms': self.total_ms,
+            'mean_ms': self.total_ms / self.count if self.count else 0.0,
+            'max_ms': self.max_ms,
+            'p50_ms': self.percentile(0.50),
+            'p95_ms': self.percentile(0.95),
+            'p99_ms': self.percentile(0.99),
+            'histogram': histogram,
+        }
+
+
+class Instrumentation:
+    """
+    Where the time goes inside an ExpenseDatabase.
+    
+    Collects LatencyStats per public method and per SQL statement (with
+    whitespace collapsed), and logs every statement slower than slow_ms
+    together with its EXPLAIN QUERY PLAN to the 'ExpenseTracker.slow'
+    logger. The most recent slow statements are also kept for snapshot().
+    Enable it with ExpenseDatabase.enable_instrumentation().
+    """
+    
+    def __init__(self, slow_ms=SLOW_QUERY_MS, max_slow_entries=MAX_SLOW_ENTRIES):
+        import logging
+        
+        self.slow_ms = slow_ms
+        self.logger = logging.getLogger('ExpenseTracker.slow')
+        self._lock = threading.Lock()
+        self._max_slow_entries = max_slow_entries
+        self._normalized = {}
+        self.reset()
+    
+    def reset(self):
+        """Forget everything recorded so far"""
+        with self._lock:
+            self.started = time.time()
+            self.methods = {}
+            self.statements = {}
+            self._slow = deque(maxlen=self._max_slow_entries)
+    
+    def record_method(self, name, elapsed_ms, rows, failed=False):
+        with self._lock:
+            stats = self.methods.get(name)
+            if stats is None:
+                stats = self.methods[name] = LatencyStats()
+            stats.add(elapsed_ms, rows, failed)
+    
+    def record_statement(self, sql, elapsed_ms, rows, failed=False):
+        key = self._normalized.get(sql)
+        if key is None:
+            key = ' '.join(sql.split())
+            if len(self._normalized) < 1000:
+                self._normalized[sql] = key
+        with self._lock:
+            stats = self.statements.get(key)
+            if stats is None:
+                stats = self.statements[key] = LatencyStats()
+            stats.add(elapsed_ms, rows, failed)
+        return key
+    
+    def record_slow(self, statement, params, elapsed_ms, rows, plan):
+        entry = {
+            'at': datetime.now().isoformat(timespec='seconds'),
+            'sql': statement,
+            'params': [repr(param) for param in params][:20],
+            'ms': elapsed_ms,
+            'rows': rows,
+            'plan': plan,
+        }
+        with self._lock:
+            self._slow.append(entry)
+        self.logger.warning('slow query (%.1f ms, %d rows): %s\n  plan: %s',
+                            elapsed_ms, rows, statement,
+                            '; '.join(plan) if plan else 'n/a')
+    
+    def snapshot(self):
+        """Return everything recorded so far as plain, JSON-ready data"""
+        with self._lock:
+            return {
+                'since': datetime.fromtimestamp(self.started).isoformat(timespec='seconds'),
+                'seconds': time.time() - self.started,
+                'slow_ms': self.slow_ms,
+                'methods': {name: stats.as_dict() for name, stats in self.methods.items()},
+                'statements': {sql: stats.as_dict()
+                               for sql, stats in self.statements.items()},
+                'slow': list(self._slow),
+            }
+
+
+class _Connection(sqlite3.Connection):
+    """The connection class ExpenseDatabase opens; adds nothing.
+    
+    Instrumentation switches a live connection between this class and
+    _TracedConnection by assigning __class__, so connections never have
+    to be reopened and an untraced connection costs exactly what a plain
+    sqlite3 connection does.
+    """
+    
+    instrumentation = None
+
+
+class _TracedConnection(_Connection):
+    
+    def cursor(self, factory=None):
+        return super().cursor(factory or _TracedCursor)
+    
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+    
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+    
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+
+class _TracedCursor(sqlite3.Cursor):
+    """Times a statement from execute until its last row has been fetched"""
+    
+    _sql = None
+    
+    def _run(self, method, sql, parameters):
+        self._finish()
+        self._sql, self._params, self._rows, self._failed = sql, parameters, 0, False
+        started = time.perf_counter()
+        try:
+            return method(self, sql, parameters)
+        except BaseException:
+            self._failed = True
+            raise
+        finally:
+            self._elapsed = time.perf_counter() - started
+            if self._failed or self.description is None:
+                # Nothing to fetch (DML, DDL, pragmas that return nothing)
+                self._rows = max(self.rowcount, 0)
+                self._finish()
+    
+    def execute(self, sql, parameters=()):
+        return self._run(sqlite3.Cursor.execute, sql, parameters)
+    
+    def executemany(self, sql, seq_of_parameters):
+        return self._run(sqlite3.Cursor.executemany, sql, seq_of_parameters)
+    
+    def executescript(self, sql_script):
+        return self._run(lambda cursor, sql, _: sqlite3.Cursor.executescript(cursor, sql),
+                         sql_script, None)
+    
+    def _timed_fetch(self, fetch, *args):
+        started = time.perf_counter()
+        try:
+            return fetch(self, *args)
+        finally:
+            self._elapsed += time.perf_counter() - started
+    
+    def fetchone(self):
+        row = self._timed_fetch(sqlite3.Cursor.fetchone)
+        if row is None:
+            self._finish()
+        elif self._sql is not None:
+            self._rows += 1
+        return row
+    
+    def fetchmany(self, size=None):
+        rows = self._timed_fetch(sqlite3.Cursor.fetchmany,
+                                 self.arraysize if size is None else size)
+        if not rows:
+            self._finish()
+        elif self._sql is not None:
+            self._rows += len(rows)
+        return rows
+    
+    def fetchall(self):
+        rows = self._timed_fetch(sqlite3.Cursor.fetchall)
+        if self._sql is not None:
+            self._rows += len(rows)
+        self._finish()
+        return rows
+    
+    def __next__(self):
+        try:
+            row = self._timed_fetch(sqlite3.Cursor.__next__)
+        except StopIteration:
+            self._finish()
+            raise
+        if self._sql is not None:
+            self._rows += 1
+        return row
+    
+    def close(self):
+        self._finish()
+        super().close()
+    
+    def __del__(self):
+        # Callers often read one row and drop the cursor
+        self._finish()
+    
+    def _finish(self):
+        sql = self._sql
+        if sql is None:
+            return
+        self._sql = None
+        instrumentation = self.connection.instrumentation
+        if instrumentation is None:
+            return
+        elapsed_ms = self._elapsed * 1000
+        statement = instrumentation.record_statement(sql, elapsed_ms, self._rows,
+                                                     self._failed)
+        if elapsed_ms >= instrumentation.slow_ms:
+            instrumentation.record_slow(statement, self._explainable_params(),
+                                        elapsed_ms, self._rows, self._plan(sql))
+    
+    def _explainable_params(self):
+        params = self._params
+        if isinstance(params, (tuple, list)):
+            return params
+        if isinstance(params, dict):
+            return list(params.values())
+        return []  # executemany's iterator or executescript
+    
+    def _plan(self, sql):
+        params = self._params
+        if not isinstance(params, (tuple, list, dict)):
+            return None
+        try:
+            # The plain execute, so the EXPLAIN itself is not traced
+            return [row[3] for row in sqlite3.Connection.execute(
+                self.connection, 'EXPLAIN QUERY PLAN ' + sql, params)]
+        except sqlite3.Error:
+            return None
+
+
+def _traced_generator(instrumentation, name, generator):
+    # Only the time spent producing rows counts, not the consumer's work
+    elapsed = 0.0
+    rows = 0
+    failed = False
+    try:
+        while True:
+            started = time.perf_counter()
+            try:
+                row = next(generator)
+            except StopIteration:
+                return
+            except BaseException:
+                failed = True
+                raise
+            finally:
+                elapsed += time.perf_counter() - started
+            rows += 1
+            yield row
+    finally:
+        generator.close()
+        instrumentation.record_method(name, elapsed * 1000, rows, failed)
+
+
+def _rows_in(result):
+    # What counts as "rows returned" by a public ExpenseDatabase method
+    if result is None:
+        return 0
+    if type(result) is list:
+        return len(result)
+    return 1
+
+
+# ---------- result cache ----------
+
+# Default result cache limits: entries kept, seconds before an entry is
+# refetched anyway, and the longest list worth keeping
+CACHE_SIZE = 256
+CACHE_TTL = 60.0
+CACHE_MAX_ROWS = 5000
+
+
+class ResultCache:
+    """
+    LRU cache of query results, each tagged with the data version it was
+    read at.
+    
+    An entry is only served while the database's data version still
+    matches, so any committed write invalidates it; entries older than
+    ttl seconds, or pushed out by max_entries newer ones, are dropped too.
+    """
+    
+    def __init__(self, max_entries=CACHE_SIZE, ttl=CACHE_TTL, max_rows=CACHE_MAX_ROWS):
+        from collections import OrderedDict
+        
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self._entries = OrderedDict()  # key -> (version, expires, value)
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+        self.stale = self.expired = self.evicted = 0
+    
+    def get(self, key, version):
+        """Return (True, value) on a hit, (False, None) on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] != version:
+                    self.stale += 1
+                    del self._entries[key]
+                elif entry[1] < time.monotonic():
+                    self.expired += 1
+                    del self._entries[key]
+                else:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, entry[2]
+            self.misses += 1
+            return False, None
+    
+    def put(self, key, value, version):
+        if type(value) is list and len(value) > self.max_rows:
+            return
+        with self._lock:
+            self._entries[key] = (version, time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evicted += 1
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'stale': self.stale,
+                'expired': self.expired,
+                'evicted': self.evicted,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+            }
+
+
+def cached(method):
+    """Serve repeated calls to an ExpenseDatabase read from its ResultCache"""
+    name = method.__name__
+    
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        cache = self.cache
+        # Inside our own transaction reads must see the uncommitted rows
+        if cache is None or self._in_own_transaction():
+            return method(self, *args, **kwargs)
+        key = (name, args, tuple(sorted(kwargs.items()))) if kwargs else (name, args)
+        version = self.data_version()
+        try:
+            found, value = cache.get(key, version)
+        except TypeError:  # unhashable arguments
+            return method(self, *args, **kwargs)
+        if not found:
+            # The version was read first, so a write that lands while the
+            # query runs makes this entry stale rather than wrong
+            value = method(self, *args, **kwargs)
+            cache.put(key, value, version)
+        # Callers may sort or reverse what they get back
+        return list(value) if type(value) is list else value
+    return wrapper
+
+
+# ---------- group commit ----------
+
+# Writes queued within this many milliseconds of each other share a commit
+GROUP_COMMIT_WINDOW_MS = 0.5
+# Most writes in one group commit
+GROUP_COMMIT_MAX_WRITES = 256
+# Writes that may wait in the queue before submit() blocks
+WRITE_QUEUE_SIZE = 1024
+
+
+class WriteQueue:
+    """
+    Funnels writes from many threads through one writer thread that
+    commits them in groups.
+    
+    Each submitted write gets a Future. The writer thread takes the first
+    waiting write, keeps collecting more for up to window_ms or max_writes,
+    and runs the whole group in one transaction: one BEGIN IMMEDIATE, one
+    COMMIT and one sync instead of one per write. Every write runs in its
+    own savepoint, so a write that fails is rolled back alone and only its
+    future gets the exception. Futures resolve after the COMMIT, so a
+    result means the write is on disk.
+    
+    At most max_pending writes wait in the queue; submit() blocks when it
+    is full (or raises queue.Full once timeout runs out), so producers
+    cannot run arbitrarily far ahead of the disk.
+    """
+    
+    def __init__(self, db, window_ms=GROUP_COMMIT_WINDOW_MS,
+                 max_writes=GROUP_COMMIT_MAX_WRITES, max_pending=WRITE_QUEUE_SIZE):
+        self.db = db
+        self.window = window_ms / 1000
+        self.max_writes = max(1, max_writes)
+        self._queue = queue.Queue(max_pending)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+        self.commits = self.writes = self.failed = self.largest_group = 0
+    
+    def submit(self, write, *args, timeout=None, **kwargs):
+        """Queue write(*args, **kwargs) and return a Future for its result.
+        
+        write runs on the writer thread inside the group's transaction;
+        normally a bound ExpenseDatabase method such as db.add_expense.
+        """
+        from concurrent.futures import Future
+        
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("WriteQueue is closed")
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='expense-writer',
+                                                daemon=True)
+                self._thread.start()
+        future = Future()
+        self._queue.put((future, write, args, kwargs), timeout=timeout)
+        return future
+    
+    def add_expense(self, date, category, amount, description='', currency=None,
+                    timeout=None):
+        """Queue db.add_expense; the Future's result is the new row's id"""
+        return self.submit(self.db.add_expense, date, category, amount, description,
+                           currency, timeout=timeout)
+    
+    def update_expense(self, expense_id, date, category, amount, description,
+                       currency=None, timeout=None):
+        return self.submit(self.db.update_expense, expense_id, date, category, amount,
+                           description, currency, timeout=timeout)
+    
+    def delete_expense(self, expense_id, timeout=None):
+        return self.submit(self.db.delete_expense, expense_id, timeout=timeout)
+    
+    def close(self):
+        """Commit everything already queued, then stop the writer thread"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+    
+    def stats(self):
+        return {
+            'commits': self.commits,
+            'writes': self.writes,
+            'failed': self.failed,
+            'writes_per_commit': self.writes / self.commits if self.commits else 0.0,
+            'largest_group': self.largest_group,
+            'queued': self._queue.qsize(),
+        }
+    
+    def _run(self):
+        stopping = False
+        while not stopping:
+            group = []
+            item = self._queue.get()
+            deadline = time.monotonic() + self.window
+            while True:
+                if item is None:
+                    stopping = True
+                else:
+                    group.append(item)
+                if len(group) >= self.max_writes:
+                    break
+                try:
+                    if stopping:
+                        item = self._queue.get_nowait()
+                    else:
+                        remaining = deadline - time.monotonic()
+                        item = (self._queue.get(timeout=remaining) if remaining > 0
+                                else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if group:
+                self._commit(group)
+            if stopping and not self._queue.empty():
+                stopping = False  # more than one group's worth was left
+                self._queue.put(None)
+    
+    def _commit(self, group):
+        db = self.db
+        running, outcomes = [], []
+        try:
+            with db.transaction() as conn:
+                for future, write, args, kwargs in group:
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    running.append(future)
+                    events, hooks = len(db._pending_events), len(db._tx_hooks)
+                    conn.execute('SAVEPOINT queued_write')
+                    try:
+                        result = write(*args, **kwargs)
+                    except Exception as e:
+                        conn.execute('ROLLBACK TO queued_write')
+                        conn.execute('RELEASE queued_write')
+                        # Forget what the failed write queued for commit time
+                        del db._pending_events[events:]
+                        rolled_back, db._tx_hooks[hooks:] = db._tx_hooks[hooks:], []
+                        for _, on_rollback in rolled_back:
+                            if on_rollback:
+                                on_rollback()
+                        outcomes.append((future, None, e))
+                    else:
+                        conn.execute('RELEASE queued_write')
+                        outcomes.append((future, result, None))
+        except Exception as e:
+            # The COMMIT itself failed: none of the group was written
+            self.failed += len(running)
+            for future in running:
+                future.set_exception(e)
+            return
+        
+        self.commits += 1
+        self.writes += len(outcomes)
+        self.largest_group = max(self.largest_group, len(outcomes))
+        for future, result, error in outcomes:
+            if error is None:
+                future.set_result(result)
+            else:
+                self.failed += 1
+                future.set_exception(error)
+
+
+# ---------- archive ----------
+
+# archive_closed_months() keeps this many most recent months (the current
+# one included) in the live table
+ARCHIVE_KEEP_MONTHS = 3
+
+# Only well-formed dates can be archived; a partition stores the day as a number
+_ARCHIVABLE_DATE = "date GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'"
+
+
+def _list_order(expense):
+    return expense[1], expense[0]
+
+
+def _merge_in_list_order(live, archived, newest_first=True):
+    """Merge two streams of Expense rows that are each in (date, id) order"""
+    return merge(live, archived, key=_list_order, reverse=newest_first)
+
+
+def _archived_expense(row):
+    return Expense(row[0], row[1], row[2], from_cents(row[3]), row[4], row[5])
+
+
+def _archived(partitions, filters=None, newest_first=True, below=None, above=None):
+    """Yield archived Expense rows matching filters, in list order.
+    
+    below/above are (date, id) keys that the rows must sort before/after,
+    like the keyset bounds in get_expenses_page. Partitions whose footer
+    rules them out are skipped without reading any rows.
+    """
+    filters = filters or ExpenseFilter()
+    min_cents = to_cents(filters.min_amount) if filters.min_amount is not None else None
+    max_cents = to_cents(filters.max_amount) if filters.max_amount is not None else None
+    texts = [text.lower() for text in filters.texts]
+    for partition in (reversed(partitions) if newest_first else partitions):
+        footer = partition.footer
+        if filters.categories is not None and not filters.categories & footer['by_category'].keys():
+            continue
+        if (min_cents is not None and footer['max_cents'] < min_cents
+                or max_cents is not None and footer['min_cents'] > max_cents):
+            continue
+        start, stop = partition.date_span(filters.start_date, filters.end_date)
+        if below is not None:
+            stop = min(stop, partition.key_index(*below, inclusive=True))
+        if above is not None:
+            start = max(start, partition.key_index(*above))
+        if start >= stop:
+            continue
+        for row in partition.select(start, stop, newest_first, filters.categories,
+                                    min_cents, max_cents):
+            if texts and not all(text in (row[4] or '').lower() for text in texts):
+                continue
+            yield _archived_expense(row)
+
+
+def _archived_aggregate(partition, filters):
+    """(count, cents) of a partition's rows matching filters.
+    
+    Answered from the footer when the filter is only categories and a
+    date range that covers the whole month or no category test applies;
+    otherwise the matching rows are scanned.
+    """
+    footer = partition.footer
+    whole_month = ((filters.start_date is None or filters.start_date <= footer['min_date'])
+                   and (filters.end_date is None or filters.end_date >= footer['max_date']))
+    simple = (filters.min_amount is None and filters.max_amount is None
+              and not filters.texts)
+    if simple and whole_month:
+        stats = partition.category_totals()
+        if filters.categories is not None:
+            stats = {name: value for name, value in stats.items()
+                     if name in filters.categories}
+        return (sum(count for count, _ in stats.values()),
+                sum(cents for _, cents in stats.values()))
+    if simple and filters.categories is None:
+        stats = [value for day, value in partition.day_totals().items()
+                 if (filters.start_date is None or day >= filters.start_date)
+                 and (filters.end_date is None or day <= filters.end_date)]
+        return sum(count for count, _ in stats), sum(cents for _, cents in stats)
+    count = total = 0
+    for expense in _archived([partition], filters):
+        count += 1
+        total += to_cents(expense.amount)
+    return count, total
+
+
+# ---------- maintenance ----------
+
+# Online snapshots copy this many pages per backup step, then pause so
+# the writer and the readers get a turn
+SNAPSHOT_PAGES_PER_STEP = 256
+SNAPSHOT_STEP_SLEEP = 0.005
+
+# compact() hands at most this many free pages back per call
+COMPACT_MAX_PAGES = 2000
+
+# ANALYZE samples about this many rows per index, so it stays quick on a
+# big table
+ANALYSIS_LIMIT = 1000
+
+# retire_years() keeps this many most recent years (this one included)
+RETENTION_YEARS = 7
+
+# MaintenanceScheduler defaults, in seconds. The first pass waits a
+# little so it doesn't compete with startup.
+MAINTENANCE_DELAY = 60
+SNAPSHOT_INTERVAL = 24 * 3600
+SNAPSHOT_KEEP = 7
+COMPACT_INTERVAL = 6 * 3600
+OPTIMIZE_INTERVAL = 6 * 3600
+
+RETIRED_SCHEMA = (
+    '''CREATE TABLE IF NOT EXISTS {schema}.expenses (
+        id INTEGER PRIMARY KEY,
+        date TEXT NOT NULL,
+        category TEXT NOT NULL,
+        amount_cents INTEGER NOT NULL,
+        description TEXT,
+        currency TEXT
+    )''',
+    'CREATE INDEX IF NOT EXISTS {schema}.idx_expenses_date_id ON expenses (date, id)',
+)
+
+
+def _file_uri(path):
+    """A read-only file: URI for sqlite3.connect(uri=True) or ATTACH"""
+    path = os.path.abspath(path).replace(os.sep, '/')
+    if not path.startswith('/'):
+        path = '/' + path  # Windows drive letters: file:///C:/...
+    for char, escape in (('%', '%25'), ('?', '%3f'), ('#', '%23')):
+        path = path.replace(char, escape)
+    return f'file://{path}?mode=ro'
+
+
+class MaintenanceScheduler:
+    """
+    Runs database upkeep on a background thread, each job at its own
+    interval in seconds (None turns a job off):
+    
+    - snapshot: an online backup into snapshot_dir, keeping the newest
+      snapshot_keep of them
+    - compact: incremental vacuum, a bounded number of pages at a time
+    - optimize: refresh the query planner's statistics
+    - retain: move years older than keep_years out with retire_years()
+    
+    Each job first runs delay seconds after the scheduler is created.
+    Jobs run one at a time. One that fails is reported through
+    sys.excepthook and tried again at its next interval.
+    
+        maintenance = MaintenanceScheduler(db, snapshot_dir='backups')
+        maintenance.start()
+        ...
+        maintenance.close()
+    """
+    
+    def __init__(self, db, snapshot_dir=None, snapshot_every=SNAPSHOT_INTERVAL,
+                 snapshot_keep=SNAPSHOT_KEEP, compact_every=COMPACT_INTERVAL,
+                 optimize_every=OPTIMIZE_INTERVAL, retain_every=None,
+                 keep_years=RETENTION_YEARS, delay=MAINTENANCE_DELAY,
+                 clock=time.monotonic):
+        self.db = db
+        self.snapshot_dir = snapshot_dir
+        self.snapshot_keep = snapshot_keep
+        self.keep_years = keep_years
+        self.clock = clock
+        jobs = (('snapshot', snapshot_every if snapshot_dir else None, self.snapshot),
+                ('compact', compact_every, self.db.compact),
+                ('optimize', optimize_every, self.db.optimize),
+                ('retain', retain_every, self.retain))
+        first = clock() + delay
+        # name -> [interval, next due, job]; the first pass runs everything
+        self.jobs = {name: [every, first, job] for name, every, job in jobs
+                     if every is not None}
+        self.last_run = {}
+        self.failures = {}
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='expense-maintenance',
+                                            daemon=True)
+            self._thread.start()
+        return self
+    
+    def run_pending(self):
+        """Run every job that is due now; returns their names"""
+        ran = []
+        for name, entry in self.jobs.items():
+            if self._stop.is_set():
+                break
+            every, due, job = entry
+            if self.clock() < due:
+                continue
+            try:
+                job()
+            except Exception:
+                self.failures[name] = self.failures.get(name, 0) + 1
+                sys.excepthook(*sys.exc_info())
+            else:
+                self.last_run[name] = datetime.now()
+            entry[1] = self.clock() + every
+            ran.append(name)
+        return ran
+    
+    def snapshot(self):
+        """Take one snapshot now and drop the ones past snapshot_keep"""
+        import shutil
+        
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        base = os.path.splitext(os.path.basename(self.db.db_name))[0]
+        path = os.path.join(self.snapshot_dir,
+                            f"{base}-{datetime.now():%Y%m%d-%H%M%S}.db")
+        self.db.snapshot(path)
+        # Timestamped names sort oldest first
+        snapshots = sorted(name for name in os.listdir(self.snapshot_dir)
+                           if name.startswith(base + '-') and name.endswith('.db'))
+        for name in snapshots[:max(0, len(snapshots) - self.snapshot_keep)]:
+            old = os.path.join(self.snapshot_dir, name)
+            os.remove(old)
+            shutil.rmtree(old + '.archive', ignore_errors=True)
+        return path
+    
+    def retain(self):
+        return self.db.retire_years(self.keep_years)
+    
+    def close(self):
+        """Stop the thread, letting a job that is running finish"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+    
+    def _run(self):
+        while not self._stop.is_set():
+            self.run_pending()
+            if not self.jobs:
+                return
+            wait = min(due for _, due, _ in self.jobs.values()) - self.clock()
+            self._stop.wait(max(1.0, wait))
+
 
 class ExpenseDatabase:
-    """Complete database manager with all features"""
+    """Complete database manager with all features
+    
+    Keeps one long-lived writer connection plus a small pool of read-only
+    connections instead of connecting and closing on every call.
+    """
+    
+    def __init__(self, db_name='expenses.db', read_pool_size=4,
+                 cache_size=CACHE_SIZE, cache_ttl=CACHE_TTL):
+        self.db_name = db_name
+        self.read_pool_size = max(1, read_pool_size)
+        self.in_memory = db_name == ':memory:' or db_name == ''
+        
+        self._write_lock = threading.RLock()
+        self._writer = None
+        self._tx_depth = 0
+        self._tx_owner = None
+        self._pending_events = []
+        self._listeners = []
+        self._readers = queue.LifoQueue()
+        self._reader_count = 0
+        self._pool_lock = threading.Lock()
+        self._connections = set()
+        self._closed = False
+        self.instrumentation = None
+        
+        # Read results are cached until the data version moves on: local
+        # commits bump _generation, other processes' commits show up in
+        # PRAGMA data_version on a connection of our own
+        self.cache = ResultCache(cache_size, cache_ttl) if cache_size else None
+        self._generation = 0
+        self._version_conn = None
+        self._version_lock = threading.Lock()
+        
+        # Archived months live in files next to the database, listed in
+        # the archived_partitions table; open partitions are kept mapped
+        self.archive_dir = None if self.in_memory else db_name + '.archive'
+        self._partitions = {}  # file name -> ArchivePartition
+        self._partitions_lock = threading.Lock()
+        self._tx_hooks = []
+        self._write_queue = None
+        
+        # Held by snapshot() and retire_years() so a snapshot never sees a
+        # year half moved into its file
+        self._maintenance_lock = threading.Lock()
+        
+        self.create_table()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+    
+    # ---------- connection management ----------
+    
+    def get_connection(self):
+        """Open a new standalone connection (caller must close it)"""
+        return sqlite3.connect(self.db_name)
+    
+    def _configure(self, conn):
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        self._connections.add(conn)
+        self._apply_instrumentation(conn)
+        return conn
+    
+    def _open_writer(self):
+        conn = sqlite3.connect(self.db_name, isolation_level=None,
+                               check_same_thread=False, factory=_Connection,
+                               cached_statements=STATEMENT_CACHE_SIZE)
+        if not self.in_memory:
+            # Only takes effect on a new file; compact() converts old ones
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            conn.execute('PRAGMA journal_mode = WAL')
+        return self._configure(conn)
+    
+    def _open_reader(self):
+        conn = sqlite3.connect(_file_uri(self.db_name), uri=True, isolation_level=None,
+                               check_same_thread=False, factory=_Connection,
+                               cached_statements=STATEMENT_CACHE_SIZE)
+        return self._configure(conn)
+    
+    @property
+    def writer(self):
+        """The shared writer connection, opened on first use"""
+        if self._closed:
+            raise sqlite3.ProgrammingError("ExpenseDatabase is closed")
+        if self._writer is None:
+            with self._write_lock:
+                if self._writer is None:
+                    self._writer = self._open_writer()
+        return self._writer
+    
+    @contextmanager
+    def transaction(self):
+        """Run a block of writes in one transaction on the writer connection.
+        
+        Commits on success and rolls back on error. Nested calls on the same
+        thread join the outer transaction.
+        
+            with db.transaction() as conn:
+                conn.execute(...)
+        """
+        committed = False
+        hooks = []
+        try:
+            with self._write_lock:
+                conn = self.writer
+                if self._tx_depth:
+                    self._tx_depth += 1
+                    try:
+                        yield conn
+                    finally:
+                        self._tx_depth -= 1
+                    return
+                
+                conn.execute('BEGIN IMMEDIATE')
+                self._tx_depth = 1
+                self._tx_owner = threading.get_ident()
+                try:
+                    yield conn
+                except BaseException:
+                    conn.execute('ROLLBACK')
+                    raise
+                else:
+                    try:
+                        conn.execute('COMMIT')
+                    except sqlite3.Error:
+                        conn.execute('ROLLBACK')
+                        raise
+                    committed = True
+                    self._generation += 1
+                    version = self._generation
+                finally:
+                    self._tx_depth = 0
+                    self._tx_owner = None
+                    events, self._pending_events = self._pending_events, []
+                    hooks, self._tx_hooks = self._tx_hooks, []
+        finally:
+            for on_commit, on_rollback in hooks:
+                hook = on_commit if committed else on_rollback
+                if hook:
+                    hook()
+        
+        # Listeners only hear about writes that actually committed
+        if committed:
+            self._notify(events, version)
+    
+    def _after_transaction(self, on_commit=None, on_rollback=None):
+        # Run a callback once the current transaction commits or rolls
+        # back; for side effects outside the database such as files
+        self._tx_hooks.append((on_commit, on_rollback))
+    
+    def _in_own_transaction(self):
+        return self._tx_owner == threading.get_ident()
+    
+    @contextmanager
+    def read_connection(self):
+        """Borrow a read-only connection from the pool.
+        
+        Inside a transaction() on the same thread the writer is used instead,
+        so reads see the uncommitted rows.
+        """
+        if self.in_memory or self._in_own_transaction():
+            # An in-memory database only exists on the writer connection
+            with self._write_lock:
+                yield self.writer
+            return
+        
+        if self._closed:
+            raise sqlite3.ProgrammingError("ExpenseDatabase is closed")
+        self.writer  # make sure the file and WAL mode exist first
+        
+        conn = self._acquire_reader()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            self._readers.put(conn)
+    
+    @contextmanager
+    def read_snapshot(self):
+        """Borrow a read connection inside one read transaction, with the
+        data version it sees: (conn, version).
+        
+        Every change sent to listeners with a higher version is missing
+        from the snapshot and every other one is in it, so state built
+        from one full read can be kept current from change events without
+        counting a write twice or missing one.
+        """
+        with self.read_connection() as conn:
+            if conn is self._writer:
+                yield conn, self._generation
+                return
+            # No commit can land between starting the read and noting the
+            # version while the writer lock is held
+            with self._write_lock:
+                conn.execute('BEGIN')
+                conn.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+                version = self._generation
+            yield conn, version
+    
+    def _acquire_reader(self):
+        try:
+            return self._readers.get_nowait()
+        except queue.Empty:
+            pass
+        with self._pool_lock:
+            if self._reader_count < self.read_pool_size:
+                self._reader_count += 1
+                try:
+                    return self._open_reader()
+                except Exception:
+                    self._reader_count -= 1
+                    raise
+        return self._readers.get()
+    
+    # ---------- change notification ----------
+    
+    def add_listener(self, callback):
+        """Call callback(ExpenseChange) after every committed write"""
+        self._listeners.append(callback)
+    
+    def remove_listener(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+    
+    def _emit(self, action, row=None, old_row=None):
+        # Queued until the surrounding transaction commits
+        if self._listeners:
+            self._pending_events.append(ExpenseChange(action, row, old_row))
+    
+    def _notify(self, events, version):
+        for event in events:
+            event = event._replace(version=version)
+            for callback in list(self._listeners):
+                try:
+                    callback(event)
+                except Exception:
+                    # The write already committed; a broken listener
+                    # must not make it look like it failed
+                    sys.excepthook(*sys.exc_info())
+    
+    def close(self):
+        """Close the writer and every pooled reader connection"""
+        if self._write_queue is not None:
+            self._write_queue.close()  # queued writes still get committed
+        self._closed = True
+        while True:
+            try:
+                self._readers.get_nowait().close()
+            except queue.Empty:
+                break
+        self._reader_count = 0
+        with self._write_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        with self._version_lock:
+            if self._version_conn is not None:
+                self._version_conn.close()
+                self._version_conn = None
+        self._connections.clear()
+        with self._partitions_lock:
+            self._partitions.clear()  # unmapped once no reader holds them
+    
+    # ---------- result cache ----------
+    
+    def data_version(self):
+        """A value that changes whenever committed data may have changed"""
+        if self.in_memory:
+            return self._generation  # nobody else can write to it
+        with self._version_lock:
+            if self._version_conn is None:
+                self.writer  # the file must exist first
+                self._version_conn = self._open_reader()
+            return (self._generation,
+                    self._version_conn.execute('PRAGMA data_version').fetchone()[0])
+    
+    def cache_stats(self):
+        """Return ResultCache hit/miss counters, or None if caching is off"""
+        return self.cache.stats() if self.cache else None
+    
+    def clear_cache(self):
+        if self.cache:
+            self.cache.clear()
+    
+    # ---------- instrumentation ----------
+    
+    # Public methods that are plumbing rather than database work
+    UNTRACED_METHODS = frozenset({
+        'add_listener', 'remove_listener', 'close', 'get_connection',
+        'read_connection', 'transaction', 'enable_instrumentation',
+        'disable_instrumentation', 'instrumentation_snapshot',
+        'data_version', 'cache_stats', 'clear_cache', 'archived_partitions',
+        'write_queue', 'retired_connection', 'read_snapshot',
+    })
+    
+    def enable_instrumentation(self, slow_ms=SLOW_QUERY_MS, instrumentation=None):
+        """Start recording per-method and per-statement timings.
+        
+        Returns the Instrumentation collecting them. While disabled nothing
+        is wrapped at all, so instrumentation that is off costs nothing.
+        """
+        if instrumentation is None:
+            instrumentation = Instrumentation(slow_ms)
+        self.instrumentation = instrumentation
+        for name in dir(type(self)):
+            method = getattr(type(self), name)
+            if name.startswith('_') or name in self.UNTRACED_METHODS or not callable(method):
+                continue
+            setattr(self, name, self._traced(name, getattr(self, name)))
+        for conn in list(self._connections):
+            self._apply_instrumentation(conn)
+        return instrumentation
+    
+    def disable_instrumentation(self):
+        """Stop recording and remove every wrapper; returns the old Instrumentation"""
+        instrumentation, self.instrumentation = self.instrumentation, None
+        for name in list(vars(self)):
+            if getattr(vars(self)[name], 'traced_method', False):
+                delattr(self, name)
+        for conn in list(self._connections):
+            self._apply_instrumentation(conn)
+        return instrumentation
+    
+    def instrumentation_snapshot(self):
+        """Return Instrumentation.snapshot(), or None while disabled"""
+        instrumentation = self.instrumentation
+        return instrumentation.snapshot() if instrumentation else None
+    
+    def _apply_instrumentation(self, conn):
+        # Swapping the class is safe on a live connection: both classes
+        # share sqlite3.Connection's layout
+        conn.__class__ = _TracedConnection if self.instrumentation else _Connection
+        conn.instrumentation = self.instrumentation
+    
+    def _traced(self, name, method):
+        import inspect
+        
+        if inspect.isgeneratorfunction(method):
+            def traced(*args, **kwargs):
+                instrumentation = self.instrumentation
+                if instrumentation is None:
+                    return method(*args, **kwargs)
+                return _traced_generator(instrumentation, name, method(*args, **kwargs))
+        else:
+            def traced(*args, **kwargs):
+                instrumentation = self.instrumentation
+                if instrumentation is None:
+                    return method(*args, **kwargs)
+                started = time.perf_counter()
+                try:
+                    result = method(*args, **kwargs)
+                except BaseException:
+                    instrumentation.record_method(
+                        name, (time.perf_counter() - started) * 1000, 0, failed=True)
+                    raise
+                instrumentation.record_method(
+                    name, (time.perf_counter() - started) * 1000, _rows_in(result))
+                return result
+        traced.__name__ = traced.__qualname__ = name
+        traced.__doc__ = method.__doc__
+        traced.traced_method = True
+        return traced
+    
+    # ---------- schema ----------
+    
+    def create_table(self):
+        """Create the schema or bring an older database up to date"""
+        self.migrate()
+    
+    @property
+    def schema_version(self):
+        return self.writer.execute('PRAGMA user_version').fetchone()[0]
+    
+    def migrate(self, target=None):
+        """Apply pending MIGRATIONS up to target (default: all of them)"""
+        target = len(MIGRATIONS) if target is None else target
+        current = self.schema_version
+        for version in range(current + 1, target + 1):
+            step = MIGRATIONS[version - 1]
+            if getattr(step, 'streaming', False):
+                step(self, version)
+                continue
+            # Each step commits together with its version bump
+            with self.transaction() as conn:
+                if callable(step):
+                    step(conn)
+                else:
+                    for sql in step:
+                        conn.execute(sql)
+                conn.execute(f'PRAGMA user_version = {version:d}')
+        return self.schema_version
+    
+    def query_plan(self, sql, params=()):
+        """Return the EXPLAIN QUERY PLAN detail lines for a statement"""
+        with self.read_connection() as conn:
+            return [row[3] for row in
+                    conn.execute('EXPLAIN QUERY PLAN ' + sql, params)]
+    
+    # ---------- writes ----------
+    
+    def add_expense(self, date, category, amount, description='', currency=None):
+        cents = to_cents(amount)
+        with self.transaction() as conn:
+            cursor = conn.execute('''
+                INSERT INTO expenses (date, category, amount_cents, description, currency)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (date, category, cents, description, currency))
+            expense_id = cursor.lastrowid
+            self._emit('insert', Expense(expense_id, date, category,
+                                         from_cents(cents), description, currency))
+            return expense_id
+    
+    def add_expenses_many(self, expenses, batch_size=BULK_BATCH_SIZE):
+        """Insert many (date, category, amount[, description[, currency]]) rows.
+        
+        The iterable is consumed lazily and written in chunks, one
+        transaction per chunk. Returns the number of rows inserted.
+        """
+        rows = ((row[0], row[1], to_cents(row[2]),
+                 row[3] if len(row) > 3 else '',
+                 row[4] if len(row) > 4 else None) for row in expenses)
+        inserted = 0
+        while True:
+            chunk = list(islice(rows, batch_size))
+            if not chunk:
+                return inserted
+            with self.transaction() as conn:
+                if len(chunk) >= BULK_TRIGGER_THRESHOLD:
+                    self._insert_chunk_set_based(conn, chunk)
+                else:
+                    conn.executemany(INSERT_EXPENSE_SQL, chunk)
+                self._emit('bulk')
+            inserted += len(chunk)
+    
+    def _insert_chunk_set_based(self, conn, chunk):
+        # Row-by-row insert triggers dominate bulk loads, so drop them for
+        # this transaction and apply their work to the new rows in one pass
+        # each. DDL is transactional, so no other connection ever sees the
+        # table without its triggers.
+        suspended = []
+        for name, catch_up in BULK_INSERT_TRIGGERS:
+            row = conn.execute('SELECT sql FROM sqlite_master WHERE type = ? AND name = ?',
+                               ('trigger', name)).fetchone()
+            if row:
+                suspended.append((row[0], catch_up))
+                conn.execute(f'DROP TRIGGER {name}')
+        
+        seq = conn.execute('''
+            SELECT seq FROM sqlite_sequence WHERE name = 'expenses'
+        ''').fetchone()
+        after_id = seq[0] if seq else 0
+        conn.executemany(INSERT_EXPENSE_SQL, chunk)
+        
+        for sql, catch_up in suspended:
+            catch_up(conn, after_id)
+            conn.execute(sql)
     
-    def __init__(self, db_name='expenses.db'):
-        self.db_name = db_name
-        self.create_table()
+    def update_expense(self, expense_id, date, category, amount, description,
+                       currency=None):
+        """Rewrite one expense in place, keeping its id; False if it is gone"""
+        return self.update_many([(expense_id, date, category, amount, description,
+                                  currency)]) == 1
     
-    def get_connection(self):
-        return sqlite3.connect(self.db_name)
+    def update_many(self, updates):
+        """Apply many (id, date, category, amount, description[, currency])
+        rewrites in one transaction; all of them happen or none do.
+        
+        Ids that no longer exist are skipped. Returns the number of rows
+        updated.
+        """
+        rows = [(expense_id, date, category, to_cents(amount), description,
+                 rest[0] if rest else None)
+                for expense_id, date, category, amount, description, *rest in updates]
+        per_row = len(rows) <= BULK_EVENT_ROWS
+        updated = 0
+        with self.transaction() as conn:
+            for expense_id, date, category, cents, description, currency in rows:
+                self._make_live(conn, expense_id)
+                old_row = self._row_for_event(conn, expense_id) if per_row else None
+                cursor = conn.execute(UPDATE_EXPENSE_SQL, (date, category, cents,
+                                                           description, currency,
+                                                           expense_id))
+                if cursor.rowcount:
+                    updated += 1
+                    if per_row:
+                        self._emit('update',
+                                   Expense(expense_id, date, category, from_cents(cents),
+                                           description, currency),
+                                   old_row)
+            if updated and not per_row:
+                self._emit('bulk')
+        return updated
     
-    def create_table(self):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS expenses (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                date TEXT NOT NULL,
-                category TEXT NOT NULL,
-                amount REAL NOT NULL,
-                description TEXT
-            )
-        ''')
-        conn.commit()
-        conn.close()
+    def recategorize(self, expense_ids, category):
+        """Move many expenses to another category in one transaction.
+        
+        Returns the number of rows changed.
+        """
+        expense_ids = list(expense_ids)
+        per_row = len(expense_ids) <= BULK_EVENT_ROWS
+        updated = 0
+        with self.transaction() as conn:
+            for expense_id in expense_ids:
+                self._make_live(conn, expense_id)
+                old_row = self._row_for_event(conn, expense_id) if per_row else None
+                cursor = conn.execute('UPDATE expenses SET category = ? WHERE id = ?',
+                                      (category, expense_id))
+                if cursor.rowcount:
+                    updated += 1
+                    if per_row and old_row is not None:
+                        self._emit('update', old_row._replace(category=category), old_row)
+            if updated and not per_row:
+                self._emit('bulk')
+        return updated
     
-    def add_expense(self, date, category, amount, description=''):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO expenses (date, category, amount, description)
-            VALUES (?, ?, ?, ?)
-        ''', (date, category, amount, description))
-        expense_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
-        return expense_id
+    def delete_expense(self, expense_id):
+        """Delete one expense; False if it was already gone"""
+        return self.delete_many([expense_id]) == 1
     
-    def get_all_expenses(self):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM expenses ORDER BY date DESC, id DESC')
-        expenses = cursor.fetchall()
-        conn.close()
-        return expenses
+    def delete_many(self, expense_ids):
+        """Delete many expenses in one transaction; returns how many went"""
+        expense_ids = list(expense_ids)
+        per_row = len(expense_ids) <= BULK_EVENT_ROWS
+        deleted = 0
+        with self.transaction() as conn:
+            for expense_id in expense_ids:
+                self._make_live(conn, expense_id)
+                old_row = self._row_for_event(conn, expense_id) if per_row else None
+                cursor = conn.execute('DELETE FROM expenses WHERE id = ?', (expense_id,))
+                if cursor.rowcount:
+                    deleted += 1
+                    if per_row:
+                        self._emit('delete', old_row, old_row)
+            if deleted and not per_row:
+                self._emit('bulk')
+        return deleted
     
-    def get_expense_by_id(self, expense_id):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM expenses WHERE id = ?', (expense_id,))
-        expense = cursor.fetchone()
-        conn.close()
-        return expense
+    def write_queue(self):
+        """The shared WriteQueue, for many threads writing at once.
+        
+            future = db.write_queue().add_expense('2026-03-01', 'Food', '12.50')
+            expense_id = future.result()
+        
+        Its writes are group-committed; close() commits whatever is
+        still queued before closing the connections.
+        """
+        if self._write_queue is None:
+            with self._pool_lock:
+                if self._write_queue is None:
+                    self._write_queue = WriteQueue(self)
+        return self._write_queue
     
-    def update_expense(self, expense_id, date, category, amount, description):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            UPDATE expenses 
-            SET date = ?, category = ?, amount = ?, description = ?
-            WHERE id = ?
-        ''', (date, category, amount, description, expense_id))
-        conn.commit()
-        conn.close()
+    def _row_for_event(self, conn, expense_id):
+        # Only worth the extra read when someone is listening
+        if not self._listeners:
+            return None
+        return self._select(conn, f'SELECT {EXPENSE_COLUMNS} FROM expenses WHERE id = ?',
+                            (expense_id,)).fetchone()
     
-    def delete_expense(self, expense_id):
-        conn = self.get_connection()
+    # ---------- archive ----------
+    
+    def _archive(self, conn):
+        """The archived partitions listed on conn, oldest month first"""
+        files = conn.execute('SELECT file FROM archived_partitions ORDER BY month').fetchall()
+        if not files and not self._partitions:
+            return []
+        with self._partitions_lock:
+            partitions = [self._partitions.get(file) for file, in files]
+            if None in partitions or len(self._partitions) != len(files):
+                from ExpenseArchive import read_partition
+                # Another process (or connection) archived or restored a
+                # month; dropped partitions unmap when their last reader ends
+                opened = {}
+                for file, in files:
+                    opened[file] = (self._partitions.get(file)
+                                    or read_partition(os.path.join(self.archive_dir, file)))
+                self._partitions = opened
+                partitions = list(opened.values())
+        return partitions
+    
+    def archived_partitions(self, conn=None):
+        """Return the open ArchivePartitions, oldest month first.
+        
+        Pass the connection of an ongoing read to see the archive as of
+        that read's snapshot.
+        """
+        if conn is not None:
+            return self._archive(conn)
+        with self.read_connection() as conn:
+            return self._archive(conn)
+    
+    def archive_closed_months(self, keep_months=ARCHIVE_KEEP_MONTHS, today=None):
+        """Archive every month older than the keep_months most recent ones.
+        
+        Returns the list of 'YYYY-MM' months that were archived.
+        """
+        today = today or datetime.now().date()
+        year, month = divmod(today.year * 12 + today.month - 1 - (keep_months - 1), 12)
+        cutoff = f'{year:04d}-{month + 1:02d}-01'
+        with self.read_connection() as conn:
+            months = [row[0] for row in conn.execute(f'''
+                SELECT DISTINCT substr(date, 1, 7) FROM expenses
+                WHERE date < ? AND {_ARCHIVABLE_DATE}
+                ORDER BY 1
+            ''', (cutoff,))]
+        for month in months:
+            self.archive_month(month)
+        return months
+    
+    def archive_month(self, month):
+        """Move one month's rows out of the live table into its partition.
+        
+        If the month was archived before (and rows for it were added since)
+        the partition is rewritten with both. The file is written before
+        the transaction that deletes the rows and records it commits, and
+        thrown away if that transaction rolls back, so no row is ever in
+        both places or in neither. Returns the partition's row count.
+        """
+        from ExpenseArchive import partition_filename, write_partition
+        
+        if self.archive_dir is None:
+            raise ValueError("an in-memory database has nowhere to archive to")
+        start, end = month_bounds(*month.split('-'))
+        os.makedirs(self.archive_dir, exist_ok=True)
+        with self.transaction() as conn:
+            rows = conn.execute(f'''
+                SELECT {EXPENSE_COLUMNS} FROM expenses
+                WHERE date >= ? AND date < ? AND {_ARCHIVABLE_DATE}
+            ''', (start, end)).fetchall()
+            if not rows:
+                return 0
+            old_file = None
+            generation = 1
+            for partition in self._archive(conn):
+                if partition.month == month:
+                    old_file = os.path.basename(partition.path)
+                    generation = int(old_file.split('.')[1]) + 1
+                    rows.extend(partition.select())
+            
+            file = partition_filename(month, generation)
+            path = os.path.join(self.archive_dir, file)
+            self._after_transaction(
+                on_commit=old_file and (lambda: self._remove_archive_file(old_file)),
+                on_rollback=lambda: self._remove_archive_file(file))
+            footer = write_partition(path, month, rows)
+            conn.execute(f'''
+                DELETE FROM expenses WHERE date >= ? AND date < ? AND {_ARCHIVABLE_DATE}
+            ''', (start, end))
+            conn.execute('''
+                INSERT OR REPLACE INTO archived_partitions (month, file, rows, total)
+                VALUES (?, ?, ?, ?)
+            ''', (month, file, footer['rows'], footer['total_cents']))
+            self._emit('bulk')
+            return footer['rows']
+    
+    def restore_month(self, month):
+        """Move an archived month back into the live table; returns its row count"""
+        with self.transaction() as conn:
+            for partition in self._archive(conn):
+                if partition.month == month:
+                    break
+            else:
+                return 0
+            conn.executemany('''
+                INSERT INTO expenses (id, date, category, amount_cents, description, currency)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', partition.select())
+            conn.execute('DELETE FROM archived_partitions WHERE month = ?', (month,))
+            file = os.path.basename(partition.path)
+            self._after_transaction(on_commit=lambda: self._remove_archive_file(file))
+            self._emit('bulk')
+            return partition.rows
+    
+    def _remove_archive_file(self, file):
+        with self._partitions_lock:
+            self._partitions.pop(file, None)
+        try:
+            os.remove(os.path.join(self.archive_dir, file))
+        except OSError:
+            pass  # still mapped elsewhere (Windows); harmless, it is unlisted
+    
+    def _make_live(self, conn, expense_id):
+        # Archived rows are read-only: restore their month before a write
+        if conn.execute('SELECT 1 FROM expenses WHERE id = ?', (expense_id,)).fetchone():
+            return
+        for partition in self._archive(conn):
+            if partition.find_id(expense_id) is not None:
+                self.restore_month(partition.month)
+                return
+    
+    # ---------- maintenance ----------
+    
+    def snapshot(self, path, pages_per_step=SNAPSHOT_PAGES_PER_STEP,
+                 sleep=SNAPSHOT_STEP_SLEEP):
+        """Copy the database to path while it stays in use; returns path.
+        
+        The sqlite3 backup API copies pages_per_step pages at a time and
+        sleeps in between, reading from a pooled connection that holds one
+        read transaction throughout. The copy is therefore the database as
+        of the moment it started: writers carry on under WAL and never
+        force the backup to start over. Archived months and retired years
+        go to path + '.archive', so the snapshot opens like the original.
+        Every file is written under a temporary name and renamed when done.
+        """
+        import shutil
+        
+        archive_dir = path + '.archive'
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._maintenance_lock, self.read_connection() as conn:
+            if conn is not self._writer:
+                conn.execute('BEGIN')
+                conn.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+            partitions = self._archive(conn)
+            years = [file for file, in conn.execute('SELECT file FROM retired_years')]
+            self._backup(conn, path, pages_per_step, sleep)
+            
+            if partitions or years:
+                os.makedirs(archive_dir, exist_ok=True)
+            for partition in partitions:
+                file = os.path.basename(partition.path)
+                target = os.path.join(archive_dir, file)
+                try:
+                    shutil.copyfile(partition.path, target + '.part')
+                except FileNotFoundError:
+                    # Rewritten since the snapshot began; the mapping still
+                    # holds the rows as they were
+                    from ExpenseArchive import write_partition
+                    write_partition(target + '.part', partition.month, partition.select())
+                os.replace(target + '.part', target)
+            # Year files only change under _maintenance_lock
+            for file in years:
+                source = sqlite3.connect(_file_uri(os.path.join(self.archive_dir, file)),
+                                         uri=True)
+                try:
+                    self._backup(source, os.path.join(archive_dir, file),
+                                 pages_per_step, sleep)
+                finally:
+                    source.close()
+        return path
+    
+    @staticmethod
+    def _backup(source, path, pages_per_step, sleep):
+        part = path + '.part'
+        if os.path.exists(part):
+            os.remove(part)
+        target = sqlite3.connect(part)
+        try:
+            # sqlite3 only sleeps between steps when the source is busy, so
+            # throttle from the progress callback
+            source.backup(target, pages=pages_per_step,
+                          progress=lambda status, remaining, total: time.sleep(sleep))
+        finally:
+            target.close()
+        os.replace(part, path)
+    
+    def compact(self, max_pages=COMPACT_MAX_PAGES):
+        """Hand free pages back to the file system; returns how many.
+        
+        Uses incremental vacuum, at most max_pages per call, so the writer
+        is only held briefly. A database created before auto_vacuum was
+        turned on is converted by one full VACUUM the first time.
+        """
+        with self._write_lock:
+            if self._tx_depth:
+                raise sqlite3.ProgrammingError("compact() cannot run inside a transaction")
+            conn = self.writer
+            free = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+                conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+                conn.execute('VACUUM')
+            else:
+                # execute() steps the pragma once, which frees a single page;
+                # executescript() runs it to completion
+                conn.executescript(f'PRAGMA incremental_vacuum({int(max_pages):d})')
+            if not self.in_memory:
+                conn.execute('PRAGMA wal_checkpoint(PASSIVE)').fetchall()
+            return free - conn.execute('PRAGMA freelist_count').fetchone()[0]
+    
+    def optimize(self, full=False):
+        """Refresh the statistics the query planner picks indexes by.
+        
+        PRAGMA optimize only re-analyzes tables whose statistics look
+        stale; full=True (or a database never analyzed) runs ANALYZE on
+        everything. Both sample at most ANALYSIS_LIMIT rows per index.
+        """
+        with self._write_lock:
+            conn = self.writer
+            analyzed = conn.execute('''
+                SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'
+            ''').fetchone()
+            conn.execute(f'PRAGMA analysis_limit = {ANALYSIS_LIMIT:d}')
+            conn.execute('ANALYZE' if full or not analyzed else 'PRAGMA optimize').fetchall()
+    
+    def retire_years(self, keep_years=RETENTION_YEARS, today=None):
+        """Retire every year older than the keep_years most recent ones.
+        
+        Returns the list of 'YYYY' years that were retired.
+        """
+        today = today or datetime.now().date()
+        cutoff = f'{today.year - keep_years + 1:04d}'
+        with self.read_connection() as conn:
+            years = {row[0] for row in conn.execute(f'''
+                SELECT DISTINCT substr(date, 1, 4) FROM expenses
+                WHERE date < ? AND {_ARCHIVABLE_DATE}
+            ''', (cutoff,))}
+            years.update(partition.month[:4] for partition in self._archive(conn)
+                         if partition.month < cutoff)
+        for year in sorted(years):
+            self.retire_year(year)
+        return sorted(years)
+    
+    def retire_year(self, year):
+        """Move one year's rows, live and archived, into a database file
+        of its own in archive_dir.
+        
+        Retired years drop out of the regular reads and totals, which only
+        cover the live table and the archived months; iter_retired() and
+        retired_connection() still reach them. The rows are committed to
+        the year file first and only then deleted here, so a crash in
+        between leaves them in both places, never in neither, and running
+        it again finishes the move. Returns the year file's row count.
+        """
+        if self.archive_dir is None:
+            raise ValueError("an in-memory database has nowhere to retire to")
+        year = f'{int(year):04d}'
+        start, end = f'{year}-01-01', f'{int(year) + 1:04d}-01-01'
+        file = f'{year}.db'
+        os.makedirs(self.archive_dir, exist_ok=True)
+        with self._maintenance_lock, self._write_lock:
+            if self._tx_depth:
+                raise sqlite3.ProgrammingError("retire_year() cannot run inside a transaction")
+            conn = self.writer
+            partitions = [partition for partition in self._archive(conn)
+                          if partition.month[:4] == year]
+            conn.execute('ATTACH DATABASE ? AS retired',
+                         (os.path.join(self.archive_dir, file),))
+            try:
+                with self.transaction():
+                    for sql in RETIRED_SCHEMA:
+                        conn.execute(sql.format(schema='retired'))
+                    conn.execute(f'''
+                        INSERT OR REPLACE INTO retired.expenses ({EXPENSE_COLUMNS})
+                        SELECT {EXPENSE_COLUMNS} FROM main.expenses
+                        WHERE date >= ? AND date < ? AND {_ARCHIVABLE_DATE}
+                    ''', (start, end))
+                    for partition in partitions:
+                        conn.executemany(f'''
+                            INSERT OR REPLACE INTO retired.expenses ({EXPENSE_COLUMNS})
+                            VALUES (?, ?, ?, ?, ?, ?)
+                        ''', partition.select())
+                    rows, total = conn.execute('''
+                        SELECT COUNT(*), COALESCE(SUM(amount_cents), 0) FROM retired.expenses
+                    ''').fetchone()
+                
+                with self.transaction():
+                    conn.execute(f'''
+                        DELETE FROM main.expenses
+                        WHERE date >= ? AND date < ? AND {_ARCHIVABLE_DATE}
+                    ''', (start, end))
+                    for partition in partitions:
+                        conn.execute('DELETE FROM archived_partitions WHERE month = ?',
+                                     (partition.month,))
+                        old_file = os.path.basename(partition.path)
+                        self._after_transaction(
+                            on_commit=lambda old_file=old_file: self._remove_archive_file(old_file))
+                    conn.execute('''
+                        INSERT OR REPLACE INTO retired_years (year, file, rows, total)
+                        VALUES (?, ?, ?, ?)
+                    ''', (year, file, rows, total))
+                    self._emit('bulk')
+            finally:
+                conn.execute('DETACH DATABASE retired')
+        return rows
+    
+    def restore_year(self, year):
+        """Move a retired year back into the live table; returns its row count"""
+        year = f'{int(year):04d}'
+        with self._maintenance_lock, self._write_lock:
+            if self._tx_depth:
+                raise sqlite3.ProgrammingError("restore_year() cannot run inside a transaction")
+            conn = self.writer
+            row = conn.execute('SELECT file FROM retired_years WHERE year = ?',
+                               (year,)).fetchone()
+            if row is None:
+                return 0
+            path = os.path.join(self.archive_dir, row[0])
+            conn.execute('ATTACH DATABASE ? AS retired', (path,))
+            try:
+                with self.transaction():
+                    # Rows left in both places by an interrupted retire_year
+                    # are already live
+                    rows = conn.execute(f'''
+                        INSERT INTO main.expenses ({EXPENSE_COLUMNS})
+                        SELECT {EXPENSE_COLUMNS} FROM retired.expenses
+                        WHERE id NOT IN (SELECT id FROM main.expenses)
+                    ''').rowcount
+                    conn.execute('DELETE FROM retired_years WHERE year = ?', (year,))
+                    self._emit('bulk')
+            finally:
+                conn.execute('DETACH DATABASE retired')
+            os.remove(path)
+        return rows
+    
+    def retired_years(self):
+        """(year, rows, total) for every retired year, oldest first"""
+        with self.read_connection() as conn:
+            return [(year, rows, from_cents(total)) for year, rows, total in conn.execute('''
+                SELECT year, rows, total FROM retired_years ORDER BY year
+            ''')]
+    
+    @contextmanager
+    def retired_connection(self, years=None):
+        """A read-only connection with retired years attached, for ad hoc
+        queries over them.
+        
+        Each year is attached as schema yYYYY (y2019.expenses, amounts in
+        cents like the live table) and the temporary view retired_expenses
+        unions them all; main is the live database as usual.
+        
+            with db.retired_connection() as conn:
+                conn.execute('SELECT category, SUM(amount_cents) '
+                             'FROM retired_expenses GROUP BY category')
+        
+        SQLite attaches at most 10 databases unless built otherwise; pass
+        years to pick fewer when more than that are retired.
+        """
+        if self.archive_dir is None:
+            raise ValueError("an in-memory database has no retired years")
+        self.writer  # make sure the file and the schema exist first
+        conn = sqlite3.connect(_file_uri(self.db_name), uri=True, isolation_level=None,
+                               factory=_Connection)
+        try:
+            for pragma in CONNECTION_PRAGMAS:
+                conn.execute(pragma)
+            retired = dict(conn.execute('SELECT year, file FROM retired_years'))
+            years = sorted(retired) if years is None else [f'{int(year):04d}' for year in years]
+            for year in years:
+                if year not in retired:
+                    raise ValueError(f"{year} is not retired")
+            limit = (conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+                     if hasattr(conn, 'getlimit') else 10)  # Python < 3.11
+            if len(years) > limit:
+                raise ValueError(f"at most {limit} years can be attached at once, "
+                                 f"not {len(years)}")
+            for year in years:
+                conn.execute(f'ATTACH DATABASE ? AS y{year}',
+                             (_file_uri(os.path.join(self.archive_dir, retired[year])),))
+            selects = [f'SELECT {EXPENSE_COLUMNS} FROM y{year}.expenses' for year in years]
+            conn.execute('CREATE TEMP VIEW retired_expenses AS ' + (
+                ' UNION ALL '.join(selects)
+                or f'SELECT {EXPENSE_COLUMNS} FROM main.expenses WHERE 0'))
+            yield conn
+        finally:
+            conn.close()
+    
+    def iter_retired(self, filters=None, newest_first=True, batch_size=1000):
+        """Stream the retired Expense records matching filters in list
+        order, like iter_expenses. Years are attached one at a time, so
+        there is no limit on how many can be retired.
+        """
+        filters = filters or ExpenseFilter()
+        where, params = filters.compile()
+        order = 'date DESC, id DESC' if newest_first else 'date, id'
+        years = [year for year, _, _ in self.retired_years()]
+        for year in (reversed(years) if newest_first else years):
+            if (filters.start_date is not None and year < filters.start_date[:4]
+                    or filters.end_date is not None and year > filters.end_date[:4]):
+                continue
+            with self.retired_connection([year]) as conn:
+                cursor = self._select(conn, f'''
+                    SELECT {EXPENSE_COLUMNS} FROM y{year}.expenses {where} ORDER BY {order}
+                ''', params)
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    yield from rows
+    
+    # ---------- budgets ----------
+    
+    def add_budget(self, category, period, limit, days=None, warn_at=BUDGET_WARN_AT):
+        """Add a spending limit; category None covers every category.
+        
+        Returns the new budget's id.
+        """
+        if period not in BUDGET_PERIODS:
+            raise ValueError(f"period must be one of {', '.join(BUDGET_PERIODS)}")
+        if period == 'custom':
+            if days is None or int(days) < 1:
+                raise ValueError("a custom budget needs a window of at least 1 day")
+            if int(days) > MAX_BUDGET_DAYS:
+                raise ValueError(f"a custom budget's window is at most {MAX_BUDGET_DAYS} days")
+            days = int(days)
+        else:
+            days = None
+        cents = to_cents(limit)
+        if cents <= 0:
+            raise ValueError("a budget limit must be positive")
+        if not 0 < warn_at <= 1:
+            raise ValueError("warn_at must be a fraction of the limit, above 0 and at most 1")
+        with self.transaction() as conn:
+            return conn.execute('''
+                INSERT INTO budgets (category, period, days, limit_cents, warn_at)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (category, period, days, cents, warn_at)).lastrowid
+    
+    def delete_budget(self, budget_id):
+        """Remove a budget; False if it was already gone"""
+        with self.transaction() as conn:
+            return conn.execute('DELETE FROM budgets WHERE id = ?',
+                                (budget_id,)).rowcount > 0
+    
+    def get_budgets(self, conn=None):
+        """Every Budget, in the order they were added"""
+        if conn is None:
+            with self.read_connection() as conn:
+                return self.get_budgets(conn)
+        return [Budget(budget_id, category, period, days, from_cents(cents), warn_at)
+                for budget_id, category, period, days, cents, warn_at in conn.execute('''
+                    SELECT id, category, period, days, limit_cents, warn_at
+                    FROM budgets ORDER BY id
+                ''')]
+    
+    # ---------- reads ----------
+    #
+    # Every read unions the live table with the archived partitions (see
+    # archive_month). Archived rows come back in the same (date, id) list
+    # order, so the two streams are merged rather than re-sorted, and the
+    # totals add the partitions' footer statistics to the summary tables.
+    
+    @staticmethod
+    def _select(conn, sql, params=()):
+        # Expense rows come back as tuples with a Decimal amount
         cursor = conn.cursor()
-        cursor.execute('DELETE FROM expenses WHERE id = ?', (expense_id,))
-        conn.commit()
-        conn.close()
+        cursor.row_factory = expense_row
+        return cursor.execute(sql, params)
+    
+    def get_all_expenses(self):
+        with self.read_connection() as conn:
+            rows = self._select(conn, f'''
+                SELECT {EXPENSE_COLUMNS} FROM expenses ORDER BY date DESC, id DESC
+            ''').fetchall()
+            partitions = self._archive(conn)
+        if not partitions:
+            return rows
+        return list(_merge_in_list_order(rows, _archived(partitions)))
+    
+    @cached
+    def get_expenses_page(self, after=None, before=None, limit=PAGE_SIZE):
+        """Get one page of expenses in list order (newest first).
+        
+        Uses keyset pagination on (date, id) rather than OFFSET, so every
+        page costs the same however deep into the list it is:
+        - after: (date, id) of the last row shown -> the rows below it
+        - before: (date, id) of the first row shown -> the rows above it
+        """
+        with self.read_connection() as conn:
+            partitions = self._archive(conn)
+            if before is not None:
+                rows = self._select(conn, f'''
+                    SELECT {EXPENSE_COLUMNS} FROM expenses
+                    WHERE (date, id) > (?, ?)
+                    ORDER BY date, id
+                    LIMIT ?
+                ''', (*before, limit)).fetchall()
+                if partitions:
+                    # The limit rows just above before, from either side
+                    archived = _archived(partitions, newest_first=False, above=before)
+                    rows = list(islice(_merge_in_list_order(rows, archived, newest_first=False),
+                                       limit))
+                rows.reverse()
+                return rows
+            if after is not None:
+                rows = self._select(conn, f'''
+                    SELECT {EXPENSE_COLUMNS} FROM expenses
+                    WHERE (date, id) < (?, ?)
+                    ORDER BY date DESC, id DESC
+                    LIMIT ?
+                ''', (*after, limit)).fetchall()
+            else:
+                rows = self._select(conn, f'''
+                    SELECT {EXPENSE_COLUMNS} FROM expenses
+                    ORDER BY date DESC, id DESC
+                    LIMIT ?
+                ''', (limit,)).fetchall()
+        if partitions:
+            rows = list(islice(_merge_in_list_order(
+                rows, _archived(partitions, below=after)), limit))
+        return rows
     
+    @cached
+    def get_expense_by_id(self, expense_id):
+        with self.read_connection() as conn:
+            expense = self._select(conn, f'SELECT {EXPENSE_COLUMNS} FROM expenses WHERE id = ?',
+                                   (expense_id,)).fetchone()
+            if expense is None:
+                for partition in self._archive(conn):
+                    index = partition.find_id(expense_id)
+                    if index is not None:
+                        return _archived_expense(partition.row(index))
+            return expense
+    
+    @cached
     def get_expenses_by_category(self, category):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT * FROM expenses 
-            WHERE category = ? 
-            ORDER BY date DESC
-        ''', (category,))
-        expenses = cursor.fetchall()
-        conn.close()
-        return expenses
+        with self.read_connection() as conn:
+            rows = self._select(conn, f'''
+                SELECT {EXPENSE_COLUMNS} FROM expenses 
+                WHERE category = ? 
+                ORDER BY date DESC, id DESC
+            ''', (category,)).fetchall()
+            partitions = self._archive(conn)
+        if not partitions:
+            return rows
+        return list(_merge_in_list_order(
+            rows, _archived(partitions, ExpenseFilter(categories={category}))))
     
+    @cached
     def get_expenses_by_date_range(self, start_date, end_date):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT * FROM expenses 
-            WHERE date BETWEEN ? AND ? 
-            ORDER BY date DESC
-        ''', (start_date, end_date))
-        expenses = cursor.fetchall()
-        conn.close()
-        return expenses
+        with self.read_connection() as conn:
+            rows = self._select(conn, f'''
+                SELECT {EXPENSE_COLUMNS} FROM expenses 
+                WHERE date BETWEEN ? AND ? 
+                ORDER BY date DESC, id DESC
+            ''', (start_date, end_date)).fetchall()
+            partitions = self._archive(conn)
+        if not partitions:
+            return rows
+        return list(_merge_in_list_order(
+            rows, _archived(partitions, ExpenseFilter(start_date=start_date,
+                                                      end_date=end_date))))
+    
+    def iter_expenses(self, filters=None, batch_size=1000, newest_first=True):
+        """Stream matching Expense records without building a full list.
+        
+        Rows are pulled with fetchmany(batch_size), so memory stays flat
+        for exports and reports over any number of rows. A pooled read
+        connection is held until the generator is exhausted or closed.
+        """
+        filters = filters or ExpenseFilter()
+        where, params = filters.compile()
+        order = 'date DESC, id DESC' if newest_first else 'date, id'
+        with self.read_connection() as conn:
+            partitions = self._archive(conn)
+            cursor = self._select(conn, f"""
+                SELECT {EXPENSE_COLUMNS} FROM expenses {where} ORDER BY {order}
+            """, params)
+            
+            def live_rows():
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        return
+                    yield from rows
+            try:
+                if partitions:
+                    yield from _merge_in_list_order(
+                        live_rows(), _archived(partitions, filters, newest_first),
+                        newest_first)
+                else:
+                    yield from live_rows()
+            finally:
+                cursor.close()
+    
+    @property
+    def has_search_index(self):
+        with self.read_connection() as conn:
+            return self._has_search_index(conn)
     
+    @staticmethod
+    def _has_search_index(conn):
+        # On the connection already held: borrowing a second reader while
+        # holding one deadlocks once every thread holds one
+        return conn.execute('''
+            SELECT 1 FROM sqlite_master WHERE name = 'expenses_fts'
+        ''').fetchone() is not None
+    
+    @cached
+    def search_expenses(self, query, limit=50):
+        """Full-text search over descriptions and categories, best match first.
+        
+        Every word must match, as a whole word or a prefix. Returns at
+        most limit Expense records. Archived months have no index: their
+        matches (by substring) follow the live ones, newest first.
+        """
+        match = fts_query(query)
+        if not match:
+            return []
+        with self.read_connection() as conn:
+            if not self._has_search_index(conn):
+                where, params = ExpenseFilter(text=query.strip()).compile()
+                rows = self._select(conn, f'''
+                    SELECT {EXPENSE_COLUMNS} FROM expenses {where}
+                    ORDER BY date DESC, id DESC LIMIT ?
+                ''', (*params, limit)).fetchall()
+            else:
+                columns = ', '.join(f'e.{column.strip()}'
+                                    for column in EXPENSE_COLUMNS.split(','))
+                rows = self._select(conn, f'''
+                    SELECT {columns}
+                    FROM expenses_fts
+                    JOIN expenses e ON e.id = expenses_fts.rowid
+                    WHERE expenses_fts MATCH ?
+                    ORDER BY expenses_fts.rank
+                    LIMIT ?
+                ''', (match, limit)).fetchall()
+            partitions = self._archive(conn)
+        if partitions and len(rows) < limit:
+            words = query.lower().split()
+            matches = (expense for expense in _archived(partitions)
+                       if all(word in f'{expense.description} {expense.category}'.lower()
+                              for word in words))
+            rows.extend(islice(matches, limit - len(rows)))
+        return rows
+    
+    def count_expenses(self, filters=None):
+        """Count the rows matching filters"""
+        return self._aggregate(filters)[0]
+    
+    def sum_expenses(self, filters=None):
+        """Total amount of the rows matching filters"""
+        return from_cents(self._aggregate(filters)[1])
+    
+    def _aggregate(self, filters):
+        # (count, cents) over the live table plus the archive
+        filters = filters or ExpenseFilter()
+        where, params = filters.compile()
+        with self.read_connection() as conn:
+            count, total = conn.execute(f'''
+                SELECT COUNT(*), COALESCE(SUM(amount_cents), 0) FROM expenses {where}
+            ''', params).fetchone()
+            partitions = self._archive(conn)
+        for partition in partitions:
+            archived_count, archived_total = _archived_aggregate(partition, filters)
+            count += archived_count
+            total += archived_total
+        return count, total
+    
+    # ---------- totals (summary tables plus archive footers) ----------
+    
+    @cached
     def get_total_expenses(self):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('SELECT SUM(amount) FROM expenses')
-        total = cursor.fetchone()[0]
-        conn.close()
-        return total if total else 0.0
+        with self.read_connection() as conn:
+            total = conn.execute('SELECT SUM(total) FROM category_totals').fetchone()[0] or 0
+            partitions = self._archive(conn)
+        return from_cents(total + sum(partition.total() for partition in partitions))
     
+    @cached
     def get_total_by_category(self):
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT category, SUM(amount) as total
-            FROM expenses
-            GROUP BY category
-            ORDER BY total DESC
-        ''')
-        totals = cursor.fetchall()
-        conn.close()
-        return totals
+        with self.read_connection() as conn:
+            totals = dict(conn.execute('SELECT category, total FROM category_totals'))
+            partitions = self._archive(conn)
+        for partition in partitions:
+            for category, (_, cents) in partition.category_totals().items():
+                totals[category] = totals.get(category, 0) + cents
+        return [(category, from_cents(total)) for category, total in
+                sorted(totals.items(), key=lambda item: item[1], reverse=True)]
     
+    @cached
     def get_monthly_total(self, year, month):
         """Get total expenses for a specific month"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT SUM(amount) FROM expenses
-            WHERE strftime('%Y', date) = ? AND strftime('%m', date) = ?
-        ''', (str(year), f'{month:02d}'))
-        total = cursor.fetchone()[0]
-        conn.close()
-        return total if total else 0.0
+        key = f'{int(year):04d}-{int(month):02d}'
+        with self.read_connection() as conn:
+            total = self._summary_total(conn, 'monthly_totals', 'month', key)
+            for partition in self._archive(conn):
+                if partition.month == key:
+                    total += partition.total()
+        return from_cents(total)
+    
+    @cached
+    def get_daily_total(self, day):
+        """Get total expenses for one YYYY-MM-DD date"""
+        with self.read_connection() as conn:
+            total = self._summary_total(conn, 'daily_totals', 'day', day)
+            for partition in self._archive(conn):
+                if partition.month == day[:7]:
+                    total += partition.day_totals().get(day, (0, 0))[1]
+        return from_cents(total)
+    
+    @cached
+    def get_yearly_total(self, year):
+        """Get total expenses for a year (sums at most 12 month rows)"""
+        start, end = f'{int(year):04d}', f'{int(year) + 1:04d}'
+        with self.read_connection() as conn:
+            total = conn.execute('''
+                SELECT SUM(total) FROM monthly_totals
+                WHERE month >= ? AND month < ?
+            ''', (start, end)).fetchone()[0] or 0
+            partitions = self._archive(conn)
+        return from_cents(total + sum(partition.total() for partition in partitions
+                                      if start <= partition.month < end))
+    
+    @cached
+    def get_monthly_total_by_category(self, year, month):
+        """Get (category, total) pairs for one month, largest first"""
+        key = f'{int(year):04d}-{int(month):02d}'
+        with self.read_connection() as conn:
+            totals = dict(conn.execute('''
+                SELECT category, total
+                FROM monthly_category_totals
+                WHERE month = ?
+            ''', (key,)))
+            partitions = self._archive(conn)
+        for partition in partitions:
+            if partition.month == key:
+                for category, (_, cents) in partition.category_totals().items():
+                    totals[category] = totals.get(category, 0) + cents
+        return [(category, from_cents(total)) for category, total in
+                sorted(totals.items(), key=lambda item: item[1], reverse=True)]
+    
+    @cached
+    def get_daily_totals(self, start_date, end_date):
+        """Get (day, total) pairs for every day with spending in a range"""
+        with self.read_connection() as conn:
+            totals = dict(conn.execute('''
+                SELECT day, total FROM daily_totals
+                WHERE day BETWEEN ? AND ?
+            ''', (start_date, end_date)))
+            partitions = self._archive(conn)
+        for partition in partitions:
+            if start_date[:7] <= partition.month <= end_date[:7]:
+                for day, (_, cents) in partition.day_totals().items():
+                    if start_date <= day <= end_date:
+                        totals[day] = totals.get(day, 0) + cents
+        return [(day, from_cents(total)) for day, total in sorted(totals.items())]
+    
+    @staticmethod
+    def _summary_total(conn, table, key, value):
+        row = conn.execute(f'SELECT total FROM {table} WHERE {key} = ?',
+                           (value,)).fetchone()
+        return row[0] if row else 0
+    
+    def verify_summaries(self):
+        """Compare every summary table against a fresh aggregate.
+        
+        Returns a list of (table, key, stored (total, count), actual
+        (total, count)) for each entry that drifted; empty means consistent.
+        Totals are integer cents, so any difference at all is drift.
+        """
+        drift = []
+        with self.read_connection() as conn:
+            for table, keys, exprs in SUMMARY_TABLES:
+                groups = ', '.join(expr.format(row='expenses') for expr in exprs)
+                stored = {row[:-2]: row[-2:] for row in conn.execute(
+                    f'SELECT {", ".join(keys)}, total, count FROM {table}')}
+                actual = {row[:-2]: row[-2:] for row in conn.execute(
+                    f'SELECT {groups}, SUM(amount_cents), COUNT(*) FROM expenses '
+                    f'GROUP BY {groups}')}
+                for key in stored.keys() | actual.keys():
+                    have = stored.get(key, (0, 0))
+                    want = actual.get(key, (0, 0))
+                    if have != want:
+                        drift.append((table, key, have, want))
+        return drift
+    
+    def rebuild_summaries(self):
+        """Recompute all summary tables from scratch"""
+        with self.transaction() as conn:
+            fill_summary_tables(conn)
+            self._emit('bulk')
+
+
+class BackgroundExecutor:
+    """
+    Runs database work on worker threads so the Tk mainloop never waits.
+    
+    Results are handed back to the Tk thread by polling a queue with
+    scheduler.after(), never by touching widgets from a worker. The
+    scheduler is anything with after(ms, func) -- normally the Tk root.
+    Polling runs every POLL_MS while tasks are in flight and every
+    IDLE_POLL_MS otherwise, so callbacks post()ed from other threads are
+    delivered even when nothing was submitted.
+    
+    Tasks submitted with a key supersede earlier tasks with the same key:
+    the older one is cancelled if it hasn't started, and its callbacks are
+    skipped if it has.
+    """
+    
+    POLL_MS = 15
+    IDLE_POLL_MS = 100
+    
+    def __init__(self, scheduler, max_workers=2, on_busy=None):
+        self.scheduler = scheduler
+        self.on_busy = on_busy
+        from concurrent.futures import ThreadPoolExecutor
+        self._pool = ThreadPoolExecutor(max_workers=max_workers,
+                                        thread_name_prefix='expense-db')
+        self._results = queue.Queue()
+        self._latest = {}
+        self._pending = 0
+        self._poll_delay = None   # delay of the poll armed, None if none is
+        self._poll_token = 0      # a sooner poll makes the armed one moot
+        self._closed = False
+        self._start_polling(self.IDLE_POLL_MS)
+    
+    @property
+    def busy(self):
+        return self._pending > 0
+    
+    def submit(self, task, on_done=None, on_error=None, key=None):
+        """Run task() on a worker; call on_done(result) or on_error(exc)
+        on the Tk thread afterwards. Returns the Future."""
+        if key is not None and key in self._latest:
+            self._latest[key].cancel()
+        future = self._pool.submit(task)
+        if key is not None:
+            self._latest[key] = future
+        self._set_pending(self._pending + 1)
+        future.add_done_callback(
+            lambda f: self._results.put((f, key, on_done, on_error)))
+        self._start_polling()
+        return future
+    
+    def post(self, callback, *args):
+        """Call callback(*args) on the Tk thread; safe from any thread"""
+        self._results.put((None, None, lambda _: callback(*args), None))
+        # after() is for the Tk thread only; elsewhere the idle poll finds it
+        if threading.current_thread() is threading.main_thread():
+            self._start_polling()
+    
+    def cancel(self, key):
+        """Cancel the latest task for key and drop its callbacks"""
+        future = self._latest.pop(key, None)
+        if future is not None:
+            future.cancel()
+    
+    def is_stale(self, key, future):
+        return key is not None and self._latest.get(key) is not future
+    
+    def pending(self, key):
+        """Whether the latest task for key hasn't delivered yet"""
+        return key in self._latest
+    
+    def _set_pending(self, count):
+        was_busy = self.busy
+        self._pending = count
+        if self.on_busy and was_busy != self.busy:
+            self.on_busy(self.busy)
+    
+    def _start_polling(self, delay=None):
+        # Tk thread only. Arms a poll unless one at least as soon is armed.
+        delay = self.POLL_MS if delay is None else delay
+        if self._closed or (self._poll_delay is not None and self._poll_delay <= delay):
+            return
+        self._poll_delay = delay
+        self._poll_token += 1
+        token = self._poll_token
+        self.scheduler.after(delay, lambda: self._poll(token))
+    
+    def _poll(self, token):
+        if token != self._poll_token:
+            return  # superseded by a sooner poll
+        self._poll_delay = None
+        while True:
+            try:
+                future, key, on_done, on_error = self._results.get_nowait()
+            except queue.Empty:
+                break
+            self._deliver(future, key, on_done, on_error)
+        # Poll quickly while work is in flight and slowly otherwise, for
+        # what other threads post (change notifications, budget alerts)
+        self._start_polling(self.POLL_MS if self._pending else self.IDLE_POLL_MS)
+    
+    def _deliver(self, future, key, on_done, on_error):
+        if future is None:
+            callback, result = on_done, None
+        else:
+            self._set_pending(self._pending - 1)
+            if self.is_stale(key, future) or future.cancelled():
+                return
+            if key is not None:
+                del self._latest[key]
+            error = future.exception()
+            if error is None:
+                callback, result = on_done, future.result()
+            else:
+                callback, result = on_error, error
+            if callback is None:
+                if error is not None:
+                    sys.excepthook(type(error), error, error.__traceback__)
+                return
+        try:
+            callback(result)
+        except Exception:
+            sys.excepthook(*sys.exc_info())
+    
+    def shutdown(self, wait=True):
+        self._closed = True
+        for future in self._latest.values():
+            future.cancel()
+        self._pool.shutdown(wait=wait)
+
+
+class VirtualExpenseList:
+    """
+    Shows the expense table in a Treeview without loading all of it.
+    
+    Only a sliding window of rows is kept in the tree. When the view gets
+    near either end of the window, the next page is fetched by keyset and
+    rows far out of view on the other side are dropped, so memory and
+    refresh time stay flat however large the table is.
+    
+    With an executor, pages are fetched in the background and applied
+    when they arrive; without one they are fetched inline.
+    """
+    
+    # Fetch more once the view is within this fraction of either end
+    PREFETCH_MARGIN = 0.2
+    
+    def __init__(self, tree, scrollbar, db, page_size=PAGE_SIZE,
+                 max_rows=MAX_WINDOW_ROWS, executor=None):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.db = db
+        self.executor = executor
+        self.page_size = page_size
+        self.max_rows = max(max_rows, 2 * page_size)
+        self.at_start = True
+        self.at_end = True
+        self.loading = False
+        self.reloading = False
+        self._generation = 0
+        self._check_pending = False
+        tree.configure(yscrollcommand=self._on_scroll)
+    
+    @staticmethod
+    def row_values(expense):
+        return (expense[0], expense[1], expense[2],
+                f"${expense[3]:.2f}", expense[4])
+    
+    def key(self, item):
+        """The (date, id) keyset position of a tree item"""
+        return self.tree.set(item, 'Date'), int(item)
+    
+    def _fetch(self, task, callback):
+        # Drop results that belong to a window reload() already replaced
+        generation = self._generation
+        
+        def deliver(rows):
+            if generation == self._generation:
+                callback(rows)
+        
+        if self.executor is None:
+            deliver(task())
+        else:
+            self.loading = True
+            self.executor.submit(task, on_done=deliver,
+                                 on_error=lambda e: self._fetch_failed(generation),
+                                 key=('page', id(self)))
+    
+    def _fetch_failed(self, generation):
+        if generation == self._generation:
+            self.loading = False
+            self.reloading = False
+    
+    def reload(self):
+        """Drop everything and show the first page again"""
+        self._generation += 1
+        self.reloading = True
+        limit = self.page_size
+        self._fetch(lambda: self.db.get_expenses_page(limit=limit),
+                    self._show_first_page)
+    
+    def show_rows(self, rows):
+        """Show a fixed set of rows (search results) with paging turned off"""
+        self._generation += 1
+        self.loading = self.reloading = False
+        self.tree.delete(*self.tree.get_children())
+        self.at_start = self.at_end = True
+        self._insert(rows, 'end')
+        self.tree.yview_moveto(0)
+    
+    def _show_first_page(self, rows):
+        self.loading = False
+        self.reloading = False
+        self.tree.delete(*self.tree.get_children())
+        self.at_start = True
+        self.at_end = len(rows) < self.page_size
+        self._insert(rows, 'end')
+        self.tree.yview_moveto(0)
+    
+    # ---------- in-place patches for single-row changes ----------
+    
+    def apply_insert(self, expense):
+        """Show a new row if it falls inside the loaded window"""
+        children = self.tree.get_children()
+        key = (expense[1], expense[0])
+        if children:
+            if not self.at_start and key > self.key(children[0]):
+                return  # above the window; it'll be fetched on scroll
+            if not self.at_end and key < self.key(children[-1]):
+                return  # below the window
+        
+        # Children are sorted newest first; find the first one older than key
+        lo, hi = 0, len(children)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.key(children[mid]) > key:
+                lo = mid + 1
+            else:
+                hi = mid
+        self.tree.insert('', lo, iid=str(expense[0]),
+                         values=self.row_values(expense))
+    
+    def apply_delete(self, expense_id):
+        if self.tree.exists(str(expense_id)):
+            self.tree.delete(str(expense_id))
+    
+    def apply_update(self, expense):
+        iid = str(expense[0])
+        if self.tree.exists(iid) and self.tree.set(iid, 'Date') == expense[1]:
+            # Same date means same position; just patch the values
+            self.tree.item(iid, values=self.row_values(expense))
+            return
+        selected = iid in self.tree.selection()
+        self.apply_delete(expense[0])
+        self.apply_insert(expense)
+        if selected and self.tree.exists(iid):
+            self.tree.selection_add(iid)
+    
+    def _insert(self, rows, index):
+        for offset, expense in enumerate(rows):
+            position = offset if index == 0 else 'end'
+            self.tree.insert('', position, iid=str(expense[0]),
+                             values=self.row_values(expense))
+    
+    def _on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        if not self._check_pending:
+            # Scroll events come in bursts; look once things settle
+            self._check_pending = True
+            self.tree.after_idle(self._check_edges)
+    
+    def _check_edges(self):
+        self._check_pending = False
+        if self.loading:
+            return  # re-checked when the page in flight arrives
+        first, last = self.tree.yview()
+        if last >= 1 - self.PREFETCH_MARGIN and not self.at_end:
+            self.load_next()
+        elif first <= self.PREFETCH_MARGIN and not self.at_start:
+            self.load_previous()
+    
+    def load_next(self):
+        """Append the page below the window, trimming rows off the top"""
+        children = self.tree.get_children()
+        if not children:
+            return
+        anchor, after, limit = children[-1], self.key(children[-1]), self.page_size
+        self._fetch(lambda: self.db.get_expenses_page(after=after, limit=limit),
+                    lambda rows: self._append_page(anchor, rows))
+    
+    def _append_page(self, anchor, rows):
+        self.loading = False
+        children = self.tree.get_children()
+        if not children or children[-1] != anchor:
+            self._on_scroll(*self.tree.yview())  # window moved; try again
+            return
+        self.at_end = len(rows) < self.page_size
+        if rows:
+            top = self._top_index(len(children))
+            self._insert(rows, 'end')
+            
+            children = self.tree.get_children()
+            excess = len(children) - self.max_rows
+            if excess > 0:
+                self.tree.delete(*children[:excess])
+                self.at_start = False
+                self._restore_top(top - excess)
+        # The user may have kept scrolling while the page was loading
+        self._on_scroll(*self.tree.yview())
+    
+    def load_previous(self):
+        """Prepend the page above the window, trimming rows off the bottom"""
+        children = self.tree.get_children()
+        if not children:
+            return
+        anchor, before, limit = children[0], self.key(children[0]), self.page_size
+        self._fetch(lambda: self.db.get_expenses_page(before=before, limit=limit),
+                    lambda rows: self._prepend_page(anchor, rows))
+    
+    def _prepend_page(self, anchor, rows):
+        self.loading = False
+        children = self.tree.get_children()
+        if not children or children[0] != anchor:
+            self._on_scroll(*self.tree.yview())
+            return
+        self.at_start = len(rows) < self.page_size
+        if rows:
+            top = self._top_index(len(children))
+            self._insert(rows, 0)
+            
+            children = self.tree.get_children()
+            excess = len(children) - self.max_rows
+            if excess > 0:
+                self.tree.delete(*children[-excess:])
+                self.at_end = False
+            self._restore_top(top + len(rows))
+        self._on_scroll(*self.tree.yview())
+    
+    def _top_index(self, count):
+        return round(self.tree.yview()[0] * count)
+    
+    def _restore_top(self, index):
+        # Keep the same rows on screen after the window shifted under them
+        count = len(self.tree.get_children())
+        if count:
+            self.tree.yview_moveto(max(index, 0) / count)
+
+
+class DiagnosticsWindow:
+    """
+    Live view of ExpenseDatabase instrumentation in its own window.
+    
+    Turns instrumentation on while open (unless it already was) and off
+    again when closed, so the app pays for it only while someone looks.
+    """
+    
+    REFRESH_MS = 1000
+    COLUMNS = ('Calls', 'Rows', 'Mean ms', 'p95 ms', 'Max ms', 'Total ms')
+    
+    def __init__(self, root, db, on_close=None):
+        self.db = db
+        self.on_close = on_close
+        self.owns_instrumentation = db.instrumentation is None
+        if self.owns_instrumentation:
+            db.enable_instrumentation()
+        
+        self.window = tk.Toplevel(root)
+        self.window.title("📊 Database Diagnostics")
+        self.window.geometry("900x550")
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+        
+        self.summary_label = tk.Label(self.window, anchor='w', font=('Arial', 10))
+        self.summary_label.pack(fill='x', padx=10, pady=(10, 0))
+        
+        self.tree = ttk.Treeview(self.window, columns=self.COLUMNS, height=14)
+        self.tree.heading('#0', text='Method / statement')
+        self.tree.column('#0', width=380)
+        for column in self.COLUMNS:
+            self.tree.heading(column, text=column)
+            self.tree.column(column, width=80, anchor='e')
+        self.tree.pack(fill='both', expand=True, padx=10, pady=10)
+        self.methods_node = self.tree.insert('', 'end', text='Methods', open=True)
+        self.statements_node = self.tree.insert('', 'end', text='SQL statements', open=True)
+        
+        tk.Label(self.window, text="Slow statements", anchor='w',
+                 font=('Arial', 10, 'bold')).pack(fill='x', padx=10)
+        self.slow_text = tk.Text(self.window, height=8, font=('Courier', 9))
+        self.slow_text.pack(fill='x', padx=10, pady=(0, 10))
+        
+        self._job = None
+        self.refresh()
+    
+    def refresh(self):
+        snapshot = self.db.instrumentation_snapshot()
+        if snapshot is None:  # someone else turned it off
+            self.close()
+            return
+        summary = (f"Recording since {snapshot['since']} - statements slower than "
+                   f"{snapshot['slow_ms']} ms are logged with their query plan")
+        cache = self.db.cache_stats()
+        if cache:
+            summary += (f"   |   cache: {cache['hits']:,} hits, {cache['misses']:,} misses "
+                        f"({cache['hit_rate']:.0%}), {cache['entries']} entries")
+        self.summary_label.config(text=summary)
+        self._fill(self.methods_node, snapshot['methods'])
+        self._fill(self.statements_node, snapshot['statements'])
+        
+        self.slow_text.delete('1.0', 'end')
+        for entry in reversed(snapshot['slow']):
+            plan = '; '.join(entry['plan']) if entry['plan'] else 'n/a'
+            self.slow_text.insert('end', f"{entry['at']}  {entry['ms']:8.1f} ms  "
+                                         f"{entry['sql']}\n    plan: {plan}\n")
+        self._job = self.window.after(self.REFRESH_MS, self.refresh)
+    
+    def _fill(self, parent, stats_by_name):
+        # Busiest first; item iids are parent-prefixed names so rows update in place
+        ranked = sorted(stats_by_name.items(), key=lambda item: -item[1]['total_ms'])
+        wanted = set()
+        for index, (name, stats) in enumerate(ranked):
+            iid = f'{parent}:{name}'
+            wanted.add(iid)
+            values = (stats['count'], stats['rows'], f"{stats['mean_ms']:.3f}",
+                      f"{stats['p95_ms']:.3f}", f"{stats['max_ms']:.3f}",
+                      f"{stats['total_ms']:.1f}")
+            if self.tree.exists(iid):
+                self.tree.item(iid, values=values)
+                self.tree.move(iid, parent, index)
+            else:
+                self.tree.insert(parent, index, iid=iid, text=name, values=values)
+        stale = [iid for iid in self.tree.get_children(parent) if iid not in wanted]
+        if stale:
+            self.tree.delete(*stale)
+    
+    def close(self):
+        if self._job is not None:
+            self.window.after_cancel(self._job)
+            self._job = None
+        if self.owns_instrumentation and self.db.instrumentation is not None:
+            self.db.disable_instrumentation()
+        self.window.destroy()
+        if self.on_close:
+            self.on_close()
 
 
 class CompleteExpenseTracker:
@@ -152,13 +3188,34 @@ class CompleteExpenseTracker:
     """
     
     def __init__(self, root):
+        load_tk()
         self.root = root
         self.root.title("💰 Complete Expense Tracker")
         self.root.geometry("1000x700")
         self.root.configure(bg='#f0f0f0')
         
-        # Initialize database
+        # Initialize database; all queries run on background workers
         self.db = ExpenseDatabase()
+        self.executor = BackgroundExecutor(self.root, on_busy=self.set_busy)
+        
+        # Daily online snapshots next to the database, plus compaction and
+        # planner statistics; all on their own thread
+        self.maintenance = MaintenanceScheduler(
+            self.db, snapshot_dir=self.db.db_name + '.snapshots').start()
+        
+        # Budget state is read once in the background, then kept current
+        # from change events; alerts hop over to the Tk thread
+        self.budgets = None
+        
+        def start_budgets():
+            from ExpenseBudgets import BudgetEngine
+            return BudgetEngine(
+                self.db,
+                on_alert=lambda alert: self.executor.post(self.on_budget_alert, alert),
+                on_update=lambda: self.executor.post(self.update_budgets))
+        self.executor.submit(start_budgets, on_done=self._budgets_ready)
+        self.total_amount = Decimal('0.00')
+        self.category_totals = {}
         
         # Color scheme
         self.primary_color = '#2196F3'
@@ -169,8 +3226,16 @@ class CompleteExpenseTracker:
         # Create GUI
         self.create_widgets()
         
+        # Patch the list in place whenever a write commits. Listeners run
+        # on the writing thread, so hop over to the Tk thread first.
+        self._db_listener = lambda change: self.executor.post(self.on_db_change, change)
+        self.db.add_listener(self._db_listener)
+        
+        # Close pooled connections when the window goes away
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        
         # Load data
-        self.refresh_expense_list()
+        self.refresh_all()
     
     def create_widgets(self):
         """Create all GUI components"""
@@ -183,6 +3248,17 @@ class CompleteExpenseTracker:
                 font=('Arial', 20, 'bold'), bg=self.primary_color, 
                 fg='white').pack(pady=15)
         
+        # Busy indicator, shown while database work is in flight
+        self.busy_label = tk.Label(header, text="", font=('Arial', 10),
+                                   bg=self.primary_color, fg='white')
+        self.busy_label.place(relx=1.0, rely=0.5, anchor='e', x=-15)
+        
+        # Opens the query timings window (instrumentation is off until then)
+        self.diagnostics = None
+        tk.Button(header, text="📊 Diagnostics", font=('Arial', 9),
+                 bg=self.primary_color, fg='white', command=self.show_diagnostics,
+                 cursor='hand2', relief='flat').place(relx=0.0, rely=0.5, anchor='w', x=15)
+        
         # ============= MAIN CONTAINER =============
         main_container = tk.Frame(self.root, bg='#f0f0f0')
         main_container.pack(fill='both', expand=True, padx=10, pady=10)
@@ -205,8 +3281,11 @@ class CompleteExpenseTracker:
     def create_input_section(self, parent):
         """Create input form section"""
         
-        tk.Label(parent, text="Add New Expense", 
-                font=('Arial', 14, 'bold'), bg='white').pack(pady=15)
+        # Retitled while an existing expense is loaded for editing
+        self.editing = None
+        self.form_title = tk.Label(parent, text="Add New Expense",
+                                   font=('Arial', 14, 'bold'), bg='white')
+        self.form_title.pack(pady=15)
         
         # Date
         tk.Label(parent, text="Date:", font=('Arial', 10), 
@@ -221,9 +3300,7 @@ class CompleteExpenseTracker:
         self.category_var = tk.StringVar()
         self.category_combo = ttk.Combobox(parent, textvariable=self.category_var,
                                           font=('Arial', 10), width=23)
-        self.category_combo['values'] = ('Food', 'Transport', 'Entertainment',
-                                         'Shopping', 'Bills', 'Healthcare', 
-                                         'Education', 'Other')
+        self.category_combo['values'] = CATEGORIES
         self.category_combo.pack(padx=20, pady=5)
         self.category_combo.current(0)
         
@@ -245,18 +3322,18 @@ class CompleteExpenseTracker:
         btn_frame.pack(pady=20)
         
         # Add button
-        add_btn = tk.Button(btn_frame, text="Add Expense", 
-                           font=('Arial', 11, 'bold'), bg=self.success_color,
-                           fg='white', command=self.add_expense, cursor='hand2',
-                           padx=20, pady=10, relief='flat')
-        add_btn.pack(pady=5)
-        
-        # Clear button
-        clear_btn = tk.Button(btn_frame, text="Clear Form", 
-                             font=('Arial', 10), bg='#757575', fg='white',
-                             command=self.clear_form, cursor='hand2',
-                             padx=20, pady=8, relief='flat')
-        clear_btn.pack(pady=5)
+        self.add_button = tk.Button(btn_frame, text="Add Expense",
+                                    font=('Arial', 11, 'bold'), bg=self.success_color,
+                                    fg='white', command=self.add_expense, cursor='hand2',
+                                    padx=20, pady=10, relief='flat')
+        self.add_button.pack(pady=5)
+        
+        # Clear button (cancels an edit)
+        self.clear_button = tk.Button(btn_frame, text="Clear Form",
+                                      font=('Arial', 10), bg='#757575', fg='white',
+                                      command=self.clear_form, cursor='hand2',
+                                      padx=20, pady=8, relief='flat')
+        self.clear_button.pack(pady=5)
     
     def create_list_section(self, parent):
         """Create expense list section"""
@@ -271,6 +3348,15 @@ class CompleteExpenseTracker:
         tk.Label(header_frame, text="Expense History", 
                 font=('Arial', 14, 'bold'), bg='white').pack(side='left')
         
+        # Search box, searched as you type
+        tk.Label(header_frame, text="🔍", font=('Arial', 10),
+                bg='white').pack(side='left', padx=(15, 2))
+        self.search_var = tk.StringVar()
+        tk.Entry(header_frame, textvariable=self.search_var, font=('Arial', 10),
+                width=20).pack(side='left')
+        self._search_job = None
+        self.search_var.trace_add('write', lambda *args: self.schedule_search())
+        
         # Action buttons
         btn_frame = tk.Frame(header_frame, bg='white')
         btn_frame.pack(side='right')
@@ -283,8 +3369,12 @@ class CompleteExpenseTracker:
                  bg=self.warning_color, fg='white', command=self.edit_expense,
                  cursor='hand2', relief='flat', padx=10, pady=5).pack(side='left', padx=2)
         
+        tk.Button(btn_frame, text="🏷️ Category", font=('Arial', 9),
+                 bg=self.warning_color, fg='white', command=self.recategorize_selected,
+                 cursor='hand2', relief='flat', padx=10, pady=5).pack(side='left', padx=2)
+        
         tk.Button(btn_frame, text="🔄 Refresh", font=('Arial', 9),
-                 bg=self.primary_color, fg='white', command=self.refresh_expense_list,
+                 bg=self.primary_color, fg='white', command=self.refresh_all,
                  cursor='hand2', relief='flat', padx=10, pady=5).pack(side='left', padx=2)
         
         # Treeview
@@ -292,8 +3382,11 @@ class CompleteExpenseTracker:
         tree_frame.pack(fill='both', expand=True, padx=10, pady=(0, 10))
         
         columns = ('ID', 'Date', 'Category', 'Amount', 'Description')
-        self.tree = ttk.Treeview(tree_frame, columns=columns, show='headings', 
-                                height=12)
+        # Shift/Ctrl-click select several rows for Delete and Category
+        self.tree = ttk.Treeview(tree_frame, columns=columns, show='headings',
+                                height=12, selectmode='extended')
+        self.tree.bind('<Delete>', lambda event: self.delete_expense())
+        self.tree.bind('<Control-a>', self.select_all)
         
         self.tree.heading('ID', text='ID')
         self.tree.heading('Date', text='Date')
@@ -310,7 +3403,8 @@ class CompleteExpenseTracker:
         # Scrollbar
         scrollbar = ttk.Scrollbar(tree_frame, orient='vertical', 
                                  command=self.tree.yview)
-        self.tree.configure(yscrollcommand=scrollbar.set)
+        self.expense_list = VirtualExpenseList(self.tree, scrollbar, self.db,
+                                               executor=self.executor)
         
         self.tree.pack(side='left', fill='both', expand=True)
         scrollbar.pack(side='right', fill='y')
@@ -333,6 +3427,55 @@ class CompleteExpenseTracker:
         # Category breakdown
         self.category_frame = tk.Frame(stats_frame, bg='white')
         self.category_frame.pack(fill='x', padx=20, pady=10)
+        
+        # One reusable row of labels per slot in the top-5 breakdown
+        self.category_rows = []
+        for _ in range(TOP_CATEGORIES):
+            frame = tk.Frame(self.category_frame, bg='white')
+            name_label = tk.Label(frame, font=('Arial', 10),
+                                  bg='white', width=15, anchor='w')
+            name_label.pack(side='left')
+            total_label = tk.Label(frame, font=('Arial', 10, 'bold'),
+                                   bg='white', fg=self.success_color)
+            total_label.pack(side='right')
+            self.category_rows.append((frame, name_label, total_label))
+        
+        # Spending insights from ExpenseAnalytics, only if NumPy is installed
+        self.insight_labels = {}
+        self._insights_job = None
+        if analytics_available():
+            insights_frame = tk.Frame(stats_frame, bg='white')
+            insights_frame.pack(fill='x', padx=20, pady=(0, 10))
+            tk.Label(insights_frame, text="Insights", font=('Arial', 11, 'bold'),
+                    bg='white', anchor='w').pack(fill='x')
+            for key, title in (('last_7_days', "Last 7 days"),
+                               ('last_30_days', "Last 30 days"),
+                               ('month_change', "This month"),
+                               ('busiest_weekday', "Busiest weekday"),
+                               ('outliers', "Most unusual")):
+                row = tk.Frame(insights_frame, bg='white')
+                row.pack(fill='x', pady=1)
+                tk.Label(row, text=f"{title}:", font=('Arial', 10), bg='white',
+                        width=15, anchor='w').pack(side='left')
+                value_label = tk.Label(row, text="…", font=('Arial', 10), bg='white',
+                                       anchor='e')
+                value_label.pack(side='right')
+                self.insight_labels[key] = value_label
+        
+        # Budgets against their current windows, kept current by the
+        # BudgetEngine; one reusable row per budget
+        budgets_frame = tk.Frame(stats_frame, bg='white')
+        budgets_frame.pack(fill='x', padx=20, pady=(0, 10))
+        budgets_header = tk.Frame(budgets_frame, bg='white')
+        budgets_header.pack(fill='x')
+        tk.Label(budgets_header, text="Budgets", font=('Arial', 11, 'bold'),
+                bg='white', anchor='w').pack(side='left')
+        tk.Button(budgets_header, text="⚙️ Manage", font=('Arial', 8),
+                 command=self.show_budgets_dialog, cursor='hand2',
+                 relief='flat').pack(side='right')
+        self.budget_list = tk.Frame(budgets_frame, bg='white')
+        self.budget_list.pack(fill='x')
+        self.budget_labels = {}  # budget id -> label
     
     def add_expense(self):
         """Add new expense"""
@@ -346,20 +3489,40 @@ class CompleteExpenseTracker:
             return
         
         try:
-            amount = float(amount_str)
-            if amount <= 0:
+            amount = Decimal(amount_str)
+            if not amount.is_finite() or amount <= 0:
                 raise ValueError("Amount must be positive")
-        except ValueError:
+        except (ValueError, InvalidOperation):
             messagebox.showerror("Error", "Please enter a valid amount!")
             return
         
-        try:
-            self.db.add_expense(date, category, amount, description)
-            messagebox.showinfo("Success", "✅ Expense added successfully!")
-            self.clear_form()
-            self.refresh_expense_list()
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to add expense: {str(e)}")
+        if self.editing is not None:
+            # Rewrite the row in place so it keeps its id
+            expense_id, currency = self.editing[0], self.editing[5]
+            self.executor.submit(
+                lambda: self.db.update_expense(expense_id, date, category, amount,
+                                               description, currency),
+                on_done=self._expense_saved,
+                on_error=lambda e: messagebox.showerror(
+                    "Error", f"Failed to save expense: {str(e)}"))
+            return
+        
+        self.executor.submit(
+            lambda: self.db.add_expense(date, category, amount, description),
+            on_done=self._expense_added,
+            on_error=lambda e: messagebox.showerror(
+                "Error", f"Failed to add expense: {str(e)}"))
+    
+    def _expense_added(self, expense_id):
+        messagebox.showinfo("Success", "✅ Expense added successfully!")
+        self.clear_form()
+    
+    def _expense_saved(self, updated):
+        if updated:
+            messagebox.showinfo("Success", "✅ Expense saved!")
+        else:
+            messagebox.showwarning("Warning", "That expense no longer exists!")
+        self.clear_form()
     
     def clear_form(self):
         """Clear all input fields"""
@@ -368,70 +3531,338 @@ class CompleteExpenseTracker:
         self.amount_entry.delete(0, tk.END)
         self.description_entry.delete('1.0', 'end')
         self.category_combo.current(0)
+        self.set_editing(None)
+    
+    def set_editing(self, expense):
+        """Switch the form between adding and editing an existing expense"""
+        self.editing = expense
+        if expense is None:
+            self.form_title.config(text="Add New Expense")
+            self.add_button.config(text="Add Expense")
+            self.clear_button.config(text="Clear Form")
+        else:
+            self.form_title.config(text=f"Edit Expense #{expense[0]}")
+            self.add_button.config(text="Save Changes")
+            self.clear_button.config(text="Cancel Edit")
     
     def refresh_expense_list(self):
         """Refresh expense list and statistics"""
-        # Clear tree
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        
-        # Load expenses
-        expenses = self.db.get_all_expenses()
-        for expense in expenses:
-            self.tree.insert('', 'end', values=(
-                expense[0],
-                expense[1],
-                expense[2],
-                f"${expense[3]:.2f}",
-                expense[4]
-            ))
-        
-        # Update total
-        total = self.db.get_total_expenses()
-        self.total_label.config(text=f"Total: ${total:.2f}")
-        
-        # Update category breakdown
-        for widget in self.category_frame.winfo_children():
-            widget.destroy()
-        
-        category_totals = self.db.get_total_by_category()
-        for category, total in category_totals[:5]:  # Top 5 categories
-            frame = tk.Frame(self.category_frame, bg='white')
-            frame.pack(fill='x', pady=2)
-            
-            tk.Label(frame, text=f"{category}:", font=('Arial', 10),
-                    bg='white', width=15, anchor='w').pack(side='left')
-            tk.Label(frame, text=f"${total:.2f}", font=('Arial', 10, 'bold'),
-                    bg='white', fg=self.success_color).pack(side='right')
+        # Load the first page; more is fetched as the list scrolls
+        if self.search_text:
+            self.run_search()
+        else:
+            self.expense_list.reload()
+        
+        # Running totals, patched in place by on_db_change afterwards.
+        # A newer refresh supersedes one still in flight.
+        self.executor.submit(
+            lambda: (self.db.get_total_expenses(), self.db.get_total_by_category()),
+            on_done=self._show_totals, key='totals')
+    
+    def refresh_all(self):
+        """Refresh button: reload the list, totals and insights"""
+        self.refresh_expense_list()
+        self.refresh_insights()
+    
+    def refresh_insights(self):
+        """Recompute the spending insights in the background"""
+        self._insights_job = None
+        if not self.insight_labels:
+            return
+        
+        def summarize():
+            import ExpenseAnalytics
+            return ExpenseAnalytics.summarize(self.db)
+        self.executor.submit(summarize, on_done=self._show_insights, key='insights')
+    
+    def schedule_insights(self):
+        """Refresh the insights once writes pause for INSIGHTS_DELAY_MS"""
+        if not self.insight_labels:
+            return
+        if self._insights_job is not None:
+            self.root.after_cancel(self._insights_job)
+        self._insights_job = self.root.after(INSIGHTS_DELAY_MS, self.refresh_insights)
+    
+    def _show_insights(self, summary):
+        labels = self.insight_labels
+        labels['last_7_days'].config(text=f"${summary['last_7_days']:,.2f}")
+        labels['last_30_days'].config(text=f"${summary['last_30_days']:,.2f}")
+        if summary['month_change']:
+            total, delta, ratio = summary['month_change']
+            change = f" ({ratio:+.0%})" if ratio is not None else ""
+            labels['month_change'].config(
+                text=f"${total:,.2f}, {delta:+,.2f}{change}",
+                fg=self.danger_color if delta > 0 else self.success_color)
+        else:
+            labels['month_change'].config(text="-", fg='black')
+        labels['busiest_weekday'].config(text=summary['busiest_weekday'] or "-")
+        outliers = summary['outliers']
+        if outliers:
+            expense_id, category, day, amount, _ = outliers[0]
+            labels['outliers'].config(text=f"#{expense_id} {category} ${amount:,.2f} ({day})")
+        else:
+            labels['outliers'].config(text="none")
+    
+    def _show_totals(self, totals):
+        self.total_amount, category_totals = totals
+        self.category_totals = dict(category_totals)
+        self.update_stats()
+    
+    def set_busy(self, busy):
+        """Show or hide the busy indicator"""
+        self.busy_label.config(text="⏳ Working..." if busy else "")
+        self.root.config(cursor='watch' if busy else '')
+    
+    def update_stats(self):
+        """Show the running totals, reusing the category label widgets"""
+        self.total_label.config(text=f"Total: ${self.total_amount:.2f}")
+        
+        top = sorted(self.category_totals.items(), key=lambda item: item[1],
+                     reverse=True)[:TOP_CATEGORIES]
+        for slot, (frame, name_label, total_label) in enumerate(self.category_rows):
+            if slot < len(top):
+                category, total = top[slot]
+                name_label.config(text=f"{category}:")
+                total_label.config(text=f"${total:.2f}")
+                if not frame.winfo_manager():
+                    frame.pack(fill='x', pady=2)
+            elif frame.winfo_manager():
+                frame.pack_forget()
+    
+    def on_db_change(self, change):
+        """Patch the list and totals for one committed database change"""
+        self.schedule_insights()
+        if change.action == 'bulk':
+            self.refresh_expense_list()
+            return
+        
+        # A reload or totals query still in flight may have started before
+        # this write committed; run it again rather than patch stale data
+        if self.executor.pending('totals'):
+            self.refresh_expense_list()
+            return
+        if self.expense_list.reloading:
+            self.expense_list.reload()
+        
+        if change.old_row is not None:
+            self._adjust_totals(change.old_row, -1)
+        if change.action != 'delete':
+            self._adjust_totals(change.row, +1)
+        self.update_stats()
+        
+        if self.search_text:
+            self.run_search()  # the change may add or drop a match
+        elif change.action == 'delete':
+            self.expense_list.apply_delete(change.row[0])
+        elif change.action == 'insert':
+            self.expense_list.apply_insert(change.row)
+        else:
+            self.expense_list.apply_update(change.row)
+    
+    @property
+    def search_text(self):
+        return self.search_var.get().strip()
+    
+    def schedule_search(self):
+        """Debounce keystrokes: search once typing pauses"""
+        if self._search_job is not None:
+            self.root.after_cancel(self._search_job)
+        self._search_job = self.root.after(SEARCH_DEBOUNCE_MS, self.run_search)
+    
+    def run_search(self):
+        """Show the best matches for the search box, or the full list"""
+        self._search_job = None
+        text = self.search_text
+        if not text:
+            self.executor.cancel('search')
+            self.expense_list.reload()
+            return
+        self.executor.submit(lambda: self.db.search_expenses(text, SEARCH_LIMIT),
+                             on_done=self.expense_list.show_rows, key='search')
+    
+    def _adjust_totals(self, expense, sign):
+        category, amount = expense[2], expense[3]
+        self.total_amount += sign * amount
+        remaining = self.category_totals.get(category, 0) + sign * amount
+        if not remaining and sign < 0:
+            self.category_totals.pop(category, None)
+        else:
+            self.category_totals[category] = remaining
+    
+    def _budgets_ready(self, engine):
+        self.budgets = engine
+        self.update_budgets()
+    
+    def update_budgets(self):
+        """Show every budget's spending in its current window"""
+        if self.budgets is None:
+            return
+        from ExpenseBudgets import EXCEEDED, WARNING, describe
+        
+        statuses = self.budgets.status()
+        shown = {status.budget.id for status in statuses}
+        for budget_id in [budget_id for budget_id in self.budget_labels
+                          if budget_id not in shown]:
+            self.budget_labels.pop(budget_id).destroy()
+        for status in statuses:
+            label = self.budget_labels.get(status.budget.id)
+            if label is None:
+                label = tk.Label(self.budget_list, font=('Arial', 9), bg='white',
+                                 anchor='w')
+                label.pack(fill='x')
+                self.budget_labels[status.budget.id] = label
+            color = (self.danger_color if status.level == EXCEEDED
+                     else self.warning_color if status.level == WARNING
+                     else self.success_color)
+            label.config(text=describe(status), fg=color)
+    
+    def on_budget_alert(self, alert):
+        """A budget just reached its warning level or went over"""
+        from ExpenseBudgets import EXCEEDED, describe
+        
+        self.update_budgets()
+        if alert.level == EXCEEDED:
+            messagebox.showwarning("Over Budget", f"⚠️ {describe(alert.status)}")
+        else:
+            messagebox.showinfo(
+                "Budget Warning",
+                f"{describe(alert.status)}\n{alert.status.budget.warn_at:.0%} of "
+                f"the limit reached.")
+    
+    def show_budgets_dialog(self):
+        """Add and remove budgets"""
+        if self.budgets is None:
+            return  # still loading
+        from ExpenseBudgets import describe
+        
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Budgets")
+        dialog.transient(self.root)
+        
+        listbox = tk.Listbox(dialog, font=('Arial', 10), width=55, height=8)
+        listbox.pack(padx=15, pady=(15, 5))
+        budget_ids = []
+        
+        def fill():
+            listbox.delete(0, tk.END)
+            budget_ids[:] = []
+            for status in self.budgets.status():
+                budget_ids.append(status.budget.id)
+                listbox.insert(tk.END, describe(status))
+        fill()
+        
+        def remove():
+            selected = listbox.curselection()
+            if selected:
+                budget_id = budget_ids[selected[0]]
+                self.executor.submit(lambda: self.budgets.delete_budget(budget_id),
+                                     on_done=lambda _: fill())
+        
+        tk.Button(dialog, text="Remove Selected", command=remove,
+                 bg=self.danger_color, fg='white', relief='flat').pack(pady=(0, 10))
+        
+        form = tk.Frame(dialog)
+        form.pack(padx=15, pady=(0, 15))
+        category_var = tk.StringVar(value='All')
+        period_var = tk.StringVar(value='monthly')
+        ttk.Combobox(form, textvariable=category_var, values=('All',) + CATEGORIES,
+                     width=12).grid(row=0, column=0, padx=2)
+        ttk.Combobox(form, textvariable=period_var, values=BUDGET_PERIODS,
+                     state='readonly', width=9).grid(row=0, column=1, padx=2)
+        limit_entry = tk.Entry(form, width=9)
+        limit_entry.grid(row=0, column=2, padx=2)
+        days_entry = tk.Entry(form, width=4)
+        days_entry.grid(row=0, column=3, padx=2)
+        for column, text in enumerate(("Category", "Window", "Limit ($)", "Days")):
+            tk.Label(form, text=text, font=('Arial', 8)).grid(row=1, column=column)
+        
+        def add():
+            category = category_var.get().strip()
+            category = None if category in ('', 'All') else category
+            period, days = period_var.get(), days_entry.get().strip() or None
+            try:
+                limit = Decimal(limit_entry.get().strip())
+            except InvalidOperation:
+                messagebox.showerror("Error", "Please enter a valid limit!", parent=dialog)
+                return
+            self.executor.submit(
+                lambda: self.budgets.add_budget(category, period, limit, days),
+                on_done=lambda _: fill(),
+                on_error=lambda e: messagebox.showerror(
+                    "Error", f"Failed to add budget: {str(e)}", parent=dialog))
+        
+        tk.Button(form, text="Add", command=add, bg=self.success_color, fg='white',
+                 relief='flat', padx=10).grid(row=0, column=4, padx=(8, 0))
+    
+    def show_diagnostics(self):
+        """Open the diagnostics window, or raise it if already open"""
+        if self.diagnostics is not None:
+            self.diagnostics.window.lift()
+            return
+        self.diagnostics = DiagnosticsWindow(self.root, self.db,
+                                             on_close=self._diagnostics_closed)
+    
+    def _diagnostics_closed(self):
+        self.diagnostics = None
+    
+    def on_close(self):
+        """Release database connections and close the window"""
+        if self.diagnostics is not None:
+            self.diagnostics.close()
+        self.db.remove_listener(self._db_listener)
+        if self.budgets is not None:
+            self.budgets.close()
+        self.maintenance.close()
+        self.executor.shutdown()
+        self.db.close()
+        self.root.destroy()
+    
+    def selected_ids(self):
+        """Expense ids of the selected rows (tree items are keyed by id)"""
+        return [int(item) for item in self.tree.selection()]
+    
+    def select_all(self, event=None):
+        """Select every row currently loaded in the list"""
+        self.tree.selection_set(self.tree.get_children())
+        return 'break'
     
     def delete_expense(self):
-        """Delete selected expense"""
-        selected = self.tree.selection()
-        if not selected:
+        """Delete the selected expenses, all in one transaction"""
+        expense_ids = self.selected_ids()
+        if not expense_ids:
             messagebox.showwarning("Warning", "Please select an expense to delete!")
             return
         
-        if messagebox.askyesno("Confirm", "Delete this expense?"):
-            item = self.tree.item(selected[0])
-            expense_id = item['values'][0]
-            self.db.delete_expense(expense_id)
-            self.refresh_expense_list()
-            messagebox.showinfo("Success", "✅ Expense deleted!")
+        prompt = ("Delete this expense?" if len(expense_ids) == 1
+                  else f"Delete {len(expense_ids)} expenses?")
+        if messagebox.askyesno("Confirm", prompt):
+            self.executor.submit(
+                lambda: self.db.delete_many(expense_ids),
+                on_done=lambda count: messagebox.showinfo(
+                    "Success", "✅ Expense deleted!" if count == 1
+                    else f"✅ {count} expenses deleted!"),
+                on_error=lambda e: messagebox.showerror(
+                    "Error", f"Failed to delete expense: {str(e)}"))
     
     def edit_expense(self):
-        """Edit selected expense"""
-        selected = self.tree.selection()
-        if not selected:
-            messagebox.showwarning("Warning", "Please select an expense to edit!")
+        """Load the selected expense into the form to edit it"""
+        expense_ids = self.selected_ids()
+        if len(expense_ids) != 1:
+            messagebox.showwarning("Warning", "Please select one expense to edit!")
             return
         
-        item = self.tree.item(selected[0])
-        expense_id = item['values'][0]
+        expense_id = expense_ids[0]
         
         # Get expense data
-        expense = self.db.get_expense_by_id(expense_id)
+        self.executor.submit(lambda: self.db.get_expense_by_id(expense_id),
+                             on_done=self._load_expense_for_edit)
+    
+    def _load_expense_for_edit(self, expense):
+        if expense is None:
+            messagebox.showwarning("Warning", "That expense no longer exists!")
+            return
         
-        # Populate form
+        # Populate form; nothing is written until Save Changes
         self.date_entry.delete(0, tk.END)
         self.date_entry.insert(0, expense[1])
         
@@ -441,11 +3872,49 @@ class CompleteExpenseTracker:
         self.amount_entry.insert(0, str(expense[3]))
         
         self.description_entry.delete('1.0', 'end')
-        self.description_entry.insert('1.0', expense[4])
+        self.description_entry.insert('1.0', expense[4] or '')
+        
+        self.set_editing(expense)
+    
+    def recategorize_selected(self):
+        """Ask for a category and move every selected expense to it"""
+        expense_ids = self.selected_ids()
+        if not expense_ids:
+            messagebox.showwarning("Warning", "Please select expenses to re-categorize!")
+            return
+        
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Change Category")
+        dialog.transient(self.root)
+        dialog.resizable(False, False)
+        tk.Label(dialog, text=f"Move {len(expense_ids)} expense(s) to:",
+                font=('Arial', 10)).pack(padx=20, pady=(15, 5))
+        category_var = tk.StringVar(value=self.category_var.get())
+        combo = ttk.Combobox(dialog, textvariable=category_var, values=CATEGORIES,
+                             font=('Arial', 10), width=23)
+        combo.pack(padx=20, pady=5)
+        combo.focus_set()
+        
+        def apply(event=None):
+            category = category_var.get().strip()
+            if not category:
+                return
+            dialog.destroy()
+            self.executor.submit(
+                lambda: self.db.recategorize(expense_ids, category),
+                on_done=lambda count: messagebox.showinfo(
+                    "Success", f"✅ {count} expense(s) moved to {category}!"),
+                on_error=lambda e: messagebox.showerror(
+                    "Error", f"Failed to change category: {str(e)}"))
         
-        # Delete old expense
-        self.db.delete_expense(expense_id)
-        messagebox.showinfo("Edit Mode", "Expense loaded. Click 'Add Expense' to save changes.")
+        buttons = tk.Frame(dialog)
+        buttons.pack(pady=(5, 15))
+        tk.Button(buttons, text="Apply", command=apply, bg=self.success_color,
+                 fg='white', relief='flat', padx=15).pack(side='left', padx=5)
+        tk.Button(buttons, text="Cancel", command=dialog.destroy,
+                 relief='flat', padx=15).pack(side='left', padx=5)
+        dialog.bind('<Return>', apply)
+        dialog.bind('<Escape>', lambda event: dialog.destroy())
 
 
 # ============================================================================
@@ -464,6 +3933,6 @@ if __name__ == "__main__":
     print("✅ Modern, professional UI")
     print("\n" + "=" * 70)
     
-    root = tk.Tk()
+    root = load_tk().Tk()
     app = CompleteExpenseTracker(root)
     root.mainloop()
\ No newline at end of file
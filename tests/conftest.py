@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+# The modules live at the top of the repository, not in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ExpenseTracker import ExpenseDatabase  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path):
+    """A fresh database with the result cache off, so every call queries"""
+    database = ExpenseDatabase(str(tmp_path / 'expenses.db'), cache_size=0)
+    yield database
+    database.close()
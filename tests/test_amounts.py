@@ -0,0 +1,53 @@
+"""Amounts are exact integer cents, and anything SQLite can't hold is refused."""
+
+from decimal import Decimal
+
+import pytest
+
+from ExpenseTracker import MAX_CENTS, from_cents, to_cents
+
+
+@pytest.mark.parametrize('amount, cents', [
+    ('12.50', 1250), (Decimal('0.285'), 29), (0.1, 10), (7, 700), ('-4.25', -425),
+    ('92233720368547758.07', MAX_CENTS),
+])
+def test_to_cents(amount, cents):
+    assert to_cents(amount) == cents
+
+
+@pytest.mark.parametrize('amount', ['1e17', '99999999999999999', 12345678901234567890123,
+                                    '-92233720368547758.08', 'nan', 'inf', '1e999999999',
+                                    'twelve', None])
+def test_out_of_range_or_invalid_amounts_raise_value_error(amount):
+    with pytest.raises(ValueError):
+        to_cents(amount)
+
+
+def test_round_trip():
+    assert from_cents(to_cents('1234.56')) == Decimal('1234.56')
+
+
+@pytest.mark.parametrize('write', [
+    lambda db: db.add_expense('2026-01-01', 'Food', '1e17'),
+    lambda db: db.update_many([(db.add_expense('2026-01-01', 'Food', '1'), '2026-01-01',
+                                'Food', 99999999999999999, '')]),
+    lambda db: db.add_expenses_many([('2026-01-01', 'Food', '1e17')]),
+])
+def test_writes_refuse_huge_amounts_cleanly(db, write):
+    with pytest.raises(ValueError, match='too large'):
+        write(db)
+    assert db.verify_summaries() == []
+
+
+def test_import_rejects_a_huge_amount_on_its_own_line(db, tmp_path):
+    from ExpenseImporter import import_file
+    
+    path = tmp_path / 'expenses.csv'
+    path.write_text('date,category,amount\n2026-01-01,Food,1.50\n'
+                    '2026-01-02,Food,1e17\n2026-01-03,Food,2.00\n')
+    
+    report = import_file(db, str(path))
+    
+    assert (report.rows_imported, report.rows_rejected) == (2, 1)
+    assert 'too large' in report.rejects[0][1]
+    assert db.count_expenses() == 2
@@ -0,0 +1,89 @@
+"""Grouped statistics agree with plain per-category NumPy, refunds included."""
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import ExpenseAnalytics as analytics  # noqa: E402
+from ExpenseAnalytics import ExpenseColumns  # noqa: E402
+
+CATEGORIES = ('Food', 'Bills', 'Other')
+
+
+def make_columns(codes, cents):
+    count = len(cents)
+    return ExpenseColumns(np.arange(1, count + 1, dtype=np.int64),
+                          np.full(count, np.datetime64('2026-03-01')),
+                          np.asarray(codes, dtype=np.int16),
+                          np.asarray(cents, dtype=np.int64), CATEGORIES)
+
+
+def by_category(columns):
+    return {name: columns.cents[columns.codes == code]
+            for code, name in enumerate(CATEGORIES) if (columns.codes == code).any()}
+
+
+@pytest.mark.parametrize('cents', [
+    [-500, 1200, 300, 800, -50, 2000, 450],               # refunds in the mix
+    [-(1 << 47), 5, 10, 1 << 47, -3, 7, 8],               # too wide to pack
+])
+def test_group_sort_orders_within_each_group(cents):
+    codes = np.array([0, 1, 0, 2, 1, 0, 1], dtype=np.int16)
+    values = np.array(cents, dtype=np.int64)
+    ordered, starts, sizes = analytics._group_sort(codes, values, 4)
+    assert list(sizes) == [3, 3, 1, 0]
+    for code in range(3):
+        group = ordered[starts[code]:starts[code] + sizes[code]]
+        assert list(group) == sorted(values[codes == code])
+
+
+def test_percentiles_with_a_refund_match_numpy():
+    rng = np.random.default_rng(7)
+    codes = rng.integers(0, 3, 500)
+    cents = rng.integers(100, 10_000, 500)
+    cents[::37] *= -1  # refunds
+    columns = make_columns(codes, cents)
+    
+    found = analytics.category_percentiles(columns)
+    
+    for name, amounts in by_category(columns).items():
+        expected = np.percentile(amounts, [100 * p for p in analytics.PERCENTILES])
+        assert found[name] == pytest.approx(list(expected))
+
+
+def test_single_negative_amount_does_not_leak_into_other_groups():
+    # Before the fix the refund's sign bits sorted it after every group
+    columns = make_columns([0, 0, 0, 1, 1, 1], [-700, 100, 200, 5000, 6000, 7000])
+    medians = analytics.category_percentiles(columns, (0.5,))
+    assert medians == {'Food': [100.0], 'Bills': [6000.0]}
+
+
+def test_outliers_with_refunds_match_a_direct_computation():
+    rng = np.random.default_rng(11)
+    codes = rng.integers(0, 3, 300)
+    cents = rng.integers(900, 1100, 300)
+    cents[[5, 50, 150]] = [-40_000, 90_000, -2_000]
+    columns = make_columns(codes, cents)
+    
+    flagged = analytics.find_outliers(columns, limit=100)
+    
+    expected = set()
+    for code, name in enumerate(CATEGORIES):
+        rows = np.flatnonzero(columns.codes == code)
+        amounts = columns.cents[rows]
+        median = np.median(amounts)
+        mad = np.median(np.abs(amounts - median))
+        scores = 0.6745 * (amounts - median) / mad
+        expected |= {int(columns.ids[row]) for row, score in zip(rows, scores)
+                     if score > analytics.OUTLIER_THRESHOLD}
+    assert {expense_id for expense_id, *_ in flagged} == expected
+    assert 51 in expected
+
+
+def test_loaded_columns_include_refunds(db):
+    db.add_expense('2026-03-01', 'Food', '12.00')
+    db.add_expense('2026-03-02', 'Food', '-4.00', 'refund')
+    db.add_expense('2026-03-03', 'Food', '20.00')
+    columns = analytics.load_columns(db)
+    assert sorted(columns.cents) == [-400, 1200, 2000]
+    assert analytics.category_percentiles(columns, (0.5,))['Food'] == [1200.0]
@@ -0,0 +1,110 @@
+"""Archiving a month moves its rows out of the live table, not out of view."""
+
+import os
+from decimal import Decimal
+
+import pytest
+
+from ExpenseTracker import ExpenseFilter
+
+MONTHS = ('2026-01', '2026-02', '2026-03')
+
+
+@pytest.fixture
+def filled(db):
+    for month in MONTHS:
+        for day in range(1, 11):
+            db.add_expense(f'{month}-{day:02d}', ('Food', 'Transport')[day % 2],
+                           f'{day}.{day:02d}', f'coffee {month} {day}')
+    return db
+
+
+def live_rows(db):
+    with db.read_connection() as conn:
+        return conn.execute('SELECT * FROM expenses ORDER BY id').fetchall()
+
+
+def observed(db):
+    # Everything a reader of the database can see
+    return {
+        'total': db.get_total_expenses(),
+        'by_category': db.get_total_by_category(),
+        'february': db.get_monthly_total(2026, 2),
+        'count': db.count_expenses(),
+        'count_food': db.count_expenses(ExpenseFilter(categories={'Food'})),
+        'all': db.get_all_expenses(),
+        'pages': walk_pages(db),
+        'filtered': list(db.iter_expenses(ExpenseFilter(start_date='2026-02-05',
+                                                        end_date='2026-03-04'))),
+        'search': sorted(e.id for e in db.search_expenses('coffee', 100)),
+        'by_id': db.get_expense_by_id(15),
+    }
+
+
+def walk_pages(db, limit=7):
+    pages, after = [], None
+    while True:
+        page = db.get_expenses_page(after=after, limit=limit)
+        if not page:
+            return pages
+        pages.append(page)
+        after = (page[-1].date, page[-1].id)
+
+
+def test_archived_month_reads_the_same(filled):
+    before = observed(filled)
+    
+    assert filled.archive_month('2026-02') == 10
+    
+    assert [p.month for p in filled.archived_partitions()] == ['2026-02']
+    assert len(live_rows(filled)) == 20
+    assert observed(filled) == before
+    assert filled.verify_summaries() == []
+
+
+def test_restore_brings_back_exactly_the_original_rows(filled):
+    original = live_rows(filled)
+    filled.archive_month('2026-02')
+    
+    assert filled.restore_month('2026-02') == 10
+    
+    assert live_rows(filled) == original
+    assert filled.archived_partitions() == []
+    assert os.listdir(filled.archive_dir) == []
+    assert filled.verify_summaries() == []
+
+
+def test_updating_an_archived_row_restores_its_month(filled):
+    original = live_rows(filled)
+    filled.archive_month('2026-02')
+    
+    assert filled.update_expense(15, '2026-02-05', 'Bills', '99.00', 'moved')
+    
+    assert filled.archived_partitions() == []
+    rows = live_rows(filled)
+    assert len(rows) == 30
+    assert [row for row in rows if row[0] != 15] == [row for row in original if row[0] != 15]
+    assert filled.get_expense_by_id(15).category == 'Bills'
+    assert filled.verify_summaries() == []
+
+
+def test_deleting_an_archived_row_restores_the_rest_of_its_month(filled):
+    filled.archive_month('2026-02')
+    
+    assert filled.delete_expense(15)
+    
+    assert filled.archived_partitions() == []
+    assert filled.count_expenses() == 29
+    assert filled.get_expense_by_id(15) is None
+
+
+def test_rows_added_after_archiving_join_the_partition(filled):
+    filled.archive_month('2026-02')
+    new_id = filled.add_expense('2026-02-20', 'Food', '1.00')
+    before = observed(filled)
+    
+    assert filled.archive_month('2026-02') == 11
+    
+    assert observed(filled) == before
+    assert filled.get_expense_by_id(new_id).amount == Decimal('1.00')
+    assert len(os.listdir(filled.archive_dir)) == 1
@@ -0,0 +1,133 @@
+"""update_many, recategorize and delete_many: one transaction, exact totals."""
+
+import sqlite3
+from decimal import Decimal
+
+import pytest
+
+from ExpenseTracker import BULK_EVENT_ROWS
+
+
+@pytest.fixture
+def ids(db):
+    return [db.add_expense(f'2026-0{1 + n % 3}-{1 + n % 28:02d}', 'Food', f'{n + 1}.00',
+                           f'item {n}')
+            for n in range(BULK_EVENT_ROWS + 10)]
+
+
+@pytest.fixture
+def events(db):
+    received = []
+    db.add_listener(received.append)
+    return received
+
+
+def snapshot(db):
+    return db.get_all_expenses(), db.get_total_by_category(), db.get_monthly_total(2026, 2)
+
+
+def rewrite(expense_id, amount='7.00'):
+    return expense_id, '2026-02-10', 'Bills', amount, 'rewritten'
+
+
+@pytest.mark.parametrize('bad', ['ten', 'nan', '1e17'])
+def test_update_many_is_all_or_nothing_on_a_bad_amount(db, ids, events, bad):
+    before = snapshot(db)
+    
+    with pytest.raises(ValueError):
+        db.update_many([rewrite(ids[0]), rewrite(ids[1], bad), rewrite(ids[2])])
+    
+    assert snapshot(db) == before
+    assert events == []
+
+
+def test_update_many_rolls_back_when_a_later_row_fails(db, ids, events):
+    before = snapshot(db)
+    
+    with pytest.raises(sqlite3.IntegrityError):
+        db.update_many([rewrite(ids[0]), (ids[1], None, 'Bills', '1', '')])
+    
+    assert snapshot(db) == before
+    assert events == []
+    assert db.verify_summaries() == []
+
+
+def test_missing_ids_are_skipped_and_not_counted(db, ids):
+    assert db.update_many([rewrite(ids[0]), rewrite(999_999), rewrite(ids[1])]) == 2
+    assert db.recategorize([ids[2], 999_999], 'Transport') == 1
+    assert db.delete_many([ids[3], 999_999, ids[3]]) == 1
+    
+    assert db.get_expense_by_id(ids[0]).category == 'Bills'
+    assert db.get_expense_by_id(ids[2]).category == 'Transport'
+    assert db.get_expense_by_id(ids[3]) is None
+    assert db.count_expenses() == len(ids) - 1
+    assert db.verify_summaries() == []
+
+
+def test_batch_edits_keep_totals_exact(db, ids):
+    db.update_many([rewrite(expense_id, f'0.{n:02d}') for n, expense_id in enumerate(ids[:20])])
+    db.recategorize(ids[20:40], 'Transport')
+    db.delete_many(ids[40:45])
+    
+    totals = dict(db.get_total_by_category())
+    assert totals['Bills'] == sum(Decimal(f'0.{n:02d}') for n in range(20))
+    assert totals['Transport'] == sum(Decimal(n + 1) for n in range(20, 40))
+    assert db.count_expenses() == len(ids) - 5
+    assert db.verify_summaries() == []
+
+
+def test_archived_rows_are_restored_before_the_write(db, ids):
+    db.archive_month('2026-02')
+    archived = [expense_id for expense_id in ids
+                if db.get_expense_by_id(expense_id).date.startswith('2026-02')]
+    
+    assert db.recategorize(archived[:2], 'Transport') == 2
+    assert db.archived_partitions() == []
+    
+    db.archive_month('2026-03')
+    march = [expense_id for expense_id in ids
+             if db.get_expense_by_id(expense_id).date.startswith('2026-03')]
+    assert db.update_many([rewrite(march[0])]) == 1
+    db.archive_month('2026-01')
+    january = [expense_id for expense_id in ids
+               if db.get_expense_by_id(expense_id).date.startswith('2026-01')]
+    assert db.delete_many(january[:3]) == 3
+    
+    assert db.archived_partitions() == []
+    assert db.get_expense_by_id(archived[0]).category == 'Transport'
+    assert db.get_expense_by_id(march[0]).category == 'Bills'
+    assert db.count_expenses() == len(ids) - 3
+    assert db.verify_summaries() == []
+
+
+@pytest.mark.parametrize('size', [1, BULK_EVENT_ROWS])
+def test_small_batches_send_an_event_per_row(db, ids, events, size):
+    db.update_many([rewrite(expense_id) for expense_id in ids[:size]])
+    db.recategorize(ids[:size], 'Transport')
+    db.delete_many(ids[:size])
+    
+    assert [e.action for e in events] == ['update'] * 2 * size + ['delete'] * size
+    first_update, first_move, first_delete = events[0], events[size], events[2 * size]
+    assert first_update.old_row.category == 'Food'
+    assert first_update.row.category == 'Bills'
+    assert first_move.row.category == 'Transport'
+    assert first_move.old_row.category == 'Bills'
+    assert first_delete.old_row.id == ids[0]
+    assert len({e.version for e in events[:size]}) == 1  # one commit
+
+
+def test_large_batches_send_one_bulk_event(db, ids, events):
+    size = BULK_EVENT_ROWS + 1
+    
+    db.update_many([rewrite(expense_id) for expense_id in ids[:size]])
+    db.recategorize(ids[:size], 'Transport')
+    db.delete_many(ids[:size])
+    
+    assert [e.action for e in events] == ['bulk'] * 3
+    assert db.verify_summaries() == []
+
+
+def test_nothing_changed_sends_nothing(db, ids, events):
+    assert db.delete_many([999_998, 999_999] * BULK_EVENT_ROWS) == 0
+    assert db.update_many([]) == 0
+    assert events == []
@@ -0,0 +1,47 @@
+"""Budget windows stay within the calendar, however long they are."""
+
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+from ExpenseBudgets import BudgetEngine
+from ExpenseTracker import MAX_BUDGET_DAYS
+
+TODAY = date(2026, 3, 15)
+
+
+@pytest.mark.parametrize('days', [0, -5, MAX_BUDGET_DAYS + 1, 1_000_000])
+def test_custom_windows_outside_the_limits_are_refused(db, days):
+    with pytest.raises(ValueError, match='window'):
+        db.add_budget('Food', 'custom', '100', days)
+    assert db.get_budgets() == []
+
+
+def test_longest_custom_window_covers_its_days(db):
+    db.add_expense('2016-03-20', 'Food', '40.00')  # inside 3660 days back
+    db.add_expense('2016-03-01', 'Food', '99.00')  # outside
+    db.add_expense('2026-03-15', 'Food', '2.00')
+    engine = BudgetEngine(db, today=lambda: TODAY)
+    
+    engine.add_budget('Food', 'custom', '100', MAX_BUDGET_DAYS)
+    
+    [status] = engine.status()
+    assert status.spent == Decimal('42.00')
+    engine.close()
+
+
+def test_a_stored_window_reaching_before_year_one_is_clamped(db):
+    db.add_expense('2026-03-10', 'Food', '5.00')
+    # As a database written before the limit existed could hold
+    with db.transaction() as conn:
+        conn.execute('''
+            INSERT INTO budgets (category, period, days, limit_cents, warn_at)
+            VALUES ('Food', 'custom', 1000000, 10000, 0.8)
+        ''')
+    
+    engine = BudgetEngine(db, today=lambda: TODAY)
+    
+    [status] = engine.status()
+    assert status.spent == Decimal('5.00')
+    engine.close()
@@ -0,0 +1,116 @@
+"""ModernCalculator's handlers, driven headlessly through stand-in widgets."""
+
+from decimal import Decimal
+
+import pytest
+
+tk = pytest.importorskip('tkinter')
+
+import Calculator  # noqa: E402
+from CalculatorEngine import CalculationHistory, ExpressionEngine, LivePreview  # noqa: E402
+
+
+class FakeDisplay:
+    """The Entry and its StringVar: every change fires the write trace"""
+
+    def __init__(self):
+        self.text = ''
+        self.cursor = 0
+        self.on_write = None
+
+    def get(self):
+        return self.text
+
+    def set(self, text):
+        self.text = text
+        self.on_write()
+
+    def insert(self, index, text):
+        at = self.cursor if index == tk.INSERT else len(self.text)
+        self.cursor = at + len(text)
+        self.set(self.text[:at] + text + self.text[at:])
+
+    def icursor(self, index):
+        self.cursor = len(self.text)
+
+    def focus_set(self):
+        pass
+
+
+class FakeLabel:
+    text = ''
+
+    def config(self, text):
+        self.text = text
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    errors = []
+    monkeypatch.setattr(Calculator.mb, 'showerror', lambda *args: errors.append(args))
+    app = Calculator.ModernCalculator.__new__(Calculator.ModernCalculator)
+    app.engine = ExpressionEngine()
+    app.preview = LivePreview(app.engine)
+    app.history = CalculationHistory(str(tmp_path / 'history.json'),
+                                     precision=app.engine.precision)
+    app.history_index = None
+    app.display = app.entry = FakeDisplay()
+    app.display.on_write = app.update_preview
+    app.preview_label = FakeLabel()
+    app.errors = errors
+    return app
+
+
+def type_in(app, text):
+    for char in text:
+        app.button_click(char)
+
+
+def test_keys_append_and_preview_follows(app):
+    type_in(app, '12+3*(2')
+    assert app.entry.get() == '12+3*(2'
+    assert app.preview_label.text == '= 18'
+    app.button_clear()
+    type_in(app, '7*6')
+    app.button_equal()
+    assert app.entry.get() == '42'
+    assert app.preview_label.text == '7*6 ='
+
+
+def test_out_of_range_literal_never_raises(app):
+    type_in(app, '1e999999999')
+    assert app.preview_label.text == ''
+    app.button_equal()
+    assert app.errors and 'out of range' in app.errors[0][1]
+    assert app.entry.get() == ''
+
+
+def test_repeated_calculation_comes_from_history(app, monkeypatch):
+    type_in(app, '2**100')
+    app.button_equal()
+    first = app.entry.get()
+    monkeypatch.setattr(app.engine, 'evaluate', pytest.fail)
+    app.button_clear()
+    type_in(app, '2**100')
+    app.button_equal()
+    assert app.entry.get() == first
+    # and is still there next time the calculator starts
+    reloaded = CalculationHistory(app.history.path, precision=app.engine.precision)
+    assert reloaded.lookup('2**100') == Decimal(first)
+
+
+def test_up_and_down_step_through_history(app):
+    for expression in ('1+1', '2+2', '3+3'):
+        app.button_clear()
+        type_in(app, expression)
+        app.button_equal()
+    app.button_clear()
+    app.recall(1)
+    assert app.entry.get() == ''
+    app.recall(-1)
+    app.recall(-1)
+    assert app.entry.get() == '2+2'
+    app.recall(1)
+    assert app.entry.get() == '3+3'
+    app.recall(1)
+    assert app.entry.get() == ''
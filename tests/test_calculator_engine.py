@@ -0,0 +1,105 @@
+"""The expression engine: safe evaluation, exact decimals, bounded input."""
+
+from decimal import Decimal
+
+import pytest
+
+import CalculatorEngine
+from CalculatorEngine import ExpressionEngine, ExpressionError, LivePreview, format_result
+
+
+@pytest.fixture(scope='module')
+def engine():
+    return ExpressionEngine()
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('0.1 + 0.2', '0.3'),
+    ('2 * (3 + 4) ** 2', '98'),
+    ('-2 ** 2', '-4'),
+    ('2 ** 3 ** 2', '512'),
+    ('7 // 2 + 7 % 2', '4'),
+    ('max(1, 5, 3) + min(4, 2)', '7'),
+    ('log(8, 2)', '3'),
+    ('2 ^ 10', '1024'),
+])
+def test_evaluates_exactly(engine, text, expected):
+    assert format_result(engine.evaluate(text)) == expected
+
+
+@pytest.mark.parametrize('text', ['2 +', '(1', '1 / 0', 'sqrt(-1)', 'foo(1)',
+                                  '__import__("os")', 'x', '2 3', ''])
+def test_bad_input_raises_expression_error(engine, text):
+    with pytest.raises(ExpressionError):
+        engine.evaluate(text)
+
+
+@pytest.mark.parametrize('text, position', [('1e999999999', 0), ('2 * 1e-9999999', 4),
+                                            ('1E+1000000', 0)])
+def test_number_literals_outside_the_exponent_range_are_refused(engine, text, position):
+    with pytest.raises(ExpressionError) as error:
+        engine.evaluate(text)
+    assert error.value.position == position
+
+
+def test_results_too_large_are_expression_errors(engine):
+    with pytest.raises(ExpressionError, match='too large'):
+        engine.evaluate('9e999999 * 10')
+
+
+def test_format_result_keeps_every_digit_at_high_precision():
+    value = ExpressionEngine(precision=50).evaluate('1 / 3')
+    assert format_result(value) == '0.' + '3' * 50
+    assert format_result(Decimal('1.2300')) == '1.23'
+    assert format_result(Decimal('1E+999999')) == '1E+999999'
+
+
+def test_live_preview_refuses_the_same_literals(engine):
+    preview = LivePreview(engine)
+    assert preview.update('2 + 1e999999999') is None
+    assert 'out of range' in str(preview.error)
+    assert preview.update('2 + 1e9') == Decimal('1000000002')
+
+
+def test_batch_reports_a_bad_line_and_carries_on(tmp_path):
+    source = tmp_path / 'in.txt'
+    source.write_text('1 + 1\n1e999999999\n# note\n\n1 / 0\n2 ** 0.5\n')
+    results = tmp_path / 'out.txt'
+    assert CalculatorEngine.main([str(source), '-o', str(results)]) == 1
+    lines = results.read_text().splitlines()
+    assert lines[0] == '2'
+    assert lines[1].startswith('error: number 1e999999999 is out of range')
+    assert lines[2:4] == ['# note', '']
+    assert lines[4] == 'error: division by zero'
+    assert lines[5].startswith('1.41421356')
+
+
+# Chains are built by the parser's loop, not its recursion; the tree is
+# still as deep as the chain is long
+LONG_SUM = '+'.join(['1'] * 2000)
+LONG_MIXED = '+'.join(['x * 2 - 1'] * 1000)
+
+
+def test_long_operator_chains_evaluate(engine):
+    assert engine.evaluate(LONG_SUM) == 2000
+    assert engine.evaluate(LONG_MIXED, {'x': 3}) == 5000
+    assert engine.compile(LONG_MIXED).names == {'x'}
+    assert list(engine.evaluate_many([LONG_SUM, '1 / 0']))[0] == 2000
+    assert LivePreview(engine).update(LONG_SUM) == 2000
+
+
+def test_deep_nesting_is_still_refused(engine):
+    with pytest.raises(ExpressionError, match='nested too deeply'):
+        engine.evaluate('(' * 300 + '1' + ')' * 300)
+    with pytest.raises(ExpressionError, match='nested too deeply'):
+        engine.evaluate('-' * 300 + '1')
+    with pytest.raises(ExpressionError, match='nested too deeply'):
+        engine.evaluate('**'.join(['1'] * 300))
+
+
+def test_batch_evaluates_long_chains(tmp_path):
+    source = tmp_path / 'in.txt'
+    source.write_text(f'{LONG_SUM}\n{"-".join(["1"] * 2000)}\n')
+    results = tmp_path / 'out.txt'
+    assert CalculatorEngine.main([str(source), '-o', str(results)]) == 0
+    assert results.read_text().splitlines() == ['2000', '-1998']
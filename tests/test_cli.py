@@ -0,0 +1,84 @@
+"""The headless command line: no Tk, validated input, bounded imports."""
+
+import csv
+import subprocess
+import sys
+from decimal import Decimal
+from pathlib import Path
+
+import pytest
+
+import ExpenseCLI
+from ExpenseImporter import import_file
+from ExpenseTracker import BULK_BATCH_SIZE
+
+REPO = Path(__file__).resolve().parent.parent
+
+
+def run_cli(db_path, *args):
+    return ExpenseCLI.main(['--db', str(db_path), *args])
+
+
+def test_cli_never_imports_tkinter():
+    code = ('import sys, time; started = time.perf_counter(); import ExpenseCLI; '
+            'print("tkinter" in sys.modules, time.perf_counter() - started)')
+    out = subprocess.run([sys.executable, '-c', code], cwd=REPO, capture_output=True,
+                         text=True, check=True).stdout.split()
+    assert out[0] == 'False'
+    assert float(out[1]) < 0.5
+
+
+def test_add_records_the_expense(tmp_path, capsys):
+    assert run_cli(tmp_path / 'e.db', 'add', 'Food', '12.50', 'Lunch',
+                   '--date', '2026-03-01') == 0
+    assert 'Added expense #1' in capsys.readouterr().out
+    run_cli(tmp_path / 'e.db', 'totals')
+    assert '12.50' in capsys.readouterr().out
+
+
+@pytest.mark.parametrize('amount', ['-5', '0', 'NaN', 'inf', 'twelve', '1e'])
+def test_add_rejects_bad_amounts(tmp_path, capsys, amount):
+    with pytest.raises(SystemExit) as exit:
+        run_cli(tmp_path / 'e.db', 'add', 'Food', amount)
+    assert exit.value.code != 0
+    assert 'amount' in capsys.readouterr().err
+    # Nothing reached the database
+    assert run_cli(tmp_path / 'e.db', 'list') == 0
+    assert capsys.readouterr().out.strip() == 'No expenses found'
+
+
+def test_import_runs_a_bounded_number_of_statements(db, tmp_path):
+    # Whole batches, which all take the set-based path
+    rows = 2 * BULK_BATCH_SIZE
+    path = tmp_path / 'statement.csv'
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['date', 'category', 'amount', 'description'])
+        for i in range(rows):
+            writer.writerow([f'2026-{i % 12 + 1:02d}-{i % 28 + 1:02d}', 'food',
+                             f'${i % 500 + 1}.25', f'row {i}'])
+        writer.writerow(['2026-01-01', 'food', '-3', 'refund rejected'])
+    
+    traced = []
+    db.writer.set_trace_callback(traced.append)
+    report = import_file(db, str(path))
+    db.writer.set_trace_callback(None)
+    # Lines starting '--' are SQLite's own sub-statements (FTS5 internals,
+    # trigger bodies); the rest are what the import path issued
+    statements = [sql.strip() for sql in traced if not sql.startswith('--')]
+    
+    assert report.rows_imported == rows
+    assert report.rows_rejected == 1
+    batches = -(-rows // BULK_BATCH_SIZE)
+    assert sum(sql == 'COMMIT' for sql in statements) <= batches
+    # Apart from one INSERT per row, a few statements per batch: the
+    # summary and search work runs once per batch. (A trigger firing per
+    # row would trace the row's INSERT again.)
+    per_row = [sql for sql in statements if sql.startswith('INSERT INTO expenses ')]
+    assert len(per_row) == rows
+    assert not any(sql.startswith('-- TRIGGER') for sql in traced)
+    assert len(statements) - len(per_row) <= 25 * batches
+    
+    assert db.count_expenses() == rows
+    assert db.verify_summaries() == []
+    assert db.get_total_expenses() == sum(Decimal(f'{i % 500 + 1}.25') for i in range(rows))
@@ -0,0 +1,159 @@
+"""BackgroundExecutor against a fake Tk scheduler: callbacks run only when
+the scheduler fires, on the thread that pumps it."""
+
+import sys
+import threading
+import time
+
+import pytest
+
+from ExpenseTracker import BackgroundExecutor
+
+
+class FakeScheduler:
+    """Stands in for the Tk root: after() queues, pump() runs what is due"""
+
+    def __init__(self):
+        self.calls = []
+        self.delays = []
+
+    def after(self, ms, func):
+        self.delays.append(ms)
+        self.calls.append(func)
+
+    def pump(self, until=lambda: False, timeout=5):
+        deadline = time.monotonic() + timeout
+        while True:
+            calls, self.calls = self.calls, []
+            for func in calls:
+                func()
+            if until() or time.monotonic() > deadline:
+                return
+            time.sleep(0.001)
+
+
+@pytest.fixture
+def scheduler():
+    return FakeScheduler()
+
+
+@pytest.fixture
+def executor(scheduler):
+    busy = []
+    executor = BackgroundExecutor(scheduler, on_busy=busy.append)
+    executor.busy_changes = busy
+    yield executor
+    executor.shutdown()
+
+
+def test_result_delivered_on_pumping_thread(scheduler, executor):
+    results = []
+    executor.submit(lambda: 6 * 7,
+                    on_done=lambda value: results.append((value, threading.current_thread())))
+    scheduler.pump(until=lambda: results)
+    assert results == [(42, threading.current_thread())]
+    assert not executor.busy
+    assert executor.busy_changes == [True, False]
+
+
+def test_nothing_delivered_without_the_scheduler(scheduler, executor):
+    results = []
+    future = executor.submit(lambda: 1, on_done=results.append)
+    future.result(timeout=5)
+    time.sleep(0.01)
+    assert results == []
+    scheduler.pump(until=lambda: results)
+    assert results == [1]
+
+
+def test_error_goes_to_on_error(scheduler, executor):
+    errors = []
+    executor.submit(lambda: 1 / 0, on_done=pytest.fail, on_error=errors.append)
+    scheduler.pump(until=lambda: errors)
+    assert isinstance(errors[0], ZeroDivisionError)
+    assert not executor.busy
+
+
+def test_unhandled_error_reaches_excepthook(scheduler, executor, monkeypatch):
+    hooked = []
+    monkeypatch.setattr(sys, 'excepthook', lambda *info: hooked.append(info))
+    executor.submit(lambda: 1 / 0)
+    scheduler.pump(until=lambda: hooked)
+    assert hooked[0][0] is ZeroDivisionError
+
+
+def test_failing_callback_reaches_excepthook(scheduler, executor, monkeypatch):
+    hooked, results = [], []
+    monkeypatch.setattr(sys, 'excepthook', lambda *info: hooked.append(info))
+    executor.submit(lambda: 1, on_done=lambda value: 1 / 0)
+    executor.submit(lambda: 2, on_done=results.append)
+    scheduler.pump(until=lambda: hooked and results)
+    assert hooked[0][0] is ZeroDivisionError
+    assert results == [2]
+
+
+def test_newer_task_with_same_key_supersedes(scheduler, executor):
+    release = threading.Event()
+    results = []
+    first = executor.submit(lambda: release.wait(5) and 'old', on_done=results.append,
+                            key='refresh')
+    executor.submit(lambda: 'new', on_done=results.append, key='refresh')
+    release.set()
+    first.result(timeout=5)
+    scheduler.pump(until=lambda: not executor.busy)
+    assert results == ['new']
+    assert not executor.pending('refresh')
+
+
+def test_cancel_drops_callbacks(scheduler, executor):
+    release = threading.Event()
+    results = []
+    future = executor.submit(lambda: release.wait(5), on_done=results.append, key='load')
+    assert executor.pending('load')
+    executor.cancel('load')
+    assert not executor.pending('load')
+    release.set()
+    future.result(timeout=5)
+    scheduler.pump(until=lambda: not executor.busy)
+    assert results == []
+
+
+def test_post_from_another_thread_is_delivered_without_a_submit(scheduler, executor):
+    delivered = []
+    poster = threading.Thread(
+        target=executor.post,
+        args=(lambda: delivered.append(threading.current_thread()),))
+    poster.start()
+    poster.join()
+    scheduler.pump(until=lambda: delivered)
+    assert delivered == [threading.current_thread()]
+
+
+def test_polls_fast_while_busy_and_slowly_when_idle(scheduler, executor):
+    assert scheduler.delays == [BackgroundExecutor.IDLE_POLL_MS]
+    results = []
+    executor.submit(lambda: 1, on_done=results.append)
+    assert scheduler.delays[-1] == BackgroundExecutor.POLL_MS
+    scheduler.pump(until=lambda: results)
+    scheduler.pump(until=lambda: True)
+    assert scheduler.delays[-1] == BackgroundExecutor.IDLE_POLL_MS
+    # Only one poll is ever live: the one superseded returns at once
+    scheduler.calls.clear()
+    executor.post(lambda: None)
+    executor.post(lambda: None)
+    assert len(scheduler.calls) <= 1
+
+
+def test_shutdown_stops_polling_and_cancels_queued_work(scheduler):
+    executor = BackgroundExecutor(scheduler, max_workers=1)
+    release = threading.Event()
+    results = []
+    executor.submit(release.wait, key='running')
+    queued = executor.submit(lambda: 'late', on_done=results.append, key='queued')
+    threading.Timer(0.05, release.set).start()
+    executor.shutdown()
+    assert queued.cancelled()
+    scheduler.pump(until=lambda: True)
+    scheduler.pump(until=lambda: True)
+    assert scheduler.calls == []
+    assert results == []
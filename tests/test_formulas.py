@@ -0,0 +1,20 @@
+"""Formulas compiled to NumPy agree with the Decimal engine."""
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from ExpenseFormulas import compile_formula  # noqa: E402
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('fee = min(amount * 0.029 + 0.30, 10)', [0.329, 10.0]),
+    ('amount - amount / 4 * 2 + 1', [1.5, 501.0]),
+    ('+'.join(['amount'] * 1400), [1400.0, 1400000.0]),  # deeper than recursion goes
+])
+def test_vector_formula(text, expected):
+    formula = compile_formula(text)
+    
+    result = formula({'amount': np.array([1.0, 1000.0])})
+    
+    assert result == pytest.approx(expected)
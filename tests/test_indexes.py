@@ -0,0 +1,94 @@
+"""Every public list, filter and total query is answered from an index."""
+
+import pytest
+
+from ExpenseTracker import ExpenseDatabase, ExpenseFilter
+
+
+@pytest.fixture
+def issued(db):
+    """The (sql, params) of every expense query db runs, as it runs them"""
+    statements = []
+    select = db._select
+
+    def recording(conn, sql, params=()):
+        statements.append((sql, params))
+        return select(conn, sql, params)
+    db._select = recording
+    return statements
+
+
+def plan(db, sql, params=()):
+    return ' | '.join(db.query_plan(sql, params))
+
+
+def assert_only_query_uses(db, issued, index):
+    # One statement, answered from index with no full scan and no sort
+    assert len(issued) == 1
+    steps = db.query_plan(*issued[0])
+    assert any(f'USING INDEX {index}' in step or f'USING COVERING INDEX {index}' in step
+               for step in steps), steps
+    assert not any(step.startswith('SCAN') and 'USING' not in step for step in steps), steps
+    assert not any('TEMP B-TREE' in step for step in steps), steps
+
+
+def test_list_is_read_in_index_order(db, issued):
+    db.get_all_expenses()
+    assert_only_query_uses(db, issued, 'idx_expenses_date_id')
+
+
+@pytest.mark.parametrize('page', [{}, {'after': ('2026-03-01', 10)},
+                                  {'before': ('2026-03-01', 10)}])
+def test_pages_seek_the_date_index(db, issued, page):
+    db.get_expenses_page(**page)
+    assert_only_query_uses(db, issued, 'idx_expenses_date_id')
+
+
+def test_category_filter_uses_category_date_index(db, issued):
+    db.get_expenses_by_category('Food')
+    assert_only_query_uses(db, issued, 'idx_expenses_category_date')
+    assert '(category=?)' in plan(db, *issued[0])
+
+
+def test_date_range_uses_date_index(db, issued):
+    db.get_expenses_by_date_range('2026-01-01', '2026-01-31')
+    assert_only_query_uses(db, issued, 'idx_expenses_date_id')
+    assert 'date>? AND date<?' in plan(db, *issued[0])
+
+
+def test_filtered_stream_uses_an_index(db, issued):
+    list(db.iter_expenses(ExpenseFilter(start_date='2026-01-01', end_date='2026-01-31')))
+    assert_only_query_uses(db, issued, 'idx_expenses_date_id')
+
+
+def test_category_amount_aggregate_is_covered(db):
+    where, params = ExpenseFilter(categories={'Food'}, min_amount=50).compile()
+    detail = plan(db, f'SELECT COUNT(*), SUM(amount_cents) FROM expenses {where}', params)
+    assert 'USING COVERING INDEX idx_expenses_category_amount' in detail, detail
+
+
+def test_lookup_by_id_uses_the_primary_key(db, issued):
+    db.get_expense_by_id(1)
+    assert 'USING INTEGER PRIMARY KEY' in plan(db, *issued[0])
+
+
+@pytest.mark.parametrize('call', [
+    lambda db: db.get_monthly_total(2026, 1),
+    lambda db: db.get_daily_total('2026-01-15'),
+    lambda db: db.get_monthly_total_by_category(2026, 1),
+    lambda db: db.get_yearly_total(2026),
+])
+def test_totals_read_summary_tables_by_key(call):
+    # In memory every read runs on the writer, so one trace sees them all
+    db = ExpenseDatabase(':memory:', cache_size=0)
+    statements = []
+    db.writer.set_trace_callback(statements.append)
+    call(db)
+    db.writer.set_trace_callback(None)
+    selects = [sql for sql in statements if sql.lstrip().upper().startswith('SELECT')
+               and 'archived_partitions' not in sql]
+    assert selects
+    for sql in selects:
+        detail = plan(db, sql)
+        assert 'expenses ' not in detail and 'USING PRIMARY KEY' in detail, detail
+    db.close()
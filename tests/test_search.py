@@ -0,0 +1,54 @@
+"""Full-text search, and that it never waits on its own read pool."""
+
+import threading
+
+import pytest
+
+from ExpenseTracker import ExpenseDatabase
+
+
+def run_in_threads(count, target, timeout=10):
+    # The threads that had not finished after timeout seconds
+    threads = [threading.Thread(target=target, daemon=True) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout)
+    return [thread for thread in threads if thread.is_alive()]
+
+
+@pytest.fixture
+def small_pool(tmp_path):
+    db = ExpenseDatabase(str(tmp_path / 'expenses.db'), read_pool_size=1, cache_size=0)
+    db.add_expense('2026-01-02', 'Food', '4.50', 'Coffee at Starbucks')
+    db.add_expense('2026-01-03', 'Transport', '2.75', 'Bus fare')
+    yield db
+    db.close()
+
+
+def test_search_matches_prefixes_of_every_word(db):
+    db.add_expense('2026-01-02', 'Food', '4.50', 'Coffee at Starbucks')
+    db.add_expense('2026-01-03', 'Food', '9.00', 'Coffee beans')
+    db.add_expense('2026-01-04', 'Transport', '2.75', 'Bus fare')
+    assert [row.description for row in db.search_expenses('cof sta')] == ['Coffee at Starbucks']
+    assert len(db.search_expenses('coffee')) == 2
+    assert db.search_expenses('   ') == []
+
+
+def test_search_holds_one_reader_at_a_time(small_pool):
+    results = []
+    stuck = run_in_threads(1, lambda: results.append(small_pool.search_expenses('coffee')))
+    assert not stuck, "search_expenses waited for a second pooled reader"
+    assert [row.description for row in results[0]] == ['Coffee at Starbucks']
+
+
+def test_more_searching_threads_than_readers(small_pool):
+    results = []
+    
+    def search():
+        for _ in range(20):
+            results.append(len(small_pool.search_expenses('bus')))
+    
+    assert not run_in_threads(8, search)
+    assert results == [1] * 160
+    assert small_pool.has_search_index
@@ -0,0 +1,176 @@
+"""The HTTP service over a real socket: paging, revalidation, bulk and errors."""
+
+import http.client
+import json
+import threading
+
+import pytest
+
+from ExpenseServer import ExpenseServer
+
+CATEGORIES = ('Food', 'Transport', 'Bills')
+
+
+@pytest.fixture
+def server(db):
+    server = ExpenseServer(db, port=0)
+    thread = threading.Thread(target=server.serve_forever, args=(0.02,), daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+@pytest.fixture
+def client(server):
+    conn = http.client.HTTPConnection(*server.server_address, timeout=10)
+    
+    def request(method, path, body=None, headers=None):
+        if body is not None and not isinstance(body, (bytes, str)):
+            body = json.dumps(body)
+        conn.request(method, path, body, headers or {})
+        response = conn.getresponse()
+        data = response.read()
+        if response.will_close:
+            conn.close()
+        return response, data
+    
+    yield request
+    conn.close()
+
+
+def get_json(client, path):
+    response, data = client('GET', path)
+    assert response.status == 200, data
+    return json.loads(data)
+
+
+def fill(db, days=12, per_day=7):
+    # Many rows share a day, so paging has to break ties on id
+    rows = [(f'2026-05-{day:02d}', CATEGORIES[(day * per_day + n) % 3], f'{n + 1}.25',
+             f'row {day}/{n}') for day in range(1, days + 1) for n in range(per_day)]
+    db.add_expenses_many(rows)
+    return rows
+
+
+def walk(client, path, limit):
+    ids, cursor = [], None
+    while True:
+        page = get_json(client, f'{path}&limit={limit}' + (f'&after={cursor}' if cursor else ''))
+        assert len(page['expenses']) <= limit
+        ids += [row['id'] for row in page['expenses']]
+        cursor = page['next']
+        if cursor is None:
+            return ids
+
+
+@pytest.mark.parametrize('query', ['?', '?category=Food', '?category=Food&category=Bills',
+                                   '?from=2026-05-03&to=2026-05-09', '?min=3&text=row'])
+@pytest.mark.parametrize('limit', [1, 5, 7, 500])
+def test_keyset_walk_returns_every_row_once(db, client, query, limit):
+    fill(db)
+    expected = [row['id'] for row in get_json(client, f'/expenses{query}&limit=500')['expenses']]
+    assert expected
+    
+    ids = walk(client, f'/expenses{query}', limit)
+    
+    assert ids == expected
+    assert len(set(ids)) == len(ids)
+
+
+def test_conditional_get_revalidates_until_a_write(db, client):
+    fill(db, days=2)
+    response, _ = client('GET', '/totals')
+    etag = response.getheader('ETag')
+    assert response.status == 200 and etag
+    
+    response, data = client('GET', '/totals', headers={'If-None-Match': etag})
+    assert (response.status, data) == (304, b'')
+    
+    db.add_expense('2026-06-01', 'Food', '1.00')
+    response, data = client('GET', '/totals', headers={'If-None-Match': etag})
+    assert response.status == 200
+    assert response.getheader('ETag') != etag
+    assert json.loads(data)['by_category']['Food']
+
+
+def test_bulk_reports_rejects_per_line(db, client):
+    body = '\n'.join([
+        json.dumps({'date': '2026-01-01', 'category': 'Food', 'amount': '1.50'}),
+        json.dumps({'date': 'yesterday', 'category': 'Food', 'amount': '1.50'}),
+        '{not json',
+        '',
+        json.dumps({'date': '2026-01-02', 'category': 'Food', 'amount': '-3'}),
+        json.dumps({'date': '2026-01-03', 'category': 'Food'}),
+        json.dumps({'date': '2026-01-04', 'category': 'Bills', 'amount': '2'}),
+        json.dumps({'date': '2026-01-05', 'category': 'Bills', 'amount': '1e17'}),
+    ])
+    response, data = client('POST', '/expenses/bulk', body,
+                            {'Content-Type': 'application/x-ndjson'})
+    
+    report = json.loads(data)
+    assert response.status == 201
+    assert (report['imported'], report['rejected']) == (2, 5)
+    assert [line for line, _ in report['rejects']] == [2, 3, 5, 6, 8]
+    assert 'amount' in report['rejects'][3][1]
+    assert 'too large' in report['rejects'][4][1]
+    assert db.count_expenses() == 2
+
+
+def test_jsonl_stream_is_complete(db, client):
+    fill(db, days=40, per_day=60)  # several STREAM_BATCH chunks
+    
+    response, data = client('GET', '/expenses.jsonl')
+    
+    assert response.status == 200
+    assert response.getheader('Transfer-Encoding') == 'chunked'
+    rows = [json.loads(line) for line in data.decode('utf-8').splitlines()]
+    assert len(rows) == db.count_expenses() == 2400
+    assert len({row['id'] for row in rows}) == 2400
+    
+    response, data = client('GET', '/expenses.jsonl?category=Food&limit=10')
+    assert [json.loads(line)['category'] for line in data.splitlines()] == ['Food'] * 10
+
+
+def test_post_and_read_back(client):
+    response, data = client('POST', '/expenses',
+                            {'Date': '2026-02-03', 'Category': 'Food', 'Amount': '4.20'})
+    assert response.status == 201
+    location = response.getheader('Location')
+    assert get_json(client, location)['amount'] == '4.20'
+
+
+@pytest.mark.parametrize('method, path, body', [
+    ('POST', '/expenses', {'date': '2026-01-01', 'category': 'Food', 'amount': 'lots'}),
+    ('POST', '/expenses', {'date': '2026-01-01', 'category': 'Food', 'amount': '1e17'}),
+    ('POST', '/expenses', {'date': '2026-01-01', 'category': 'Food', 'amount': '-1'}),
+    ('POST', '/expenses', {'date': '2026-01-01', 'category': 'Food'}),
+    ('POST', '/expenses', '[1, 2'),
+    ('POST', '/expenses/bulk', '{"not": "a list"}'),
+    ('GET', '/expenses?after=yesterday', None),
+    ('GET', '/expenses?after=2026-01-01,x', None),
+    ('GET', '/expenses?limit=0', None),
+    ('GET', '/expenses?min=cheap', None),
+    ('GET', '/expenses/999', None),
+    ('GET', '/totals/monthly', None),
+    ('GET', '/totals/monthly?year=2026&month=13', None),
+    ('GET', '/totals/daily?from=2026-01-01', None),
+    ('GET', '/nowhere', None),
+    ('DELETE', '/expenses/1', None),
+    ('PUT', '/totals', ''),
+    ('PATCH', '/nowhere', '{}'),
+])
+def test_bad_requests_are_4xx_never_5xx(db, client, method, path, body):
+    response, data = client(method, path, body)
+    
+    assert 400 <= response.status < 500, (response.status, data)
+    assert json.loads(data)['error']
+    assert db.count_expenses() == 0
+
+
+def test_wrong_method_names_the_allowed_ones(client):
+    response, _ = client('DELETE', '/expenses')
+    
+    assert response.status == 405
+    assert response.getheader('Allow') == 'GET, POST'
@@ -0,0 +1,71 @@
+"""The trigger-maintained totals always equal a fresh GROUP BY."""
+
+import sqlite3
+from decimal import Decimal
+
+import pytest
+
+from ExpenseTracker import MIGRATIONS, ExpenseDatabase
+
+
+def set_columns(db, expense_id, **columns):
+    # An UPDATE naming only the given columns, as other tools may write
+    assignments = ', '.join(f'{column} = ?' for column in columns)
+    with db.transaction() as conn:
+        conn.execute(f'UPDATE expenses SET {assignments} WHERE id = ?',
+                     (*columns.values(), expense_id))
+
+
+def test_amount_only_update_moves_category_and_month_totals(db):
+    expense_id = db.add_expense('2026-03-05', 'Food', '10.00')
+    db.add_expense('2026-03-06', 'Food', '2.50')
+    
+    set_columns(db, expense_id, amount_cents=2500)
+    
+    assert dict(db.get_total_by_category()) == {'Food': Decimal('27.50')}
+    assert db.get_monthly_total(2026, 3) == Decimal('27.50')
+    assert db.get_daily_total('2026-03-05') == Decimal('25.00')
+    assert db.get_monthly_total_by_category(2026, 3) == [('Food', Decimal('27.50'))]
+    assert db.verify_summaries() == []
+
+
+@pytest.mark.parametrize('change', [
+    {'amount_cents': 125},
+    {'category': 'Bills'},
+    {'date': '2026-04-01'},
+    {'date': '2026-04-01', 'category': 'Bills', 'amount_cents': 9999},
+    {'description': 'only the text'},
+])
+def test_every_kind_of_update_keeps_totals_exact(db, change):
+    ids = [db.add_expense(f'2026-03-{day:02d}', 'Food', f'{day}.10') for day in range(1, 6)]
+    set_columns(db, ids[2], **change)
+    db.update_expense(ids[3], '2026-05-01', 'Other', '3.33', 'moved')
+    db.delete_expense(ids[0])
+    assert db.verify_summaries() == []
+
+
+def test_migration_repairs_databases_with_the_old_trigger(tmp_path):
+    path = str(tmp_path / 'old.db')
+    db = ExpenseDatabase(path, cache_size=0)
+    db.close()
+    # Put back the trigger as it used to be created, and a drifted total
+    conn = sqlite3.connect(path)
+    sql = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'expenses_summary_update'"
+                       ).fetchone()[0]
+    conn.execute('DROP TRIGGER expenses_summary_update')
+    conn.execute(sql.replace('category, amount_cents ON', 'category, amount ON'))
+    conn.execute("INSERT INTO expenses (date, category, amount_cents) VALUES ('2026-03-01', 'Food', 100)")
+    conn.execute('UPDATE expenses SET amount_cents = 500')
+    conn.execute(f'PRAGMA user_version = {len(MIGRATIONS) - 1}')
+    conn.commit()
+    conn.close()
+    
+    db = ExpenseDatabase(path, cache_size=0)
+    try:
+        assert db.schema_version == len(MIGRATIONS)
+        assert db.verify_summaries() == []
+        assert db.get_monthly_total(2026, 3) == Decimal('5.00')
+        set_columns(db, 1, amount_cents=700)
+        assert db.get_monthly_total(2026, 3) == Decimal('7.00')
+    finally:
+        db.close()
@@ -0,0 +1,117 @@
+"""Many writer threads through one WriteQueue: every write lands exactly
+once, in group commits, and the totals stay exact."""
+
+import threading
+from collections import Counter
+from decimal import Decimal
+
+import pytest
+
+from ExpenseTracker import CATEGORIES, ExpenseDatabase, WriteQueue
+
+THREADS = 8
+WRITES_PER_THREAD = 150
+
+
+@pytest.fixture
+def shared(tmp_path):
+    path = str(tmp_path / 'expenses.db')
+    db = ExpenseDatabase(path, cache_size=0)
+    writes = WriteQueue(db)
+    yield db, writes, path
+    writes.close()
+    db.close()
+
+
+def test_many_writer_threads(shared):
+    db, writes, path = shared
+    errors = []
+    results = {}   # description -> (id, amount)
+    lock = threading.Lock()
+    start = threading.Barrier(THREADS)
+    
+    def writer(number):
+        try:
+            start.wait()
+            futures = []
+            for i in range(WRITES_PER_THREAD):
+                description = f'thread {number} write {i}'
+                amount = Decimal(f'{number + 1}.{i % 100:02d}')
+                category = CATEGORIES[(number + i) % len(CATEGORIES)]
+                futures.append((description, amount,
+                                writes.add_expense(f'2026-{i % 12 + 1:02d}-{number + 1:02d}',
+                                                   category, amount, description)))
+            # Every third write is then moved to another day and category
+            for description, amount, future in futures[::3]:
+                writes.update_expense(future.result(timeout=30), '2026-12-31', 'Other',
+                                      amount * 2, description).result(timeout=30)
+            with lock:
+                for description, amount, future in futures:
+                    results[description] = (future.result(timeout=30), amount)
+        except Exception as e:  # noqa: BLE001 - reported below
+            errors.append(e)
+    
+    def direct_writer():
+        # A second connection writing to the same file, as another process
+        # would; it must wait its turn, not fail with "database is locked"
+        other = ExpenseDatabase(path, cache_size=0)
+        try:
+            start.wait()
+            for i in range(50):
+                other.add_expense('2026-06-15', 'Bills', '1.00', f'direct {i}')
+        except Exception as e:  # noqa: BLE001
+            errors.append(e)
+        finally:
+            other.close()
+    
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(THREADS - 1)]
+    threads.append(threading.Thread(target=direct_writer))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(60)
+    
+    assert not any(thread.is_alive() for thread in threads)
+    # Nothing escaped, "database is locked" least of all
+    assert errors == [], errors
+    
+    # Every write committed exactly once, with the id its future returned
+    rows = {expense.description: expense for expense in db.get_all_expenses()}
+    descriptions = Counter(expense.description for expense in db.get_all_expenses())
+    assert max(descriptions.values()) == 1
+    queued = (THREADS - 1) * WRITES_PER_THREAD
+    assert len(rows) == queued + 50
+    assert len({expense_id for expense_id, _ in results.values()}) == queued
+    for description, (expense_id, amount) in results.items():
+        expense = rows[description]
+        assert expense.id == expense_id
+        if int(description.rsplit(' ', 1)[1]) % 3 == 0:
+            assert (expense.date, expense.category, expense.amount) == \
+                ('2026-12-31', 'Other', amount * 2)
+        else:
+            assert expense.date != '2026-12-31' and expense.amount == amount
+    
+    # Trigger-maintained totals equal a fresh GROUP BY
+    assert db.verify_summaries() == []
+    assert db.get_total_expenses() == sum(expense.amount for expense in rows.values())
+    
+    # Writes were grouped: fewer commits than writes
+    updates = (THREADS - 1) * len(range(0, WRITES_PER_THREAD, 3))
+    assert writes.writes == queued + updates
+    assert writes.commits < writes.writes
+    assert writes.failed == 0
+
+
+def test_failing_write_fails_alone(shared):
+    db, writes, _ = shared
+    good = [writes.add_expense('2026-01-01', 'Food', '1.00', f'ok {i}') for i in range(20)]
+    bad = writes.add_expense('2026-01-01', 'Food', 'not money')
+    more = [writes.add_expense('2026-01-02', 'Food', '2.00', f'after {i}') for i in range(20)]
+    
+    with pytest.raises(ValueError):
+        bad.result(timeout=30)
+    ids = [future.result(timeout=30) for future in good + more]
+    assert len(set(ids)) == 40
+    assert db.count_expenses() == 40
+    assert db.verify_summaries() == []
+    assert writes.failed == 1